@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Earthquake
+from django.utils import timezone
+from .models import (
+    Earthquake, BackfillCheckpoint, PredictionRun, DailyRollup, HourlyRollup, AlertRule, AlertNotification,
+    AlertDelivery,
+)
 
 @admin.register(Earthquake)
 class EarthquakeAdmin(admin.ModelAdmin):
@@ -7,3 +11,58 @@ class EarthquakeAdmin(admin.ModelAdmin):
     search_fields = ('place', 'magnitude')
     list_filter = ('magnitude', 'time', 'is_alert_sent')
     ordering = ('-time',)
+
+
+@admin.register(BackfillCheckpoint)
+class BackfillCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('start', 'end', 'min_magnitude', 'events', 'completed_at')
+    ordering = ('-start',)
+
+
+@admin.register(PredictionRun)
+class PredictionRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'completed_at', 'backend', 'regions', 'prediction_count')
+    ordering = ('-created_at',)
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'cell_row', 'cell_col', 'bucket', 'count', 'max_magnitude')
+    list_filter = ('bucket',)
+    ordering = ('-day',)
+
+
+@admin.register(HourlyRollup)
+class HourlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'cell_row', 'cell_col', 'bucket', 'count', 'max_magnitude')
+    list_filter = ('bucket',)
+    ordering = ('-hour',)
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'min_magnitude', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('name',)
+
+
+@admin.register(AlertNotification)
+class AlertNotificationAdmin(admin.ModelAdmin):
+    list_display = ('rule', 'earthquake_id', 'ingested_at', 'sent_at')
+    list_filter = ('sent_at',)
+    ordering = ('-id',)
+
+
+@admin.register(AlertDelivery)
+class AlertDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('sink', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'last_error')
+    list_filter = ('status', 'sink')
+    ordering = ('-id',)
+    actions = ('requeue',)
+
+    @admin.action(description="Requeue selected deliveries")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=AlertDelivery.SENT).update(
+            status=AlertDelivery.PENDING, attempts=0, next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f"Requeued {count} deliveries")
@@ -0,0 +1,368 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from celery import current_app
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import send_mail
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AlertDelivery, AlertNotification, Earthquake
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """A sink could not deliver a batch. `retryable` is False for errors a retry won't fix."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class AlertSink:
+    """Delivers a batch of alert payloads somewhere. Raises DeliveryError on failure."""
+    name = None
+
+    def send(self, alerts):
+        raise NotImplementedError
+
+
+class WebhookSink(AlertSink):
+    """POSTs each batch as {"alerts": [...]} to a URL."""
+    name = "webhook"
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, alerts):
+        try:
+            response = self.session.post(self.url, json={"alerts": alerts}, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise DeliveryError(f"Webhook request failed: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise DeliveryError(f"Webhook returned {response.status_code}")
+        if response.status_code >= 400:
+            raise DeliveryError(f"Webhook rejected the batch with {response.status_code}", retryable=False)
+
+
+class EmailSink(AlertSink):
+    """Sends one digest email per batch."""
+    name = "email"
+
+    def __init__(self, recipients):
+        self.recipients = recipients
+
+    def send(self, alerts):
+        strongest = max(alerts, key=lambda alert: alert["magnitude"])
+        subject = f"🚨 {len(alerts)} earthquake alert(s), up to M{strongest['magnitude']:.1f} {strongest['place']}"
+        body = "\n".join(
+            f"M{alert['magnitude']:.1f} - {alert['place']} at {alert['time']} (depth {alert['depth']} km)"
+            for alert in alerts
+        )
+        try:
+            send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, self.recipients)
+        except Exception as e:
+            raise DeliveryError(f"Email delivery failed: {e}")
+
+
+class FileSink(AlertSink):
+    """Appends alerts as JSON lines to a local file; for development and tests."""
+    name = "file"
+    _lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alerts):
+        with self._lock, open(self.path, "a") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert) + "\n")
+
+
+SINKS = {sink.name: sink for sink in (WebhookSink, EmailSink, FileSink)}
+
+
+class AlertLatency:
+    """
+    Histograms of ingest-to-alert latency, kept as cache counters like the
+    dashboard cache statistics. Stages: `enqueued` when the rules engine
+    has queued a notification, `delivered` when a sink has accepted it.
+    """
+    PREFIX = 'alert_latency'
+    STAGES = ('enqueued', 'delivered')
+    BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)  # Seconds; a last bucket takes the rest
+
+    @classmethod
+    def labels(cls):
+        return [f"le_{bound}" for bound in cls.BOUNDS] + ["le_inf"]
+
+    @classmethod
+    def observe(cls, stage, latencies):
+        """Add latencies (in seconds) to a stage's histogram, one cache write per bucket touched."""
+        counts = {}
+        for seconds in latencies:
+            label = next((f"le_{bound}" for bound in cls.BOUNDS if seconds <= bound), "le_inf")
+            counts[label] = counts.get(label, 0) + 1
+
+        for label, count in counts.items():
+            key = f"{cls.PREFIX}:{stage}:{label}"
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+    @classmethod
+    def histograms(cls):
+        """{stage: {bucket label: count}}, non-cumulative."""
+        keys = {
+            f"{cls.PREFIX}:{stage}:{label}": (stage, label)
+            for stage in cls.STAGES for label in cls.labels()
+        }
+        values = cache.get_many(list(keys))
+        result = {stage: {label: 0 for label in cls.labels()} for stage in cls.STAGES}
+        for key, count in values.items():
+            stage, label = keys[key]
+            result[stage][label] = count
+        return result
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts to the configured sinks through an outbox of
+    AlertDelivery rows, one per alert and sink.
+
+    Enqueueing claims a batch of rule matches (AlertNotification rows) or
+    of real M4.5+ events from the last 24 hours not yet sent, with SELECT
+    ... FOR UPDATE SKIP LOCKED, writes one delivery per sink and marks the
+    batch queued, all in one short transaction. Delivery then claims due
+    rows per sink the same way and commits before any network I/O,
+    pushing next_attempt_at out by LEASE so a worker that dies mid-send
+    only delays the rows. Each sink is drained in its own thread and its
+    outcome recorded per row: sent, rescheduled with exponential backoff,
+    or dead-lettered after a non-retryable error or MAX_DELIVERY_ATTEMPTS.
+    A sink that fails never holds back the others, and a sink that
+    succeeded is never sent the batch again. Delivery is at-least-once.
+
+    Sinks come from EARTHQUAKE_ALERT_SINKS, a list such as
+    [{"type": "webhook", "url": "..."}, {"type": "email", "recipients": [...]},
+    {"type": "file", "path": "alerts.jsonl"}]; a "name" key tells two
+    sinks of the same type apart. Without sinks nothing is claimed and
+    alerts stay pending.
+    """
+    MIN_MAGNITUDE = 4.5
+    WINDOW = timezone.timedelta(hours=24)
+    BATCH_SIZE = getattr(settings, 'EARTHQUAKE_ALERT_BATCH_SIZE', 100)
+    MAX_ATTEMPTS = 4
+    BACKOFF = 0.5  # Seconds before the first in-process retry; doubles each attempt
+    MAX_DELIVERY_ATTEMPTS = getattr(settings, 'EARTHQUAKE_ALERT_MAX_DELIVERY_ATTEMPTS', 8)
+    RETRY_DELAY = timezone.timedelta(seconds=30)  # Before the first rescheduled run; doubles each time
+    MAX_RETRY_DELAY = timezone.timedelta(hours=1)
+    LEASE = timezone.timedelta(minutes=10)  # Longer than the dispatch task's time limit
+
+    _sinks = None
+
+    @classmethod
+    def sinks(cls):
+        """{name: sink}, built once per process so webhook sessions keep their connections."""
+        if cls._sinks is None:
+            sinks = {}
+            for config in getattr(settings, 'EARTHQUAKE_ALERT_SINKS', []):
+                name = config.get("name", config["type"])
+                if name in sinks:
+                    raise ImproperlyConfigured(f"Two alert sinks are named {name!r}; give each a distinct 'name'")
+                sinks[name] = SINKS[config["type"]](
+                    **{key: value for key, value in config.items() if key not in ("type", "name")}
+                )
+            cls._sinks = sinks
+        return cls._sinks
+
+    @classmethod
+    def pending(cls):
+        return Earthquake.objects.filter(
+            time__gte=timezone.now() - cls.WINDOW,
+            magnitude__gte=cls.MIN_MAGNITUDE,
+            is_alert_sent=False,
+            prediction_run__isnull=True,
+        ).exclude(status="predicted")
+
+    @staticmethod
+    def serialize(earthquake):
+        return {
+            "id": earthquake.id,
+            "usgs_id": earthquake.usgs_id,
+            "magnitude": earthquake.magnitude,
+            "place": earthquake.place,
+            "time": earthquake.time.isoformat(),
+            "latitude": earthquake.latitude,
+            "longitude": earthquake.longitude,
+            "depth": earthquake.depth,
+            "status": earthquake.status,
+        }
+
+    @classmethod
+    def enqueue_events(cls, sinks):
+        """Queue one batch of M4.5+ events for every sink. Returns the number of events queued."""
+        with transaction.atomic():
+            claimed = list(
+                cls.pending()
+                .select_for_update(skip_locked=True)
+                .order_by("time")[:cls.BATCH_SIZE]
+            )
+            if not claimed:
+                return 0
+            AlertDelivery.objects.bulk_create([
+                AlertDelivery(sink=name, payload=cls.serialize(earthquake))
+                for earthquake in claimed
+                for name in sinks
+            ])
+            Earthquake.objects.filter(id__in=[earthquake.id for earthquake in claimed]).update(is_alert_sent=True)
+        return len(claimed)
+
+    @classmethod
+    def enqueue_notifications(cls, sinks):
+        """Queue one batch of rule notifications for every sink. Returns the number queued."""
+        with transaction.atomic():
+            claimed = list(
+                AlertNotification.objects
+                .filter(sent_at__isnull=True)
+                .select_for_update(skip_locked=True)
+                .order_by("id")[:cls.BATCH_SIZE]
+            )
+            if not claimed:
+                return 0
+            AlertDelivery.objects.bulk_create([
+                AlertDelivery(sink=name, payload=notification.payload, ingested_at=notification.ingested_at)
+                for notification in claimed
+                for name in sinks
+            ])
+            AlertNotification.objects.filter(
+                id__in=[notification.id for notification in claimed]
+            ).update(sent_at=timezone.now())
+        return len(claimed)
+
+    @classmethod
+    def deliver(cls, sink, alerts):
+        """Send one batch to one sink, retrying transient failures with exponential backoff."""
+        for attempt in range(cls.MAX_ATTEMPTS):
+            try:
+                sink.send(alerts)
+                return
+            except DeliveryError as e:
+                if not e.retryable or attempt == cls.MAX_ATTEMPTS - 1:
+                    raise
+                delay = cls.BACKOFF * 2 ** attempt
+                logger.warning(f"⚠️ {sink.name} delivery failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    @classmethod
+    def claim_deliveries(cls, name):
+        """Lease one batch of due deliveries for a sink and commit, so no lock is held during I/O."""
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = list(
+                AlertDelivery.objects
+                .filter(sink=name, status=AlertDelivery.PENDING, next_attempt_at__lte=now)
+                .select_for_update(skip_locked=True)
+                .order_by("next_attempt_at", "id")[:cls.BATCH_SIZE]
+            )
+            if claimed:
+                AlertDelivery.objects.filter(
+                    id__in=[delivery.id for delivery in claimed]
+                ).update(next_attempt_at=now + cls.LEASE)
+        return claimed
+
+    @classmethod
+    def record_failure(cls, name, deliveries, error):
+        """Reschedule a failed batch with backoff, or dead-letter it."""
+        now = timezone.now()
+        dead = 0
+        for delivery in deliveries:
+            delivery.attempts += 1
+            delivery.last_error = str(error)[:1000]
+            if not error.retryable or delivery.attempts >= cls.MAX_DELIVERY_ATTEMPTS:
+                delivery.status = AlertDelivery.DEAD
+                dead += 1
+            else:
+                delivery.next_attempt_at = now + min(cls.RETRY_DELAY * 2 ** (delivery.attempts - 1), cls.MAX_RETRY_DELAY)
+        AlertDelivery.objects.bulk_update(deliveries, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+        if dead:
+            logger.error(f"❌ {name}: dead-lettered {dead} alerts after {error}")
+        if dead < len(deliveries):
+            logger.warning(f"⚠️ {name}: {len(deliveries) - dead} alerts rescheduled after {error}")
+
+    @classmethod
+    def deliver_batch(cls, name, sink):
+        """Claim, send and record one batch for one sink. Returns the number delivered, or None on failure."""
+        claimed = cls.claim_deliveries(name)
+        if not claimed:
+            return 0
+
+        try:
+            cls.deliver(sink, [delivery.payload for delivery in claimed])
+        except Exception as e:
+            cls.record_failure(name, claimed, e if isinstance(e, DeliveryError) else DeliveryError(str(e)))
+            return None
+
+        sent_at = timezone.now()
+        AlertDelivery.objects.filter(id__in=[delivery.id for delivery in claimed]).update(
+            status=AlertDelivery.SENT, sent_at=sent_at, attempts=F('attempts') + 1, last_error='',
+        )
+        AlertLatency.observe('delivered', [
+            (sent_at - delivery.ingested_at).total_seconds() for delivery in claimed if delivery.ingested_at
+        ])
+        logger.info(f"🚨 Sent {len(claimed)} alerts to {name}")
+        return len(claimed)
+
+    @classmethod
+    def drain(cls, name, sink, max_batches):
+        """Deliver a sink's due alerts until none are left or a batch fails. Runs in a worker thread."""
+        sent = 0
+        try:
+            for _ in range(max_batches):
+                count = cls.deliver_batch(name, sink)
+                if count is None:
+                    break
+                sent += count
+                if count < cls.BATCH_SIZE:
+                    break
+        finally:
+            connections.close_all()  # This thread's connections only
+        return sent
+
+    @classmethod
+    def dispatch(cls, max_batches=50):
+        """Queue pending alerts for every sink, then drain each sink in parallel. Returns the number delivered."""
+        sinks = cls.sinks()
+        if not sinks:
+            pending = cls.pending().count() + AlertNotification.objects.filter(sent_at__isnull=True).count()
+            if pending:
+                logger.warning(f"⚠️ {pending} alerts pending but no sinks are configured (EARTHQUAKE_ALERT_SINKS)")
+            return 0
+
+        for enqueue in (cls.enqueue_notifications, cls.enqueue_events):
+            for _ in range(max_batches):
+                if enqueue(sinks) < cls.BATCH_SIZE:
+                    break
+
+        with ThreadPoolExecutor(max_workers=len(sinks)) as pool:
+            return sum(pool.map(lambda item: cls.drain(*item, max_batches), sinks.items()))
+
+    @staticmethod
+    def request_dispatch():
+        """Queue a dispatch right away instead of waiting for the next beat."""
+        try:
+            current_app.send_task("earthquake_app.tasks.dispatch_alerts")
+        except Exception as e:
+            logger.error(f"❌ Could not queue alert dispatch: {e}")
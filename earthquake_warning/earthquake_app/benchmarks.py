@@ -0,0 +1,1232 @@
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib.util import find_spec
+from unittest import mock
+
+import numpy as np
+import requests
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Q
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import spatial
+from .alerts import AlertDispatcher, WebhookSink
+from .geo import GEOHASH_ALPHABET, GEOHASH_PRECISION
+from .geocoding import ReverseGeocoder
+from .models import AlertDelivery, AlertRule, Earthquake
+from .partitions import EarthquakePartitions
+from .predictions import (
+    FEATURES, FORECAST_DAYS, LSTM_MODEL_PATH, NUMPY_WEIGHTS_PATH, ONNX_MODEL_PATH, TFLITE_MODEL_PATH, WINDOW_SIZE,
+    TensorFlowBackend,
+)
+from .queries import EarthquakeQuery
+from .replay import BroadcastLog
+from .rules import CompiledRule, RuleIndex
+from .services import DashboardDataService, EarthquakeDataService
+from .spatial import distance_km, within_radius
+from .stats import WINDOWS, EarthquakeStatsService
+from .subscriptions import GLOBAL_GROUP, Subscription, groups_for_event
+from .views import dashboard_data
+
+# usgs_id prefix of every row a benchmark writes
+SYNTHETIC_PREFIX = 'benchmark_'
+
+
+class Benchmark:
+    def __init__(self, run, size, description):
+        self.run = run
+        self.size = size
+        self.description = description
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, size, description):
+    """
+    Register a benchmark for `manage.py benchmark <name>`: a generator
+    function taking (size, repeat) and yielding report lines. `size` is its
+    main scale (features, rows, subscribers...), defaulting to `size`.
+    """
+    def register(run):
+        BENCHMARKS[name] = Benchmark(run, size, description)
+        return run
+    return register
+
+
+def timed(function, *args):
+    """(result, seconds) of one call."""
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def milliseconds(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+
+def latency_summary(latencies):
+    """p50 / p99 of a list of latencies in seconds."""
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return f"p50 {milliseconds(cuts[49])}, p99 {milliseconds(cuts[98])}"
+
+
+def load_test(handle, count, concurrency):
+    """
+    Call `handle` `count` times from `concurrency` threads and return
+    (latencies, wall seconds). Each thread closes its DB connection.
+    """
+    def worker(share):
+        latencies = []
+        try:
+            for _ in range(share):
+                _, seconds = timed(handle)
+                latencies.append(seconds)
+        finally:
+            connection.close()
+        return latencies
+
+    shares = [count // concurrency + (i < count % concurrency) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [latency for share in pool.map(worker, shares) for latency in share]
+    return latencies, time.perf_counter() - started
+
+
+@contextmanager
+def rolled_back():
+    """Run a block in a transaction that is always rolled back, so no benchmark rows are left behind."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def run_child(script, *args):
+    """
+    Run `script` in a fresh interpreter from the project directory, with the
+    same settings, and return the JSON object it prints last. Used where the
+    measurement (RSS, import time) must not include this process.
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', script, *map(str, args)],
+        cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Benchmark subprocess failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class StubFeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def stub_feed_server(body, latency=0.0):
+    """Serve `body` on every path of a local HTTP server after `latency` seconds; yields its URL."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubFeedHandler)
+    server.body = body
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def synthetic_features(count, seed=0, window=timedelta(hours=23)):
+    """`count` USGS GeoJSON features within the last `window`, with Gutenberg-Richter-like magnitudes."""
+    rng = random.Random(seed)
+    now_ms = int(timezone.now().timestamp() * 1000)
+    window_ms = int(window.total_seconds() * 1000)
+    features = []
+    for i in range(count):
+        time_ms = now_ms - rng.randrange(window_ms)
+        features.append({
+            "type": "Feature",
+            "id": f"{SYNTHETIC_PREFIX}{seed}_{i}",
+            "properties": {
+                "mag": round(min(rng.expovariate(1 / 1.2), 9.5), 1),
+                "place": "Synthetic",
+                "time": time_ms,
+                "updated": time_ms,
+            },
+            "geometry": {
+                "type": "Point",
+                "coordinates": [rng.uniform(-180, 180), rng.uniform(-90, 90), rng.uniform(0, 700)],
+            },
+        })
+    return features
+
+
+def geohash_sql(precision=GEOHASH_PRECISION):
+    """
+    SQL expression of geohash_encode(latitude, longitude) over a row's
+    columns: the bisections of geohash_encode are the bits of the
+    coordinates scaled to integers, interleaved five to a character.
+    """
+    bits = 5 * precision
+    longitude_bits, latitude_bits = (bits + 1) // 2, bits // 2
+    longitude = f"least(floor((longitude + 180) / 360 * {2 ** longitude_bits})::bigint, {2 ** longitude_bits - 1})"
+    latitude = f"least(floor((latitude + 90) / 180 * {2 ** latitude_bits})::bigint, {2 ** latitude_bits - 1})"
+    chars = []
+    for char in range(precision):
+        terms = []
+        for position in range(5 * char, 5 * char + 5):
+            value, width = (longitude, longitude_bits) if position % 2 == 0 else (latitude, latitude_bits)
+            # PostgreSQL gives <<, >>, & and | the same precedence: parenthesize everything
+            terms.append(f"(((({value}) >> {width - 1 - position // 2}) & 1) << {4 - position % 5})")
+        chars.append(f"substr('{GEOHASH_ALPHABET}', 1 + ({' | '.join(terms)})::int, 1)")
+    return " || ".join(chars)
+
+
+def seed_earthquakes(count, days, table=None):
+    """
+    Insert `count` synthetic events spread over the last `days` days with one
+    INSERT ... SELECT over generate_series, then ANALYZE. Much faster than
+    bulk_create at millions of rows; PostgreSQL only. Magnitudes follow
+    Gutenberg-Richter, statuses match Earthquake.status_for_magnitude and
+    geohashes match geohash_encode, so spatial queries can use their index.
+    """
+    if connection.vendor != 'postgresql':
+        raise RuntimeError("Seeding millions of rows needs PostgreSQL")
+
+    table = table or Earthquake._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table}
+                (usgs_id, magnitude, place, time, longitude, latitude, depth,
+                 is_alert_sent, status, geohash, region)
+            SELECT %s || n, magnitude, 'Synthetic', now() - random() * %s * interval '1 day',
+                   longitude, latitude, random() * 700, false,
+                   CASE WHEN magnitude >= 5.0 THEN 'alert' WHEN magnitude >= 3.0 THEN 'warning' ELSE 'safe' END,
+                   {geohash_sql()}, ''
+            FROM (
+                SELECT n, least(round((-ln(1 - random()) * 1.2)::numeric, 1), 9.5)::float AS magnitude,
+                       random() * 360 - 180 AS longitude, random() * 180 - 90 AS latitude
+                FROM generate_series(1, %s) AS n
+            ) AS events
+        """, [SYNTHETIC_PREFIX, days, count])
+        cursor.execute(f"ANALYZE {table}")
+
+
+def delete_synthetic(table=None):
+    """Delete every benchmark row, without loading them through the ORM."""
+    table = table or Earthquake._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE usgs_id LIKE %s", [SYNTHETIC_PREFIX.replace('_', '\\_') + '%'])
+        return cursor.rowcount
+
+
+def legacy_ingest(features):
+    """The ingest loop before bulk upserts: one get_or_create, two round trips, per feature."""
+    with transaction.atomic():
+        for quake_data in EarthquakeDataService.parse_features(features):
+            Earthquake.objects.get_or_create(usgs_id=quake_data["usgs_id"], defaults=quake_data)
+
+
+def bulk_ingest(features):
+    EarthquakeDataService.ingest_features(features, broadcast=False)
+
+
+@benchmark('ingest', 10_000, "bulk ingest against the per-feature get_or_create loop it replaced")
+def ingest(size, repeat):
+    """
+    Ingests a synthetic feed twice per cycle, as the minute task does: once
+    with every feature new, then unchanged. Each cycle is rolled back.
+    """
+    features = synthetic_features(size)
+    for name, store in (("get_or_create loop", legacy_ingest), ("bulk ingest", bulk_ingest)):
+        results = {"new": [], "unchanged": []}
+        for _ in range(repeat):
+            with rolled_back():
+                for feed in ("new", "unchanged"):
+                    with CaptureQueriesContext(connection) as queries:
+                        _, seconds = timed(store, features)
+                    results[feed].append((seconds, len(queries)))
+
+        yield f"📍 {name}: " + ", ".join(
+            f"{feed} feed {milliseconds(statistics.median(s for s, _ in runs))} in {runs[0][1]} queries"
+            for feed, runs in results.items()
+        )
+
+
+# Round trip of the stub USGS feed in the dashboard load test; the real feed
+# usually takes a few hundred ms and occasionally times out
+USGS_LATENCY = 0.3
+LOAD_CONCURRENCY = 8
+
+
+@benchmark('dashboard', 400, "/api/dashboard-data/ under load, against the inline USGS fetch it replaced")
+def dashboard(size, repeat):
+    """
+    `size` requests per round from LOAD_CONCURRENCY threads. The old path
+    fetched a (stub, USGS_LATENCY slow) feed and stored it on every request
+    before querying; its writes are rolled back. The current view is called
+    with a fresh sync state, so it never queues a refresh task.
+    """
+    with stub_feed_server(json.dumps({"features": synthetic_features(200)}).encode(), USGS_LATENCY) as url:
+        def legacy_request():
+            features = requests.get(url, timeout=10).json()["features"]
+            with rolled_back():
+                legacy_ingest(features)
+            return JsonResponse(DashboardDataService.build_dashboard_payload(
+                DashboardDataService.build_earthquake_data(), DashboardDataService.build_statistics()
+            ))
+
+        request = RequestFactory().get('/api/dashboard-data/')
+
+        def current_request():
+            return dashboard_data(request)
+
+        real_state = EarthquakeDataService.get_sync_state
+
+        def fresh_state():
+            state = real_state()
+            state["last_success"] = timezone.now().timestamp()
+            return state
+
+        with mock.patch.object(EarthquakeDataService, 'get_sync_state', staticmethod(fresh_state)):
+            for name, handle in (("inline fetch", legacy_request), ("dashboard_data", current_request)):
+                response = handle()
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name} answered {response.status_code}: {response.content[:200]!r}")
+
+                latencies, wall = [], 0
+                for _ in range(repeat):
+                    round_latencies, round_wall = load_test(handle, size, LOAD_CONCURRENCY)
+                    latencies += round_latencies
+                    wall += round_wall
+                yield f"📍 {name}: {latency_summary(latencies)}, {len(latencies) / wall:.0f} requests/sec"
+
+
+STREAM_CHILD = """
+import json, resource, sys
+import django
+django.setup()
+import requests
+from earthquake_app.services import EarthquakeDataService
+from earthquake_app.streaming import iter_response_features
+
+mode, url = sys.argv[1:]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+parsed = 0
+if mode == "json.loads":
+    features = requests.get(url, timeout=120).json()["features"]
+    parsed = len(EarthquakeDataService.parse_features(features))
+else:
+    batch = []
+    for feature in iter_response_features(requests.get(url, timeout=120, stream=True)):
+        batch.append(feature)
+        if len(batch) >= EarthquakeDataService.INGEST_BATCH_SIZE:
+            parsed += len(EarthquakeDataService.parse_features(batch))
+            batch.clear()
+    parsed += len(EarthquakeDataService.parse_features(batch))
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"baseline_kb": baseline, "peak_kb": peak, "parsed": parsed}))
+"""
+
+
+def synthetic_feed(megabytes):
+    """A USGS-shaped FeatureCollection body of about `megabytes` MB."""
+    target = megabytes * 1024 * 1024
+    parts, length, seed = [], 0, 0
+    while length < target:
+        for feature in synthetic_features(1000, seed=seed):
+            # The summary feeds carry ~25 properties; pad to a realistic feature size
+            feature["properties"].update({
+                "url": f"https://earthquake.usgs.gov/earthquakes/eventpage/{feature['id']}",
+                "detail": f"https://earthquake.usgs.gov/earthquakes/feed/v1.0/detail/{feature['id']}.geojson",
+                "title": f"M {feature['properties']['mag']} - Synthetic",
+                "status": "reviewed", "tsunami": 0, "sig": 0, "net": "us", "code": feature["id"],
+                "ids": f",{feature['id']},", "sources": ",us,", "types": ",origin,phase-data,",
+                "nst": None, "dmin": None, "rms": 0.5, "gap": None, "magType": "ml", "type": "earthquake",
+            })
+            part = json.dumps(feature).encode()
+            parts.append(part)
+            length += len(part) + 1
+        seed += 1
+    return b'{"type": "FeatureCollection", "features": [' + b",".join(parts) + b"]}"
+
+
+@benchmark('stream', 100, "peak RSS of json.loads against the streaming parser, for feeds up to `size` MB")
+def stream(size, repeat):
+    """
+    Each feed is served by a local stub and parsed in a fresh subprocess,
+    whose peak RSS is reported above its RSS right after django.setup().
+    """
+    for megabytes in sorted({max(size // 10, 1), max(size // 4, 1), max(size // 2, 1), size}):
+        with stub_feed_server(synthetic_feed(megabytes)) as url:
+            for mode in ("json.loads", "streaming"):
+                runs = [run_child(STREAM_CHILD, mode, url) for _ in range(repeat)]
+                growth = statistics.median(run["peak_kb"] - run["baseline_kb"] for run in runs)
+                yield f"📍 {megabytes} MB feed, {mode}: +{growth / 1024:.0f} MB peak RSS, {runs[0]['parsed']} features"
+
+
+def synthetic_subscriptions(count, seed=0):
+    """A mix of worldwide, radius and bbox subscriptions, built from subscribe messages."""
+    rng = random.Random(seed)
+    subscriptions = []
+    for _ in range(count):
+        message = {"min_magnitude": rng.choice((0, 0, 2.5, 3, 4.5, 6))}
+        kind = rng.random()
+        if kind < 0.5:
+            message.update(center=[rng.uniform(-180, 180), rng.uniform(-80, 80)], radius_km=rng.uniform(50, 2000))
+        elif kind < 0.8:
+            west, south = rng.uniform(-180, 170), rng.uniform(-90, 80)
+            message["bbox"] = [west, south, min(west + rng.uniform(1, 60), 180), min(south + rng.uniform(1, 40), 90)]
+        subscriptions.append(Subscription.from_message(message))
+    return subscriptions
+
+
+@benchmark('fanout', 10_000, "WebSocket fan-out: one global group with client filtering against group routing")
+def fanout(size, repeat):
+    """
+    `size` subscribers and 500 events, without a channel layer: counts the
+    messages each strategy hands to consumers and the CPU spent routing and
+    filtering them, and checks both deliver the same frames.
+    """
+    subscriptions = synthetic_subscriptions(size)
+    events = EarthquakeDataService.parse_features(synthetic_features(500))
+
+    members = {}
+    for subscription in subscriptions:
+        for group in subscription.groups():
+            members.setdefault(group, []).append(subscription)
+
+    def global_group():
+        deliveries, frames = 0, []
+        for event in events:
+            deliveries += len(subscriptions)
+            frames.append({id(s) for s in subscriptions if s.matches(event)})
+        return deliveries, frames
+
+    def group_routing():
+        deliveries, frames = 0, []
+        for event in events:
+            receivers = [s for group in [GLOBAL_GROUP, *groups_for_event(event)] for s in members.get(group, ())]
+            deliveries += len(receivers)
+            frames.append({id(s) for s in receivers if s.matches(event)})
+        return deliveries, frames
+
+    results = {}
+    for name, deliver in (("global group", global_group), ("group routing", group_routing)):
+        cpu = []
+        for _ in range(repeat):
+            started = time.process_time()
+            deliveries, frames = deliver()
+            cpu.append(time.process_time() - started)
+        results[name] = frames
+        sent = sum(map(len, frames))
+        yield (
+            f"📍 {name}: {deliveries / len(events):.0f} consumer messages and {sent / len(events):.1f} frames "
+            f"per event, {statistics.median(cpu) / len(events) * 1e6:.0f} µs CPU per event"
+        )
+
+    if results["global group"] != results["group routing"]:
+        raise RuntimeError("Group routing delivered different frames than the global group")
+
+
+STARTUP_CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+mode = sys.argv[1]
+if mode == "manage.py check":
+    from django.core.management import execute_from_command_line
+    execute_from_command_line(["manage.py", "check"])
+elif mode == "asgi import":
+    import earthquake_warning.asgi
+else:
+    from earthquake_warning.celery import app
+    django.setup()
+    app.loader.import_default_modules()
+    if mode == "prediction worker preload":
+        from earthquake_app.geocoding import ReverseGeocoder
+        from earthquake_app.predictions import LSTMModelRegistry
+        LSTMModelRegistry.preload()
+        ReverseGeocoder.preload()
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "tensorflow": "tensorflow" in sys.modules,
+}))
+"""
+
+STARTUP_MODES = ("manage.py check", "celery task import", "asgi import", "prediction worker preload")
+
+
+@benchmark('startup', 1, "start-up time and RSS of each entry point against the prediction worker preload")
+def startup(size, repeat):
+    """
+    Every entry point runs in `size` fresh subprocesses per repeat; only the
+    prediction worker should pay for TensorFlow and the model.
+    """
+    for mode in STARTUP_MODES:
+        runs = [run_child(STARTUP_CHILD, mode) for _ in range(size * repeat)]
+        yield (
+            f"📍 {mode}: {milliseconds(statistics.median(run['seconds'] for run in runs))}, "
+            f"{statistics.median(run['rss_kb'] for run in runs) / 1024:.0f} MB RSS, "
+            f"TensorFlow {'imported' if runs[0]['tensorflow'] else 'not imported'}"
+        )
+
+
+def legacy_forecast(model, window):
+    """The forecast loop before the compiled rollout: one model.predict and one np.append per day."""
+    X_input = window[np.newaxis]
+    future_predictions = []
+    for _ in range(FORECAST_DAYS):
+        predicted_values = model.predict(X_input, verbose=0)[0]
+        future_predictions.append(predicted_values)
+        if len(predicted_values) == 4:
+            next_input = predicted_values
+        else:
+            next_input = np.array([predicted_values[0], predicted_values[1], predicted_values[2], X_input[0, -1, 3]])
+        X_input = np.append(X_input[:, 1:, :], [[next_input]], axis=1)
+    return np.array(future_predictions)
+
+
+def traced(function, *args):
+    """(result, seconds, peak bytes allocated through tracemalloc) of one call."""
+    tracemalloc.start()
+    try:
+        result, seconds = timed(function, *args)
+        return result, seconds, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark('forecast', 50, "30-day forecast of `size` regions: per-day model.predict against the compiled rollout")
+def forecast(size, repeat):
+    """
+    Random scaled windows for `size` regions, forecast with the old loop
+    (region by region) and with TensorFlowBackend.rollout in one batch.
+    Both are warmed up first, so tracing is not timed.
+    """
+    backend = TensorFlowBackend()
+    try:
+        backend.load()
+    except ImportError:
+        raise RuntimeError("The forecast benchmark needs TensorFlow")
+
+    windows = np.random.default_rng(0).random((size, WINDOW_SIZE, len(FEATURES)), dtype=np.float32)
+    rollout = backend.rollout(FORECAST_DAYS)
+
+    def legacy():
+        return np.stack([legacy_forecast(backend.model, window) for window in windows])
+
+    def current():
+        return rollout(windows)
+
+    results = {}
+    for name, run in (("model.predict loop", legacy), ("compiled rollout", current)):
+        run()
+        runs = [traced(run) for _ in range(repeat)]
+        results[name] = runs[0][0]
+        yield (
+            f"📍 {name}: {milliseconds(statistics.median(seconds for _, seconds, _ in runs))}, "
+            f"{max(peak for _, _, peak in runs) / 1024:.0f} KiB peak traced allocations"
+        )
+
+    if not np.allclose(results["model.predict loop"], results["compiled rollout"], atol=1e-4):
+        raise RuntimeError("The compiled rollout diverged from the model.predict loop")
+
+
+GEOCODE_CHILD = """
+import json, random, sys, time
+import reverse_geocoder as rg
+count, seed = map(int, sys.argv[1:])
+rng = random.Random(seed)
+points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(count)]
+rg.search((0.0, 0.0))  # Both paths build the index once; only queries are timed
+started = time.perf_counter()
+places = [f"{location['name']}, {location['cc']}" for location in (rg.search(point)[0] for point in points)]
+print(json.dumps({"seconds": time.perf_counter() - started, "places": places}))
+"""
+
+
+def synthetic_points(count, seed=0):
+    """Uniform (latitude, longitude) pairs; GEOCODE_CHILD draws the same ones."""
+    rng = random.Random(seed)
+    return [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(count)]
+
+
+@benchmark('geocode', 10_000, "ReverseGeocoder on `size` points, cold and warm, against rg.search per point")
+def geocode(size, repeat):
+    """
+    The old per-point rg.search calls (default multiprocess mode) run on a
+    subset in a fresh subprocess, so its KD-tree singleton doesn't decide
+    the mode ReverseGeocoder gets here. Cold runs start from an empty memo.
+    """
+    points = synthetic_points(size)
+    subset = max(size // 50, 1)
+
+    legacy = run_child(GEOCODE_CHILD, subset, 0)
+    yield f"📍 rg.search per point: {legacy['seconds'] / subset * 1e6:.0f} µs per point ({subset} points)"
+
+    _, seconds = timed(ReverseGeocoder.preload)
+    yield f"📍 ReverseGeocoder index load: {milliseconds(seconds)}"
+
+    for name in ("cold", "warm"):
+        runs = []
+        for _ in range(repeat):
+            if name == "cold":
+                ReverseGeocoder._memo.clear()
+            runs.append(timed(ReverseGeocoder.places, points))
+        seconds = statistics.median(seconds for _, seconds in runs)
+        yield f"📍 ReverseGeocoder {name}: {milliseconds(seconds)}, {seconds / size * 1e6:.1f} µs per point"
+
+    places = runs[0][0][:subset]
+    same = sum(a == b for a, b in zip(places, legacy["places"]))
+    yield f"📍 Same place as the unsnapped lookup for {same / subset:.1%} of the subset"
+
+
+PAGE_SIZE = 100
+
+
+@benchmark('pagination', 1_000_000, "/api/earthquakes/ pages at increasing depth: keyset cursor against OFFSET")
+def pagination(size, repeat):
+    """
+    Seeds `size` events over two years, then fetches a PAGE_SIZE page at
+    several depths with OFFSET and with EarthquakeQuery's keyset cursor,
+    checking both return the same rows. The seeded rows are deleted after.
+    """
+    seed_earthquakes(size, 2 * 365)
+    try:
+        listing = (
+            Earthquake.objects.filter(prediction_run__isnull=True).exclude(status='predicted')
+            .order_by('-time', '-id')
+        )
+        depths = [depth for depth in (0, 1_000, 10_000, 100_000) if depth < size * 9 // 10] + [size * 9 // 10]
+        for depth in depths:
+            def offset_page():
+                return list(listing.values(*EarthquakeQuery.FIELDS)[depth:depth + PAGE_SIZE])
+
+            params = {'limit': str(PAGE_SIZE)}
+            if depth:
+                last = listing.values('time', 'id')[depth - 1]
+                params['cursor'] = EarthquakeQuery.encode_cursor(last['time'], last['id'])
+
+            def keyset_page():
+                return [row for row, _ in EarthquakeQuery(params).rows() if row is not None]
+
+            timings = {}
+            for name, fetch in (("OFFSET", offset_page), ("keyset", keyset_page)):
+                runs = [timed(fetch) for _ in range(repeat)]
+                timings[name] = statistics.median(seconds for _, seconds in runs)
+                if name == "OFFSET":
+                    expected = [row['id'] for row in runs[0][0]]
+                elif [row['id'] for row in runs[0][0]] != expected:
+                    raise RuntimeError(f"Keyset page at depth {depth} differs from the OFFSET page")
+
+            yield f"📍 depth {depth}: OFFSET {milliseconds(timings['OFFSET'])}, keyset {milliseconds(timings['keyset'])}"
+    finally:
+        delete_synthetic()
+
+
+def explain_times(sql, params, repeat):
+    """Median (planning, execution) seconds of EXPLAIN ANALYZE over `repeat` runs."""
+    runs = []
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]
+            runs.append((plan["Planning Time"] / 1000, plan["Execution Time"] / 1000))
+    return statistics.median(p for p, _ in runs), statistics.median(e for _, e in runs)
+
+
+@benchmark('partitions', 20_000_000, "24h/30d queries on the monthly partitions against an unpartitioned copy")
+def partitions(size, repeat):
+    """
+    Creates partitions for the last two years, seeds `size` events over them
+    and copies the table, with the same indexes, into an unpartitioned
+    table. Then compares EXPLAIN ANALYZE times of the window statistics and
+    the M4.5+ listing for the last 24 hours and 30 days. The copy and the
+    seeded rows are removed after.
+    """
+    if not EarthquakePartitions.is_partitioned():
+        raise RuntimeError("The earthquake table is not partitioned (see migration 0010)")
+
+    table = EarthquakePartitions.TABLE
+    flat = f"{table}_benchmark_flat"
+    now = timezone.now()
+    EarthquakePartitions.ensure_partitions(now - timedelta(days=2 * 365), now)
+    seed_earthquakes(size, 2 * 365)
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE UNLOGGED TABLE {flat} AS SELECT * FROM {table}")
+            cursor.execute(
+                "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass", [table]
+            )
+            for (definition,) in cursor.fetchall():
+                cursor.execute(re.sub(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+', rf'CREATE \1INDEX ON {flat}', definition))
+            cursor.execute(f"ANALYZE {flat}")
+
+        for label, window in (("24h", timedelta(hours=24)), ("30d", timedelta(days=30))):
+            recent = Earthquake.observed().filter(time__gte=now - window)
+            queries = {
+                "statistics": recent.values('status').annotate(count=Count('id'), avg_magnitude=Avg('magnitude')),
+                "M4.5+ listing": recent.filter(magnitude__gte=4.5).order_by('-time').values('id', 'time', 'magnitude')[:100],
+            }
+            for name, queryset in queries.items():
+                sql, params = queryset.query.sql_with_params()
+                times = {
+                    "partitioned": explain_times(sql, params, repeat),
+                    "flat": explain_times(sql.replace(f'"{table}"', f'"{flat}"'), params, repeat),
+                }
+                yield f"📍 {label} {name}: " + ", ".join(
+                    f"{kind} {milliseconds(execution)} (+{milliseconds(planning)} planning)"
+                    for kind, (planning, execution) in times.items()
+                )
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {flat}")
+        delete_synthetic()
+
+
+def synthetic_rules(count, seed=0):
+    """Unsaved AlertRules: worldwide, region and site rules, some with a depth band."""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        rule = AlertRule(id=i + 1, name=f"rule {i}", min_magnitude=rng.choice((0, 2.5, 3, 4, 4.5, 5, 6)))
+        kind = rng.random()
+        if kind < 0.45:
+            rule.west, rule.south = rng.uniform(-180, 170), rng.uniform(-90, 80)
+            rule.east, rule.north = min(rule.west + rng.uniform(1, 30), 180), min(rule.south + rng.uniform(1, 20), 90)
+        elif kind < 0.9:
+            rule.site_latitude, rule.site_longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            rule.radius_km = rng.uniform(10, 1000)
+        if rng.random() < 0.2:
+            rule.min_depth, rule.max_depth = 0, rng.uniform(10, 300)
+        rules.append(rule)
+    return rules
+
+
+@benchmark('rules', 10_000, "alert rule evaluation of 1k events: RuleIndex against testing every rule")
+def rules(size, repeat):
+    """
+    `size` in-memory rules and 1000 events; no database access. Checks the
+    index finds exactly the pairs the brute-force loop finds.
+    """
+    compiled = [CompiledRule(rule) for rule in synthetic_rules(size)]
+    events = [Earthquake(id=i + 1, **quake) for i, quake in enumerate(
+        EarthquakeDataService.parse_features(synthetic_features(1000))
+    )]
+
+    index, seconds = timed(RuleIndex, compiled)
+    yield f"📍 RuleIndex build: {milliseconds(seconds)}"
+
+    def brute_force():
+        return {
+            (rule.id, event.id) for event in events for rule in compiled
+            if event.magnitude >= rule.min_magnitude and rule.matches(event.latitude, event.longitude, event.depth)
+        }
+
+    def indexed():
+        return {(rule.id, event.id) for event in events for rule in index.match(event)}
+
+    results = {}
+    for name, evaluate in (("every rule", brute_force), ("RuleIndex", indexed)):
+        runs = [timed(evaluate) for _ in range(repeat)]
+        results[name] = runs[0][0]
+        seconds = statistics.median(seconds for _, seconds in runs)
+        yield f"📍 {name}: {milliseconds(seconds)}, {seconds / len(events) * 1e6:.0f} µs per event, {len(results[name])} matches"
+
+    if results["every rule"] != results["RuleIndex"]:
+        raise RuntimeError("RuleIndex matched different rules than the brute-force loop")
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        alerts = json.loads(self.rfile.read(int(self.headers['Content-Length'])))["alerts"]
+        with self.server.lock:
+            self.server.received += [alert["id"] for alert in alerts]
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def stub_webhook_server():
+    """Accept every POST on a local HTTP server; yields (URL, list of the alert ids received)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+    server.lock = threading.Lock()
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/", server.received
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+ALERT_WORKERS = 4
+# Sink name of the benchmark webhook, so real outbox rows are never drained
+ALERT_SINK = 'benchmark'
+
+
+@benchmark('alerts', 20_000, "alerts/sec through AlertDispatcher with ALERT_WORKERS workers and a local webhook")
+def alerts(size, repeat):
+    """
+    Each round inserts `size` pending M4.5+ events and runs dispatch() in
+    ALERT_WORKERS threads, as concurrent dispatch_alerts tasks would, until
+    all of them reached a local webhook stub. Only synthetic events are
+    claimed, and the round fails if the webhook got an alert twice. Events
+    and deliveries are deleted after each round.
+    """
+    real_pending = AlertDispatcher.pending
+
+    def synthetic_pending():
+        return real_pending().filter(usgs_id__startswith=SYNTHETIC_PREFIX)
+
+    def remaining():
+        return synthetic_pending().exists() or AlertDelivery.objects.filter(
+            sink=ALERT_SINK, status=AlertDelivery.PENDING
+        ).exists()
+
+    def worker():
+        try:
+            while AlertDispatcher.dispatch() or remaining():
+                pass
+        finally:
+            connection.close()
+
+    with stub_webhook_server() as (url, received), \
+            mock.patch.object(AlertDispatcher, '_sinks', {ALERT_SINK: WebhookSink(url)}), \
+            mock.patch.object(AlertDispatcher, 'pending', staticmethod(synthetic_pending)), \
+            mock.patch.object(AlertDispatcher, 'enqueue_notifications', return_value=0):
+        rates = []
+        for _ in range(repeat):
+            received.clear()
+            now = timezone.now()
+            Earthquake.objects.bulk_create([
+                Earthquake(
+                    usgs_id=f"{SYNTHETIC_PREFIX}alert_{i}", magnitude=4.5 + i % 5 / 10, place="Synthetic",
+                    time=now - timedelta(minutes=i % 600), latitude=0.0, longitude=0.0, depth=10.0, status='warning',
+                )
+                for i in range(size)
+            ], batch_size=5000)
+            try:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=ALERT_WORKERS) as pool:
+                    for future in [pool.submit(worker) for _ in range(ALERT_WORKERS)]:
+                        future.result()
+                rates.append(size / (time.perf_counter() - started))
+
+                if len(received) != size or len(set(received)) != size:
+                    raise RuntimeError(f"The webhook got {len(received)} alerts for {len(set(received))} events")
+            finally:
+                AlertDelivery.objects.filter(sink=ALERT_SINK).delete()
+                delete_synthetic()
+
+        yield f"📍 {ALERT_WORKERS} workers: {statistics.median(rates):.0f} alerts/sec, every alert delivered once"
+
+
+RADII_KM = (50, 500, 2000)
+RADIUS_CENTERS = 5
+
+
+@benchmark('radius', 5_000_000, "radius queries on `size` rows: no index, the geohash index and the PostGIS GiST index")
+def radius(size, repeat):
+    """
+    Seeds `size` events over a year, then runs RADIUS_CENTERS queries per
+    radius: the haversine distance alone (a full scan), within_radius on
+    the geohash index, and within_radius through ST_DWithin on the GiST
+    index of migration 0008 when PostGIS was available to create it. All
+    must find the same events. The seeded rows are deleted after.
+    """
+    seed_earthquakes(size, 365)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_indexes WHERE tablename = %s AND indexdef ILIKE %s",
+                [Earthquake._meta.db_table, '%USING gist%'],
+            )
+            has_gist = cursor.fetchone() is not None
+
+        observed = Earthquake.observed()
+
+        def search(backend):
+            def find(latitude, longitude, radius_km):
+                if backend is None:
+                    queryset = observed.annotate(distance_km=distance_km(latitude, longitude)).filter(distance_km__lte=radius_km)
+                else:
+                    with mock.patch.object(spatial, 'SPATIAL_BACKEND', backend):
+                        queryset = within_radius(observed, latitude, longitude, radius_km)
+                return set(queryset.values_list('id', flat=True))
+            return find
+
+        strategies = {"no index": search(None), "geohash index": search('geohash')}
+        if has_gist:
+            strategies["PostGIS GiST"] = search('postgis')
+
+        rng = random.Random(0)
+        for radius_km in RADII_KM:
+            centers = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(RADIUS_CENTERS)]
+            timings, found = {}, []
+            for name, find in strategies.items():
+                seconds = []
+                for index, center in enumerate(centers):
+                    runs = [timed(find, *center, radius_km) for _ in range(repeat)]
+                    seconds += [run for _, run in runs]
+                    if name == "no index":
+                        found.append(runs[0][0])
+                    elif runs[0][0] != found[index]:
+                        raise RuntimeError(f"{name} found different events within {radius_km} km than the full scan")
+                timings[name] = statistics.median(seconds)
+
+            yield f"📍 {radius_km} km, {statistics.mean(map(len, found)):.0f} events: " + ", ".join(
+                f"{name} {milliseconds(seconds)}" for name, seconds in timings.items()
+            )
+
+        if has_gist:
+            yield (
+                f"📍 The app only uses the GiST index with EARTHQUAKE_SPATIAL_BACKEND = 'postgis' "
+                f"(now {spatial.SPATIAL_BACKEND!r}); otherwise radius queries run on the geohash index"
+            )
+        else:
+            yield "📍 No GiST index: PostGIS was not available when migration 0008 ran"
+    finally:
+        delete_synthetic()
+
+
+GEVENT_CHILD = """
+import sys
+from types import ModuleType
+
+port = sys.argv[1]
+
+from gunicorn.app.base import BaseApplication
+
+
+class Server(BaseApplication):
+    def load_config(self):
+        for name, value in {
+            "bind": f"127.0.0.1:{port}", "workers": 1, "worker_class": "gevent",
+            "worker_connections": 1000, "loglevel": "warning",
+        }.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        import django
+        from django.conf import settings
+        django.setup()
+        from django.core.wsgi import get_wsgi_application
+        from django.http import JsonResponse
+        from django.urls import include, path
+        from earthquake_app.services import DashboardDataService, EarthquakeDataService
+        from earthquake_app.views import DashboardView
+
+        def inline_encode(request):
+            # /api/dashboard-data/ before the response cache: dicts from the cache, encoded per request
+            view = DashboardView()
+            return JsonResponse(DashboardDataService.build_dashboard_payload(
+                view.get_earthquake_data(), view.get_statistics()
+            ))
+
+        urls = ModuleType("benchmark_urls")
+        urls.urlpatterns = [path("inline/", inline_encode), path("", include(settings.ROOT_URLCONF))]
+        sys.modules[urls.__name__] = urls
+        settings.ROOT_URLCONF = urls.__name__
+        # Never queue feed refreshes from the benchmark
+        EarthquakeDataService.request_refresh = classmethod(lambda cls: None)
+        return get_wsgi_application()
+
+
+Server().run()
+"""
+
+GEVENT_CONCURRENCY = 32
+
+
+@contextmanager
+def gevent_server():
+    """Run GEVENT_CHILD in a subprocess until it answers; yields its base URL."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    process = subprocess.Popen(
+        [sys.executable, '-c', GEVENT_CHILD, str(port)],
+        cwd=settings.BASE_DIR, env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(600):
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited:\n{process.stderr.read()[-2000:]}")
+            try:
+                requests.get(f"{url}/api/dashboard-data/", timeout=30)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("gunicorn did not start within 60s")
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@benchmark('responses', 2_000, "/api/dashboard-data/ requests/sec under a gevent worker: per-request encoding, cached bytes, 304s")
+def responses(size, repeat):
+    """
+    gunicorn with one gevent worker serves the app and, at /inline/, the
+    view before the response cache (cached dicts, JsonResponse per
+    request). `size` requests per round from GEVENT_CONCURRENCY threads:
+    to that view, to /api/dashboard-data/ accepting gzip, and revalidating
+    with its ETag as a polling browser does.
+    """
+    sessions = threading.local()
+
+    def get(url, headers, expected):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        response = sessions.session.get(url, headers=headers, timeout=30)
+        if response.status_code != expected:
+            raise RuntimeError(f"{url} answered {response.status_code}, expected {expected}")
+        return response
+
+    with gevent_server() as url:
+        gzip_only = {'Accept-Encoding': 'gzip'}
+        etag = get(f"{url}/api/dashboard-data/", gzip_only, 200).headers['ETag']
+        cases = {
+            "JsonResponse per request": (f"{url}/inline/", gzip_only, 200),
+            "cached gzip bytes": (f"{url}/api/dashboard-data/", gzip_only, 200),
+            "If-None-Match revalidation": (f"{url}/api/dashboard-data/", {**gzip_only, 'If-None-Match': etag}, 304),
+        }
+        for name, (endpoint, headers, expected) in cases.items():
+            get(endpoint, headers, expected)  # Warm the cache and the connection
+
+            latencies, wall = [], 0
+            for _ in range(repeat):
+                round_latencies, round_wall = load_test(
+                    lambda: get(endpoint, headers, expected), size, GEVENT_CONCURRENCY
+                )
+                latencies += round_latencies
+                wall += round_wall
+            yield f"📍 {name}: {latency_summary(latencies)}, {len(latencies) / wall:.0f} requests/sec"
+
+
+BROADCAST_EVENTS = 200
+BROADCAST_LAYER = {'default': {
+    'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    # Room for a whole unbatched burst in every consumer's channel
+    'CONFIG': {'capacity': 10 * BROADCAST_EVENTS},
+}}
+
+
+def legacy_broadcast(earthquakes):
+    """The broadcast before batching: one async_to_sync(group_send) per event, to the global group."""
+    channel_layer = get_channel_layer()
+    for earthquake in earthquakes:
+        async_to_sync(channel_layer.group_send)(
+            GLOBAL_GROUP, {"type": "send_earthquake_update", "earthquake": earthquake}
+        )
+
+
+async def broadcast_round(broadcast, earthquakes, consumers):
+    """
+    Join `consumers` channels to the global group, run `broadcast` from a
+    worker thread as ingest does, and return (group_send calls, seconds
+    until each consumer had every event).
+    """
+    layer = get_channel_layer()
+    group_sends = 0
+    real_group_send = layer.group_send
+
+    async def counting_group_send(group, message):
+        nonlocal group_sends
+        group_sends += 1
+        await real_group_send(group, message)
+
+    layer.group_send = counting_group_send
+    channels = [await layer.new_channel() for _ in range(consumers)]
+    for channel in channels:
+        await layer.group_add(GLOBAL_GROUP, channel)
+
+    async def consume(channel):
+        received = 0
+        while received < len(earthquakes):
+            message = await layer.receive(channel)
+            received += len(message["earthquakes"]) if "earthquakes" in message else 1
+        return time.perf_counter()
+
+    try:
+        receivers = [asyncio.ensure_future(consume(channel)) for channel in channels]
+        started = time.perf_counter()
+        await sync_to_async(broadcast)(earthquakes)
+        finished = await asyncio.wait_for(asyncio.gather(*receivers), timeout=300)
+    finally:
+        for channel in channels:
+            await layer.group_discard(GLOBAL_GROUP, channel)
+        del layer.group_send
+    return group_sends, [finish - started for finish in finished]
+
+
+@benchmark('broadcast', 1_000, "broadcast of a burst to `size` consumers on an in-memory layer: per-event sends against batches")
+def broadcast(size, repeat):
+    """
+    BROADCAST_EVENTS new earthquakes sent to `size` unsubscribed consumers
+    (channels in the global group) with the per-event group_send loop and
+    with broadcast_earthquakes. Reports group_send calls per event, which
+    with channels_redis are Redis round trips, and how long until each
+    consumer had the whole burst. The replay buffer is left out; it adds two
+    Redis round trips per broadcast.
+    """
+    earthquakes = [
+        EarthquakeDataService.serialize_earthquake(Earthquake(id=i + 1, **quake))
+        for i, quake in enumerate(EarthquakeDataService.parse_features(synthetic_features(BROADCAST_EVENTS)))
+    ]
+
+    with override_settings(CHANNEL_LAYERS=BROADCAST_LAYER), \
+            mock.patch.object(BroadcastLog, 'append', side_effect=lambda batch: batch):
+        for name, send in (("group_send per event", legacy_broadcast), ("batched", EarthquakeDataService.broadcast_earthquakes)):
+            latencies, group_sends = [], 0
+            for _ in range(repeat):
+                group_sends, round_latencies = async_to_sync(broadcast_round)(send, earthquakes, size)
+                latencies += round_latencies
+            yield (
+                f"📍 {name}: {group_sends / len(earthquakes):.2f} group_send calls per event, "
+                f"burst delivered {latency_summary(latencies)} across consumers"
+            )
+
+
+BACKEND_CHILD = """
+import json, resource, statistics, sys, time
+import django
+django.setup()
+set_up = time.perf_counter()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+import numpy as np
+from earthquake_app.predictions import BACKENDS, FEATURES, FORECAST_DAYS, WINDOW_SIZE
+
+name, regions, repeat = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+windows = np.random.default_rng(0).random((regions, WINDOW_SIZE, len(FEATURES)), dtype=np.float32)
+backend = BACKENDS[name]()
+backend.load()
+backend.scaler_affine()
+rollout = backend.rollout(FORECAST_DAYS)
+rollout(windows)  # The first forecast builds (for TensorFlow, traces) the rollout
+cold_start = time.perf_counter() - set_up
+
+latencies = []
+for _ in range(repeat):
+    started = time.perf_counter()
+    rollout(windows)
+    latencies.append(time.perf_counter() - started)
+print(json.dumps({
+    "cold_start": cold_start,
+    "seconds": statistics.median(latencies),
+    "baseline_kb": baseline,
+    "peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+# name: (runtime modules, any one of which will do; model artifact)
+BACKEND_REQUIREMENTS = {
+    "tensorflow": (("tensorflow",), LSTM_MODEL_PATH),
+    "onnx": (("onnxruntime",), ONNX_MODEL_PATH),
+    "tflite": (("tflite_runtime", "tensorflow"), TFLITE_MODEL_PATH),
+    "numpy": (("numpy",), NUMPY_WEIGHTS_PATH),
+}
+
+
+@benchmark('backends', 50, "30-day forecast of `size` regions on each inference backend: latency, RSS, cold start")
+def backends(size, repeat):
+    """
+    Each available backend runs in a fresh subprocess: cold start is the
+    time from django.setup() to the end of the first forecast (imports,
+    load, tracing), RSS the peak above the process right after setup, and
+    latency the median of `repeat` further forecasts. Backends whose
+    runtime is not installed or whose artifact was not exported are skipped.
+    """
+    for name, (modules, artifact) in BACKEND_REQUIREMENTS.items():
+        if not any(find_spec(module) for module in modules):
+            yield f"📍 {name}: skipped, needs {' or '.join(modules)}"
+            continue
+        if not os.path.exists(artifact):
+            yield f"📍 {name}: skipped, run `manage.py export_lstm_model --format={name}` first"
+            continue
+
+        result = run_child(BACKEND_CHILD, name, size, repeat)
+        yield (
+            f"📍 {name}: {milliseconds(result['seconds'])} per forecast, "
+            f"+{(result['peak_kb'] - result['baseline_kb']) / 1024:.0f} MB peak RSS, "
+            f"cold start {milliseconds(result['cold_start'])}"
+        )
+
+
+def legacy_statistics(window):
+    """DashboardView.get_statistics before the single aggregate, for one window: four queries, plus the rows."""
+    recent_quakes = Earthquake.objects.filter(time__gte=timezone.now() - WINDOWS[window]).select_related()
+    return {
+        'total': recent_quakes.count(),
+        'avg_magnitude': round(recent_quakes.aggregate(Avg('magnitude'))['magnitude__avg'] or 0, 2),
+        'active_alerts': recent_quakes.filter(Q(status='alert') | Q(magnitude__gte=4.5)).count(),
+        # Truth-testing the queryset fetched every row of the window
+        'highest_magnitude': recent_quakes.order_by('-magnitude').first().magnitude if recent_quakes else 0,
+    }
+
+
+@benchmark('stats', 1_000_000, "dashboard statistics on `size` rows: per-window queries against the single aggregate")
+def stats(size, repeat):
+    """
+    Seeds `size` events over 60 days, then computes the statistics of every
+    dashboard window the old way (four queries and a full fetch per window)
+    and with EarthquakeStatsService.compute. The seeded rows are deleted
+    after.
+    """
+    seed_earthquakes(size, 60)
+    try:
+        windows = DashboardDataService.STATS_WINDOWS
+
+        def legacy():
+            return {window: legacy_statistics(window) for window in windows}
+
+        def current():
+            return EarthquakeStatsService.compute(windows)
+
+        for name, compute in (("query per statistic", legacy), ("single aggregate", current)):
+            runs = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    _, seconds = timed(compute)
+                runs.append(seconds)
+            yield f"📍 {name}: {milliseconds(statistics.median(runs))} in {len(queries)} queries for {len(windows)} windows"
+    finally:
+        delete_synthetic()
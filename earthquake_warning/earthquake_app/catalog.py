@@ -0,0 +1,249 @@
+import json
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from django.db import connection
+
+from .models import Earthquake
+
+# Columns exported for retraining; FEATURES in predictions.py is a subset
+COLUMNS = ("id", "usgs_id", "time", "magnitude", "latitude", "longitude", "depth", "status")
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("usgs_id", pa.string()),
+    ("time", pa.timestamp("us", tz="UTC")),
+    ("magnitude", pa.float64()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("depth", pa.float64()),
+    ("status", pa.string()),
+])
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+STATE_FILE = "_export_state.json"
+
+
+class CatalogExporter:
+    """
+    Streams the Earthquake catalog (real events only) into monthly
+    partitions, `year=YYYY/month=MM/part-<first id>-<last id>.<ext>`, one
+    part file per month touched by each run.
+
+    Rows are read in primary-key order through a server-side cursor
+    (QuerySet.iterator on PostgreSQL), so memory stays bounded by
+    `chunk_size` whatever the table size. Rows are never updated after
+    ingest, so an id watermark is a complete incremental checkpoint; each
+    run appends new part files next to the old ones. Part files are
+    written as .tmp and only renamed into place when the run succeeds.
+
+    Ids are allocated before commit, so a concurrent ingest can still commit
+    ids below the highest one already visible. On PostgreSQL the watermark
+    is therefore the id sequence's value at the start of the run, after
+    waiting for every transaction that could hold a lower id to finish.
+    """
+    SETTLE_TIMEOUT = 60  # Seconds to wait for older transactions
+    SETTLE_INTERVAL = 0.5
+
+    def __init__(self, directory, file_format="parquet", chunk_size=50_000):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown format: {file_format}")
+        self.directory = directory
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.writers = {}
+
+    def load_state(self):
+        try:
+            with open(os.path.join(self.directory, STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"last_id": 0, "rows": 0}
+
+    def save_state(self, state):
+        path = os.path.join(self.directory, STATE_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)  # Never leave a half-written checkpoint
+
+    def export(self, full=False):
+        """Export rows added since the last run (or everything if `full`). Returns the row count."""
+        os.makedirs(self.directory, exist_ok=True)
+        if full:
+            self.clear()
+        else:
+            self.clear(temporary_only=True)  # Leftovers of a run that was killed
+        state = {"last_id": 0, "rows": 0} if full else self.load_state()
+        self.first_id = state["last_id"] + 1
+
+        rows = (Earthquake.objects
+            .exclude(status="predicted")
+            .filter(prediction_run__isnull=True, id__gt=state["last_id"])
+        )
+        upper = self.settled_id()
+        if upper is not None:
+            rows = rows.filter(id__lte=upper)
+        rows = rows.order_by("id").values_list(*COLUMNS).iterator(chunk_size=self.chunk_size)
+
+        exported = 0
+        chunk = []
+        try:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk)
+                    exported += len(chunk)
+                    chunk = []
+            if chunk:
+                self.write_chunk(chunk)
+                exported += len(chunk)
+        except BaseException:
+            # Nothing is promoted and the checkpoint stays put, so the next run redoes this range
+            self.abort()
+            raise
+        self.close()
+
+        last_id = upper if upper is not None else (self.last_id if exported else state["last_id"])
+        if last_id != state["last_id"]:
+            state = {
+                "last_id": last_id,
+                "rows": state["rows"] + exported,
+                "exported_at": datetime.now(dt_timezone.utc).isoformat(),
+            }
+            self.save_state(state)
+        return exported
+
+    def settled_id(self):
+        """
+        The highest id no running transaction can still commit below, or
+        None where writers are serialized (SQLite). Raises RuntimeError if
+        older transactions do not finish within SETTLE_TIMEOUT.
+        """
+        if connection.vendor != "postgresql":
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [Earthquake._meta.db_table])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END, clock_timestamp() FROM {sequence}")
+            upper, read_at = cursor.fetchone()
+
+            # Any id <= upper was taken by a transaction already open at read_at
+            deadline = time.monotonic() + self.SETTLE_TIMEOUT
+            while True:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE xact_start <= %s AND pid <> pg_backend_pid() "
+                    "AND datname = current_database() AND backend_type = 'client backend'",
+                    [read_at],
+                )
+                if not cursor.fetchone()[0]:
+                    return upper
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"Transactions older than {read_at:%H:%M:%S} are still open; retry the export later"
+                    )
+                time.sleep(self.SETTLE_INTERVAL)
+
+    def clear(self, temporary_only=False):
+        """Remove previously exported part files and the checkpoint, or only unfinished .tmp parts."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith("part-") and name.endswith(".tmp"):
+                    os.remove(os.path.join(root, name))
+                elif not temporary_only and (name == STATE_FILE or name.startswith("part-")):
+                    os.remove(os.path.join(root, name))
+
+    def write_chunk(self, chunk):
+        """Split a chunk by month and append each piece to that month's open part file."""
+        columns = list(zip(*chunk))
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, SCHEMA)],
+            schema=SCHEMA,
+        )
+        self.last_id = chunk[-1][0]
+
+        months = np.array([(moment.year, moment.month) for moment in columns[2]])
+        for year, month in np.unique(months, axis=0):
+            mask = (months[:, 0] == year) & (months[:, 1] == month)
+            self.writer(int(year), int(month)).write_table(table.filter(pa.array(mask)))
+
+    def writer(self, year, month):
+        """The open part file for a month, created on first use in this run."""
+        if (year, month) not in self.writers:
+            partition = os.path.join(self.directory, f"year={year}", f"month={month:02d}")
+            os.makedirs(partition, exist_ok=True)
+            path = os.path.join(partition, f"part-{self.first_id}{FORMATS[self.file_format]}.tmp")
+            if self.file_format == "parquet":
+                writer = pq.ParquetWriter(path, SCHEMA, compression="zstd")
+            else:
+                writer = ipc.new_file(path, SCHEMA)
+            self.writers[(year, month)] = (writer, path)
+        return self.writers[(year, month)][0]
+
+    def close(self):
+        """Close all part files, renaming them into place once complete."""
+        for writer, path in self.writers.values():
+            writer.close()
+            final = path.removesuffix(".tmp")
+            base, extension = os.path.splitext(final)
+            os.replace(path, f"{base}-{self.last_id}{extension}")
+        self.writers = {}
+
+    def abort(self):
+        """Close and delete the part files of a failed run."""
+        for writer, path in self.writers.values():
+            try:
+                writer.close()
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.writers = {}
+
+
+def iter_month_tables(directory, columns=COLUMNS):
+    """
+    Yield one Arrow table per exported month, oldest month first, sorted by
+    time. Arrow IPC parts are memory-mapped and Parquet parts are read one
+    month at a time, so only a single month is ever materialized (by the
+    concatenation and sort).
+    """
+    for root, _, files in sorted(os.walk(directory)):
+        tables = []
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(FORMATS["arrow"]):
+                tables.append(ipc.open_file(pa.memory_map(path, "r")).read_all().select(list(columns)))
+            elif name.endswith(FORMATS["parquet"]):
+                tables.append(pq.read_table(path, columns=list(columns), memory_map=True))
+        if tables:
+            yield pa.concat_tables(tables).sort_by("time")
+
+
+def read_catalog(directory, columns=COLUMNS):
+    """Read every exported partition into one Arrow table sorted by time. Copies the whole catalog."""
+    tables = list(iter_month_tables(directory, columns))
+    if not tables:
+        return SCHEMA.empty_table().select(list(columns))
+    return pa.concat_tables(tables)
+
+
+def iter_training_windows(directory, window=30, features=("magnitude", "latitude", "longitude", "depth")):
+    """
+    Yield (window, target) pairs for retraining: `window` consecutive
+    events (window, features) oldest-first, and the event that followed
+    them (features,). Works month by month, carrying the last `window`
+    events over, so memory is bounded by one month rather than the
+    catalog. Windows are read-only views into that month's array.
+    """
+    carry = np.empty((0, len(features)))
+    for table in iter_month_tables(directory, columns=("time",) + tuple(features)):
+        values = np.concatenate([carry, np.column_stack([table.column(name).to_numpy() for name in features])])
+        if len(values) > window:
+            windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0).transpose(0, 2, 1)
+            for start in range(len(values) - window):
+                yield windows[start], values[start + window]
+        carry = values[-window:]
@@ -1,21 +1,123 @@
 import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.layers import get_channel_layer
 from django.utils import timezone
+from .subscriptions import GLOBAL_GROUP, Subscription
+from .replay import BroadcastLog
 
 class EarthquakeConsumer(AsyncWebsocketConsumer):
+    REPLAY_FRAME_SIZE = 200
+
     async def connect(self):
         """Handles WebSocket connection and joins the update group."""
-        await self.channel_layer.group_add("earthquake_updates", self.channel_name)
+        self.subscription = None
+        self.joined_groups = set()
+        await self.set_groups([GLOBAL_GROUP])
         await self.accept()
         print("✅ WebSocket Connected")
 
+        # Reconnecting clients pass the last sequence number they saw
+        resume_from = parse_qs(self.scope.get("query_string", b"").decode()).get("resume_from")
+        if resume_from:
+            await self.replay(resume_from[0])
+        else:
+            # Gives new clients a baseline to resume from after a disconnect
+            current = await sync_to_async(BroadcastLog.current)()
+            await self.send(text_data=json.dumps({"type": "sequence", "seq": current}))
+
     async def disconnect(self, close_code):
-        """Handles WebSocket disconnection and removes from group."""
-        await self.channel_layer.group_discard("earthquake_updates", self.channel_name)
+        """Handles WebSocket disconnection and removes from all joined groups."""
+        await self.set_groups([])
         print("❌ WebSocket Disconnected")
 
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Handles subscription messages. A subscribed client only joins the
+        grid-cell groups covering its area, so other events never reach it.
+        """
+        try:
+            message = json.loads(text_data or "")
+        except json.JSONDecodeError:
+            await self.send_error("Messages must be JSON")
+            return
+
+        action = message.get("action")
+        if action == "subscribe":
+            try:
+                subscription = Subscription.from_message(message)
+            except ValueError as e:
+                await self.send_error(str(e))
+                return
+            groups = subscription.groups()
+            await self.set_groups(groups)
+            self.subscription = subscription
+            await self.send(text_data=json.dumps({"type": "subscribed", "cells": len(groups)}))
+            if message.get("resume_from") is not None:
+                await self.replay(message["resume_from"])
+        elif action == "unsubscribe":
+            self.subscription = None
+            await self.set_groups([GLOBAL_GROUP])
+            await self.send(text_data=json.dumps({"type": "unsubscribed"}))
+        else:
+            await self.send_error(f"Unknown action: {action}")
+
+    async def replay(self, resume_from):
+        """
+        Sends the events broadcast after `resume_from`, filtered by the
+        subscription. Frames may overlap live ones; clients drop seq they have seen.
+        """
+        try:
+            resume_from = int(resume_from)
+        except (TypeError, ValueError):
+            await self.send_error("resume_from must be an integer sequence number")
+            return
+
+        earthquakes, complete = await sync_to_async(BroadcastLog.since)(resume_from)
+        if not complete:
+            # Part of the gap fell out of the replay buffer, or the client is
+            # ahead of a reset counter: it refreshes and restarts from `seq`
+            current = await sync_to_async(BroadcastLog.current)()
+            await self.send(text_data=json.dumps({"type": "resync", "seq": current}))
+
+        if self.subscription:
+            earthquakes = [quake for quake in earthquakes if self.subscription.matches(quake)]
+        for start in range(0, len(earthquakes), self.REPLAY_FRAME_SIZE):
+            await self.send(text_data=json.dumps({
+                "type": "earthquake_batch",
+                "earthquakes": earthquakes[start:start + self.REPLAY_FRAME_SIZE],
+                "replay": True,
+            }))
+
+    async def set_groups(self, groups):
+        """Move this socket to exactly `groups`, only touching the difference."""
+        groups = set(groups)
+        for group in self.joined_groups - groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in groups - self.joined_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.joined_groups = groups
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({"type": "error", "message": message}))
+
     async def send_earthquake_update(self, event):
         """Sends earthquake updates to all connected WebSocket clients."""
         earthquake = event["earthquake"]
+        if self.subscription and not self.subscription.matches(earthquake):
+            return
         await self.send(text_data=json.dumps(earthquake))
+
+    async def send_earthquake_batch(self, event):
+        """Forwards a batch of new earthquakes to the client as a single frame."""
+        earthquakes = event["earthquakes"]
+        if self.subscription:
+            # Groups route by cell; apply the exact area and magnitude check here
+            earthquakes = [quake for quake in earthquakes if self.subscription.matches(quake)]
+            if not earthquakes:
+                return
+        await self.send(text_data=json.dumps({
+            "type": "earthquake_batch",
+            "earthquakes": earthquakes,
+        }))
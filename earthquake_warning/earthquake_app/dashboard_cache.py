@@ -0,0 +1,115 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardCache:
+    """
+    Versioned cache for dashboard data and statistics.
+
+    Keys embed a data version that ingest bumps only when new rows are
+    created, so fresh quakes show up immediately and idle periods keep
+    serving the same entry. Entries that depend on the version alone keep
+    it for TIMEOUT; entries computed over windows relative to now (e.g.
+    "last 24h") pass WINDOW_TIMEOUT, which bounds their drift while nothing
+    new arrives.
+    """
+    VERSION_KEY = 'earthquake_data_version'
+    COUNTER_PREFIX = 'dashboard_cache_counter'
+    EVENTS = ('hit', 'miss', 'stale', 'recompute')
+    TIMEOUT = getattr(settings, 'EARTHQUAKE_CACHE_TIMEOUT', 3600)
+    WINDOW_TIMEOUT = getattr(settings, 'EARTHQUAKE_CACHE_WINDOW_TIMEOUT', 300)
+    LOCK_TIMEOUT = 30
+    WAIT_INTERVAL = 0.05
+    WAIT_STEPS = 40
+
+    @classmethod
+    def version(cls):
+        return cache.get_or_set(cls.VERSION_KEY, 1, None)
+
+    @classmethod
+    def bump(cls):
+        """Invalidate every dashboard entry by moving to a new data version."""
+        try:
+            return cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            cache.add(cls.VERSION_KEY, 1, None)
+            return cache.incr(cls.VERSION_KEY)
+
+    @classmethod
+    def key(cls, name, version=None):
+        return f"{name}:v{version or cls.version()}"
+
+    @classmethod
+    def get_or_compute(cls, name, compute, timeout=None):
+        """
+        Return the cached value for the current version, computing it on a miss.
+        `timeout` defaults to TIMEOUT.
+
+        Concurrent misses across workers compute the value once: the first
+        one takes a short lock, the others serve the previous version's value
+        if there is one, or wait briefly for the new one.
+        """
+        key = cls.key(name)
+        value = cache.get(key)
+        if value is not None:
+            cls.count('hit', name)
+            return value
+
+        cls.count('miss', name)
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, True, cls.LOCK_TIMEOUT):
+            try:
+                return cls.store(name, compute(), key, timeout)
+            finally:
+                cache.delete(lock_key)
+
+        stale = cache.get(f"{name}:latest")
+        if stale is not None:
+            cls.count('stale', name)
+            return stale
+
+        for _ in range(cls.WAIT_STEPS):
+            time.sleep(cls.WAIT_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                cls.count('hit', name)
+                return value
+
+        logger.warning(f"⚠️ Timed out waiting for {key}; computing without caching")
+        return compute()
+
+    @classmethod
+    def store(cls, name, value, key=None, timeout=None):
+        """Write a freshly computed value for the current version (write-through)."""
+        cache.set_many({key or cls.key(name): value, f"{name}:latest": value}, timeout or cls.TIMEOUT)
+        cls.count('recompute', name)
+        return value
+
+    @classmethod
+    def count(cls, event, name):
+        key = f"{cls.COUNTER_PREFIX}:{event}:{name}"
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, None):
+                # Another process created the counter first; count on top of it
+                cache.incr(key)
+
+    @classmethod
+    def counters(cls, names):
+        """Hit/miss/stale/recompute counters per cached entry."""
+        keys = {
+            f"{cls.COUNTER_PREFIX}:{event}:{name}": (name, event)
+            for name in names for event in cls.EVENTS
+        }
+        values = cache.get_many(list(keys))
+        result = {name: {event: 0 for event in cls.EVENTS} for name in names}
+        for key, count in values.items():
+            name, event = keys[key]
+            result[name][event] = count
+        return result
@@ -0,0 +1,96 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.radians(1) * EARTH_RADIUS_KM  # About 111.195 km along a great circle
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def grid_cell(latitude, longitude, degrees):
+    """(row, column) of the `degrees`-sized lat/lon grid cell containing a point."""
+    row = min(int((latitude + 90) // degrees), int(180 // degrees) - 1)
+    column = min(int((longitude + 180) // degrees), int(360 // degrees) - 1)
+    return row, column
+
+
+def radius_bounding_box(latitude, longitude, radius_km):
+    """(west, south, east, north) covering a circle; west > east when it crosses the antimeridian."""
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    if south == -90.0 or north == 90.0:
+        return (-180.0, south, 180.0, north)  # The circle covers a pole
+
+    dlon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(max(abs(south), abs(north)))))
+    if dlon >= 180:
+        return (-180.0, south, 180.0, north)
+    west = (longitude - dlon + 180) % 360 - 180
+    east = (longitude + dlon + 180) % 360 - 180
+    return (west, south, east, north)
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # About 5 m, stored on every event
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Standard base-32 geohash of a point."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        bounds, value = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision):
+    """(width, height) in degrees of a geohash cell of `precision` characters."""
+    bits = 5 * precision
+    return 360.0 / 2 ** ((bits + 1) // 2), 180.0 / 2 ** (bits // 2)
+
+
+def geohash_cover(west, south, east, north, max_cells=32, max_precision=6):
+    """
+    The geohash prefixes covering a bounding box: the finest precision (up
+    to `max_precision`) at which at most `max_cells` cells are needed.
+    A box with west > east crosses the antimeridian.
+    """
+    if west > east:
+        return sorted(set(
+            geohash_cover(west, south, 180.0, north, max_cells // 2, max_precision)
+            + geohash_cover(-180.0, south, east, north, max_cells // 2, max_precision)
+        ))
+
+    for precision in range(max_precision, 0, -1):
+        width, height = geohash_cell_size(precision)
+        last_row, last_column = int(180 / height) - 1, int(360 / width) - 1
+        rows = range(min(int((south + 90) // height), last_row), min(int((north + 90) // height), last_row) + 1)
+        columns = range(min(int((west + 180) // width), last_column), min(int((east + 180) // width), last_column) + 1)
+        if len(rows) * len(columns) <= max_cells:
+            break
+
+    return sorted({
+        geohash_encode(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+        for row in rows
+        for column in columns
+    })
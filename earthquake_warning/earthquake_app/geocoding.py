@@ -0,0 +1,86 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_PLACE = "Unknown Location"
+
+
+class ReverseGeocoder:
+    """
+    Batched, memoized reverse geocoding shared by predictions and ingest.
+
+    The reverse_geocoder place index (a KD-tree over GeoNames cities) is a
+    per-process singleton, always used in single-process mode so no
+    multiprocessing pool is spawned inside Celery tasks. Coordinates are
+    snapped to a grid of QUANTUM degrees and results are kept in an LRU memo
+    keyed by grid cell; each call sends only the distinct cells it has not
+    seen to the KD-tree, in one query.
+    """
+    QUANTUM = getattr(settings, 'EARTHQUAKE_GEOCODE_QUANTUM', 0.01)
+    MEMO_SIZE = getattr(settings, 'EARTHQUAKE_GEOCODE_MEMO_SIZE', 100_000)
+
+    _loaded = False
+    _memo = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def search(cls, coordinates):
+        """Query the place index, building it on the first call."""
+        import reverse_geocoder as rg
+
+        if not cls._loaded:
+            with cls._lock:
+                if not cls._loaded:
+                    logger.info("🔄 Loading reverse geocoding index...")
+                    rg.search([(0.0, 0.0)], mode=1, verbose=False)
+                    cls._loaded = True
+                    logger.info("✅ Reverse geocoding index loaded")
+        return rg.search(coordinates, mode=1, verbose=False)
+
+    @classmethod
+    def preload(cls):
+        cls.search([(0.0, 0.0)])
+
+    @classmethod
+    def cell(cls, latitude, longitude):
+        return (round(latitude / cls.QUANTUM), round(longitude / cls.QUANTUM))
+
+    @classmethod
+    def places(cls, coordinates):
+        """
+        Return a "City, CC" place name for each (latitude, longitude) pair,
+        in order. Falls back to UNKNOWN_PLACE if the index can't be queried.
+        """
+        cells = [cls.cell(float(latitude), float(longitude)) for latitude, longitude in coordinates]
+
+        with cls._lock:
+            known = {cell: cls._memo[cell] for cell in set(cells) if cell in cls._memo}
+            for cell in known:
+                cls._memo.move_to_end(cell)
+
+        missing = [cell for cell in dict.fromkeys(cells) if cell not in known]
+        if missing:
+            try:
+                locations = cls.search([
+                    (row * cls.QUANTUM, column * cls.QUANTUM) for row, column in missing
+                ])
+            except Exception as e:
+                logger.error(f"❌ Reverse geocoding failed: {e}")
+                return [known.get(cell, UNKNOWN_PLACE) for cell in cells]
+
+            found = {cell: f"{location['name']}, {location['cc']}" for cell, location in zip(missing, locations)}
+            known.update(found)
+            with cls._lock:
+                cls._memo.update(found)
+                while len(cls._memo) > cls.MEMO_SIZE:
+                    cls._memo.popitem(last=False)
+
+        return [known[cell] for cell in cells]
+
+    @classmethod
+    def place(cls, latitude, longitude):
+        return cls.places([(latitude, longitude)])[0]
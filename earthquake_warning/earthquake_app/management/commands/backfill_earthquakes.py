@@ -0,0 +1,113 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from earthquake_app.models import BackfillCheckpoint
+from earthquake_app.partitions import EarthquakePartitions
+from earthquake_app.services import EarthquakeDataService
+
+
+def parse_datetime_arg(value):
+    """Parse an ISO date/datetime argument as an aware UTC datetime."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value}. Use YYYY-MM-DD or an ISO datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Backfill historical earthquakes from the USGS FDSN event API in parallel, resumable time slices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, type=parse_datetime_arg, help="Start date (YYYY-MM-DD)")
+        parser.add_argument('--end', type=parse_datetime_arg, default=None, help="End date (YYYY-MM-DD), defaults to now")
+        parser.add_argument('--min-mag', type=float, default=2.5, help="Minimum magnitude")
+        parser.add_argument('--slice-days', type=int, default=7, help="Length of each time slice in days")
+        parser.add_argument('--workers', type=int, default=4, help="Number of slices fetched concurrently")
+
+    def handle(self, *args, **options):
+        start = options['start']
+        end = options['end'] or timezone.now()
+        min_mag = options['min_mag']
+        slice_length = timedelta(days=options['slice_days'])
+
+        if start >= end:
+            raise CommandError("--start must be before --end")
+
+        slices = []
+        slice_start = start
+        while slice_start < end:
+            slice_end = min(slice_start + slice_length, end)
+            slices.append((slice_start, slice_end))
+            slice_start = slice_end
+
+        completed = set(
+            BackfillCheckpoint.objects.filter(
+                min_magnitude=min_mag, start__gte=start, end__lte=end
+            ).values_list('start', 'end')
+        )
+        pending = [s for s in slices if s not in completed]
+
+        if pending and EarthquakePartitions.is_partitioned():
+            # Past months need their own partitions, or the rows all land in the default one
+            created = EarthquakePartitions.ensure_partitions(pending[0][0], pending[-1][1])
+            if created:
+                self.stdout.write(f"🗄️ Created partitions: {', '.join(created)}")
+
+        self.stdout.write(
+            f"🔄 Backfilling {len(pending)} of {len(slices)} slices "
+            f"({len(slices) - len(pending)} already checkpointed) with {options['workers']} workers"
+        )
+
+        started = time.monotonic()
+        total_events = stored_events = failed = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(self.backfill_slice, slice_start, slice_end, min_mag): (slice_start, slice_end)
+                for slice_start, slice_end in pending
+            }
+            for future in as_completed(futures):
+                slice_start, slice_end = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"❌ Slice {slice_start:%Y-%m-%d} - {slice_end:%Y-%m-%d} failed: {e}")
+                    continue
+
+                total_events += summary["total"]
+                stored_events += summary["stored"]
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"📍 {slice_start:%Y-%m-%d} - {slice_end:%Y-%m-%d}: {summary['total']} events, "
+                    f"{summary['stored']} new ({total_events / elapsed:.1f} events/sec)"
+                )
+
+        elapsed = time.monotonic() - started
+        rate = total_events / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Backfill finished: {total_events} events fetched, {stored_events} stored "
+            f"in {elapsed:.1f}s ({rate:.1f} events/sec)"
+        ))
+        if failed:
+            self.stderr.write(f"⚠️ {failed} slices failed; re-run the same command to resume them.")
+
+    def backfill_slice(self, slice_start, slice_end, min_mag):
+        """Fetch one slice and checkpoint it. Runs in a worker thread."""
+        try:
+            summary = EarthquakeDataService.backfill_slice(slice_start, slice_end, min_mag)
+            BackfillCheckpoint.objects.create(
+                start=slice_start, end=slice_end, min_magnitude=min_mag, events=summary["total"]
+            )
+            return summary
+        finally:
+            # Each worker thread gets its own DB connection; don't leak them
+            connection.close()
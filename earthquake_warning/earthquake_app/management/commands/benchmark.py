@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from earthquake_app.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Run one of the performance benchmarks in earthquake_app.benchmarks against the configured database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS), help="Benchmark to run")
+        parser.add_argument('--size', type=int, default=None, help="Scale of the benchmark; each has its own default")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed repetitions; medians are reported")
+
+    def handle(self, *args, **options):
+        entry = BENCHMARKS[options['name']]
+        size = options['size'] or entry.size
+        if size <= 0 or options['repeat'] <= 0:
+            raise CommandError("--size and --repeat must be positive")
+
+        self.stdout.write(f"🔄 {options['name']}: {entry.description} (size {size})")
+        try:
+            for line in entry.run(size, options['repeat']):
+                self.stdout.write(line)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"✅ {options['name']} finished"))
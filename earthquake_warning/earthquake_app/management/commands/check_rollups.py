@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from earthquake_app.management.commands.backfill_earthquakes import parse_datetime_arg
+from earthquake_app.partitions import EarthquakePartitions
+from earthquake_app.rollups import GRANULARITIES, HOURLY_RETENTION_DAYS, LABELS, RollupService
+
+
+def earliest_checkable(granularity):
+    """
+    Start of the range whose rollups can be recomputed: detail rows before
+    the retention cutoff are gone (the daily rollups are all that is left),
+    and hourly rollups are only kept for HOURLY_RETENTION_DAYS.
+    """
+    cutoff = EarthquakePartitions.retention_cutoff()
+    if granularity == 'hour':
+        # purge_hourly drops every bucket starting before its cutoff, so begin at the next full hour
+        hourly = timezone.now() - timedelta(days=HOURLY_RETENTION_DAYS)
+        cutoff = max(cutoff, hourly.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+    return cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute hourly/daily rollups from the raw earthquakes and diff them against the stored ones. "
+        "With --fix, rewrite the range from raw data (also used to build rollups for existing data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_datetime_arg, default=None, help="Start date (YYYY-MM-DD), defaults to 7 days ago")
+        parser.add_argument('--end', type=parse_datetime_arg, default=None, help="End date (YYYY-MM-DD), defaults to now")
+        parser.add_argument('--granularity', choices=GRANULARITIES, action='append', help="hour and/or day; defaults to both")
+        parser.add_argument('--fix', action='store_true', help="Replace mismatching ranges with recomputed rollups")
+        parser.add_argument('--show', type=int, default=20, help="Mismatches to print per granularity")
+
+    def handle(self, *args, **options):
+        # Whole UTC days, so both granularities compare complete buckets
+        end = options['end'] or timezone.now()
+        end = datetime(end.year, end.month, end.day, tzinfo=dt_timezone.utc) + timedelta(days=1)
+        start = options['start'] or end - timedelta(days=8)
+        start = datetime(start.year, start.month, start.day, tzinfo=dt_timezone.utc)
+        if start >= end:
+            raise CommandError("--start must be before --end")
+
+        inconsistent = False
+        for granularity in options['granularity'] or GRANULARITIES:
+            checked_start = max(start, earliest_checkable(granularity))
+            if checked_start >= end:
+                self.stdout.write(f"⏭️ No {LABELS[granularity]} rollups to check: the range is past retention")
+                continue
+            if checked_start > start:
+                self.stdout.write(f"⏭️ Checking {LABELS[granularity]} rollups from {checked_start:%Y-%m-%d %H:%M}; older detail rows were retired")
+
+            mismatches = RollupService.diff(granularity, checked_start, end)
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS(f"✅ {LABELS[granularity]} rollups match raw data from {checked_start:%Y-%m-%d} to {end:%Y-%m-%d}"))
+                continue
+
+            inconsistent = True
+            self.stderr.write(f"❌ {len(mismatches)} {LABELS[granularity]} buckets differ (stored vs recomputed):")
+            for key, stored, expected in mismatches[:options['show']]:
+                bucket_start, row, column, bucket = key
+                self.stderr.write(f"   {bucket_start} cell {row},{column} bucket {bucket}: {stored} != {expected}")
+
+            if options['fix']:
+                written = RollupService.recompute(granularity, checked_start, end)
+                self.stdout.write(f"🔧 Rewrote {LABELS[granularity]} rollups: {written} rows")
+
+        if inconsistent and not options['fix']:
+            raise CommandError("Rollups are inconsistent; re-run with --fix to rebuild them")
@@ -0,0 +1,110 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from earthquake_app.alerts import AlertDispatcher
+from earthquake_app.benchmarks import delete_synthetic, seed_earthquakes
+from earthquake_app.models import Earthquake, PredictionRun
+from earthquake_app.predictions import GLOBAL_REGION, EarthquakePredictionService
+from earthquake_app.queries import EarthquakeQuery
+from earthquake_app.services import DashboardDataService, EarthquakeDataService
+from earthquake_app.stats import EarthquakeStatsService
+from earthquake_app.views import AlertsView, predicted_earthquakes
+
+SEED_DAYS = 2 * 365
+INDEX_SCAN_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def check_plan(plan):
+    """
+    (uses_index, unbounded) for a JSON EXPLAIN ANALYZE plan. `unbounded`
+    lists index scans with no Index Cond that discard more rows than they
+    return: they walk the index from one end and filter, so their cost grows
+    with the data instead of with the result.
+    """
+    nodes = list(plan_nodes(plan[0]['Plan']))
+    scans = [node for node in nodes if node['Node Type'] in INDEX_SCAN_NODES]
+    unbounded = [
+        node.get('Index Name', node['Node Type']) for node in scans
+        if 'Index Cond' not in node and node.get('Rows Removed by Filter', 0) > node.get('Actual Rows', 0)
+    ]
+    return bool(scans), unbounded
+
+
+def canonical_queries():
+    """The hot Earthquake querysets, taken from the code that runs them."""
+    last_24h = timezone.now() - timedelta(days=1)
+    run = PredictionRun.active()
+    return [
+        ("AlertDispatcher.pending", AlertDispatcher.pending()),
+        ("EarthquakeDataService.get_alerts", EarthquakeDataService.get_alerts()),
+        ("AlertsView.get_queryset", AlertsView().get_queryset()),
+        ("DashboardDataService.latest_earthquakes", DashboardDataService.latest_earthquakes()),
+        ("EarthquakeStatsService.queryset", EarthquakeStatsService.queryset(DashboardDataService.STATS_WINDOWS)),
+        ("get_recent_earthquakes", Earthquake.get_recent_earthquakes()[:100]),
+        ("EarthquakePredictionService.past_earthquakes", EarthquakePredictionService.past_earthquakes()),
+        ("EarthquakePredictionService.regional_window_rows", EarthquakePredictionService.regional_window_rows()),
+        ("PredictionRun.active", PredictionRun.completed()[:1]),
+        ("get_predicted_earthquakes", predicted_earthquakes(run.id if run else 0, GLOBAL_REGION)),
+        ("list_earthquakes (deep page)", EarthquakeQuery({
+            "min_magnitude": "2.5",
+            "cursor": EarthquakeQuery.encode_cursor(last_24h, 1),
+        }).queryset()),
+        ("list_earthquakes (radius)", EarthquakeQuery({"near": "139.7,35.7", "radius_km": "300"}).queryset()),
+        ("list_earthquakes (bbox)", EarthquakeQuery({"bbox": "-125,32,-114,42"}).queryset()),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN ANALYZE on the hot Earthquake queries and report whether each uses an index as a bound"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Insert this many synthetic rows over two years first (e.g. 1000000)")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="Delete the synthetic rows when done")
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help="Print the full plan for every query")
+        parser.add_argument('--strict', action='store_true',
+                            help="Exit with an error if any query does not use an index, or only filters one")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("EXPLAIN ANALYZE output is only interpreted for PostgreSQL")
+
+        if options['seed']:
+            self.stdout.write(f"🔄 Seeding {options['seed']} synthetic earthquakes...")
+            seed_earthquakes(options['seed'], SEED_DAYS)
+            self.stdout.write(f"✅ Seeded {options['seed']} rows")
+
+        missing = []
+        try:
+            for name, queryset in canonical_queries():
+                uses_index, unbounded = check_plan(json.loads(queryset.explain(format='json', analyze=True)))
+                if not uses_index:
+                    missing.append(name)
+                    self.stdout.write(self.style.WARNING(f"⚠️ {name}: no index scan"))
+                elif unbounded:
+                    missing.append(name)
+                    self.stdout.write(self.style.WARNING(
+                        f"⚠️ {name}: index scan without an index condition ({', '.join(unbounded)})"
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"✅ {name}: index scan"))
+                if options['verbose_plans'] or not uses_index or unbounded:
+                    self.stdout.write(queryset.explain(analyze=True) + "\n")
+        finally:
+            if options['cleanup']:
+                self.stdout.write(f"🧹 Deleted {delete_synthetic()} synthetic rows")
+
+        if missing and options['strict']:
+            raise CommandError(f"Queries without a bounded index scan: {', '.join(missing)}")
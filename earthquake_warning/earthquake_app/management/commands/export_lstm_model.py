@@ -0,0 +1,150 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from earthquake_app.predictions import (
+    BACKENDS, FEATURES, FORECAST_DAYS, NUMPY_WEIGHTS_PATH, ONNX_MODEL_PATH, SCALER_AFFINE_PATH,
+    TFLITE_MODEL_PATH, WINDOW_SIZE, TensorFlowBackend, scaler_affine,
+)
+
+FORMATS = ('onnx', 'tflite', 'numpy')
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the Keras LSTM and its scalers for the lightweight inference backends "
+        "(ONNX, TFLite, pure NumPy), optionally checking them against TensorFlow"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', dest='formats', action='append', choices=FORMATS,
+            help="Format to export; repeat for several. Defaults to all",
+        )
+        parser.add_argument('--check', action='store_true', help="Compare each export with the TensorFlow model")
+        parser.add_argument('--tolerance', type=float, default=1e-4, help="Max absolute difference of one step allowed by --check")
+        parser.add_argument(
+            '--rollout-tolerance', type=float, default=1e-3,
+            help="Max absolute difference of the full autoregressive rollout, where step errors compound",
+        )
+        parser.add_argument('--batch', type=int, default=50, help="Regions per batch used by --check")
+
+    def handle(self, *args, **options):
+        formats = options['formats'] or FORMATS
+        if 'onnx' in formats:
+            # Fail before writing anything rather than half-way through the exports
+            try:
+                import tf2onnx  # noqa: F401
+            except ImportError:
+                raise CommandError("ONNX export needs tf2onnx: pip install tf2onnx")
+
+        reference = TensorFlowBackend()
+        reference.load()
+
+        scale, offset = scaler_affine(reference.scalers)
+        np.savez(SCALER_AFFINE_PATH, scale=scale, offset=offset)
+        self.stdout.write(f"✅ Wrote scaler parameters to {SCALER_AFFINE_PATH}")
+
+        for name in formats:
+            path = getattr(self, f"export_{name}")(reference.model)
+            self.stdout.write(f"✅ Wrote {name} model to {path}")
+
+        if options['check']:
+            self.check_parity(reference, formats, options['batch'], options['tolerance'], options['rollout_tolerance'])
+
+    def export_onnx(self, model):
+        try:
+            import tensorflow as tf
+            import tf2onnx
+        except ImportError:
+            raise CommandError("ONNX export needs tf2onnx: pip install tf2onnx")
+
+        signature = [tf.TensorSpec((None, WINDOW_SIZE, len(FEATURES)), tf.float32, name="windows")]
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=ONNX_MODEL_PATH)
+        return ONNX_MODEL_PATH
+
+    def export_tflite(self, model):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        # Keep LSTMs as fused builtin ops so tflite-runtime can run them without Flex
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+        with open(TFLITE_MODEL_PATH, 'wb') as f:
+            f.write(converter.convert())
+        return TFLITE_MODEL_PATH
+
+    def export_numpy(self, model):
+        layers = []
+        arrays = {}
+        for layer in model.layers:
+            kind = type(layer).__name__
+            config = layer.get_config()
+            if kind in ('InputLayer', 'Dropout'):
+                continue
+            if kind == 'LSTM':
+                if config.get('stateful') or config.get('go_backwards') or not config.get('use_bias', True):
+                    raise CommandError(f"Unsupported LSTM configuration in layer {layer.name}")
+                description = {
+                    'type': kind,
+                    'activation': config['activation'],
+                    'recurrent_activation': config['recurrent_activation'],
+                    'return_sequences': config['return_sequences'],
+                }
+            elif kind == 'Dense':
+                if not config.get('use_bias', True):
+                    raise CommandError(f"Dense layer {layer.name} without bias is not supported")
+                description = {'type': kind, 'activation': config['activation']}
+            else:
+                raise CommandError(f"The NumPy backend does not support {kind} layers ({layer.name})")
+
+            weights = layer.get_weights()
+            for n, weight in enumerate(weights):
+                arrays[f"{len(layers)}_{n}"] = weight.astype(np.float32)
+            layers.append(dict(description, weights=len(weights)))
+
+        np.savez(NUMPY_WEIGHTS_PATH, layers=json.dumps(layers), **arrays)
+        return NUMPY_WEIGHTS_PATH
+
+    def check_parity(self, reference, formats, batch, tolerance, rollout_tolerance):
+        """
+        Run one forward pass and a full forecast rollout on each backend and
+        diff against TensorFlow. Latency, RSS and cold start of each backend
+        in a fresh process are measured by `manage.py benchmark backends`.
+        """
+        windows = np.random.default_rng(0).random((batch, WINDOW_SIZE, len(FEATURES)), dtype=np.float32)
+        expected_step = reference.predict(windows)
+        expected_rollout = reference.rollout(FORECAST_DAYS)(windows)
+
+        failed = False
+        for name in formats:
+            backend = BACKENDS[name]()
+            started = time.perf_counter()
+            backend.load()
+            load_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            rollout = backend.rollout(FORECAST_DAYS)(windows)
+            rollout_time = time.perf_counter() - started
+
+            step_error = float(np.abs(backend.predict(windows) - expected_step).max())
+            rollout_error = float(np.abs(rollout - expected_rollout).max())
+            affine_error = float(max(np.abs(a - b).max() for a, b in zip(backend.scaler_affine(), reference.scaler_affine())))
+
+            line = (
+                f"{name}: step error {step_error:.2e}, rollout error {rollout_error:.2e}, "
+                f"scaler error {affine_error:.2e}, load {load_time * 1000:.0f} ms, "
+                f"{FORECAST_DAYS}-day rollout for {batch} regions {rollout_time * 1000:.0f} ms"
+            )
+            if step_error > tolerance or affine_error > tolerance or rollout_error > rollout_tolerance:
+                failed = True
+                self.stderr.write(f"❌ {line}")
+            else:
+                self.stdout.write(f"✅ {line}")
+
+        if failed:
+            raise CommandError(
+                f"Some backends differ from TensorFlow by more than {tolerance} per step "
+                f"or {rollout_tolerance} over the rollout"
+            )
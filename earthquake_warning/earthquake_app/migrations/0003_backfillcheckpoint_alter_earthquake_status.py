@@ -0,0 +1,32 @@
+# Generated by Django 4.2.17 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0002_earthquake_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('min_magnitude', models.FloatField()),
+                ('events', models.IntegerField(default=0)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('start', 'end', 'min_magnitude')},
+            },
+        ),
+        migrations.AlterField(
+            model_name='earthquake',
+            name='status',
+            field=models.CharField(choices=[('alert', 'Alert'), ('warning', 'Warning'), ('safe', 'Safe'), ('predicted', 'Predicted')], default='safe', max_length=10),
+        ),
+    ]
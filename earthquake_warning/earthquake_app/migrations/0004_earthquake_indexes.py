@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0003_backfillcheckpoint_alter_earthquake_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(fields=['-time'], name='earthquake_time_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(fields=['status', 'time'], name='earthquake_status_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(condition=models.Q(('magnitude__gte', 4.5)), fields=['time', 'magnitude'], name='earthquake_alert_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(fields=['usgs_id'], name='earthquake_usgs_id_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
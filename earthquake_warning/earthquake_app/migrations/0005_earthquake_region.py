@@ -0,0 +1,22 @@
+# Generated by Django 4.2.17 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0004_earthquake_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='earthquake',
+            name='region',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(fields=['status', 'region', 'time'], name='earthquake_region_time_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.17 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0005_earthquake_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('backend', models.CharField(blank=True, default='', max_length=20)),
+                ('regions', models.IntegerField(default=0)),
+                ('predictions', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='earthquake',
+            name='prediction_run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='earthquake_app.predictionrun'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.17 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0006_predictionrun'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='earthquake',
+            name='earthquake_time_desc_idx',
+        ),
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(fields=['-time', '-id'], name='earthquake_time_id_desc_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.17 on 2026-10-18 14:02
+
+from django.db import DatabaseError, migrations, models, transaction
+
+from earthquake_app.geo import geohash_encode
+
+POSTGIS_INDEX = 'earthquake_geography_gist_idx'
+
+
+def populate_geohashes(apps, schema_editor):
+    Earthquake = apps.get_model('earthquake_app', 'Earthquake')
+    batch = []
+    for quake in Earthquake.objects.filter(geohash='').only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        quake.geohash = geohash_encode(quake.latitude, quake.longitude)
+        batch.append(quake)
+        if len(batch) >= 2000:
+            Earthquake.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Earthquake.objects.bulk_update(batch, ['geohash'])
+
+
+def create_postgis_index(apps, schema_editor):
+    """Add a GiST index on the points' geography when PostGIS can be enabled; skip otherwise."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")
+        if cursor.fetchone() is None:
+            return
+        try:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {POSTGIS_INDEX} ON earthquake_app_earthquake "
+                    "USING GIST ((ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography))"
+                )
+        except DatabaseError:
+            pass  # No privilege to create the extension; the geohash index still works
+
+
+def drop_postgis_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {POSTGIS_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0007_earthquake_time_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='earthquake',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='earthquake',
+            index=models.Index(fields=['geohash'], name='earthquake_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_postgis_index, drop_postgis_index),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.17 on 2026-10-18 15:40
+
+from datetime import date, datetime, timezone
+
+from django.db import migrations
+
+TABLE = 'earthquake_app_earthquake'
+LEGACY = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{TABLE}_id_partitioned_seq'
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_earthquakes(apps, schema_editor):
+    """
+    Rebuild the Earthquake table as a range-partitioned table on `time`,
+    one partition per month plus a default one, on PostgreSQL only.
+
+    Partitioned tables need the partition key in every unique constraint,
+    so the primary key becomes (id, time) and usgs_id is unique per time.
+    Ingest still looks usgs_ids up before inserting. Non-unique indexes and
+    foreign keys are recreated on the parent and cascade to the partitions.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        if cursor.fetchone()[0] == 'p':
+            return  # Already partitioned
+
+        cursor.execute(
+            """
+            SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x
+            WHERE x.indrelid = %s::regclass AND NOT x.indisunique
+            """,
+            [TABLE],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min(time) FROM {TABLE}")
+        oldest = cursor.fetchone()[0] or datetime.now(timezone.utc)
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS) PARTITION BY RANGE (time)")
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, time)")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_usgs_id_time_key UNIQUE (usgs_id, time)")
+
+        month = date(oldest.year, oldest.month, 1)
+        last = add_months(date.today().replace(day=1), MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00+00')"
+            )
+            month = add_months(month, 1)
+        cursor.execute(f"CREATE TABLE {TABLE}_pdefault PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY}")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+        cursor.execute(f"DROP TABLE {LEGACY}")
+
+        # Same names as before, so later migrations can still find them
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0009_dailyrollup'),
+    ]
+
+    operations = [
+        # The partitioned table is schema-compatible; there is nothing to undo
+        migrations.RunPython(partition_earthquakes, migrations.RunPython.noop),
+    ]
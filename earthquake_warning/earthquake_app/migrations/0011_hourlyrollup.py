@@ -0,0 +1,30 @@
+# Generated by Django 4.2.17 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0010_partition_earthquake'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('cell_row', models.SmallIntegerField()),
+                ('cell_col', models.SmallIntegerField()),
+                ('bucket', models.SmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('max_magnitude', models.FloatField()),
+                ('sum_magnitude', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('hour', 'cell_row', 'cell_col', 'bucket')},
+                'indexes': [models.Index(fields=['hour'], name='hourly_rollup_hour_idx')],
+            },
+        ),
+    ]
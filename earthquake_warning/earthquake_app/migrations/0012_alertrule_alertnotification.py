@@ -0,0 +1,49 @@
+# Generated by Django 4.2.17 on 2026-10-18 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0011_hourlyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('min_magnitude', models.FloatField(default=0.0)),
+                ('west', models.FloatField(blank=True, null=True)),
+                ('south', models.FloatField(blank=True, null=True)),
+                ('east', models.FloatField(blank=True, null=True)),
+                ('north', models.FloatField(blank=True, null=True)),
+                ('site_latitude', models.FloatField(blank=True, null=True)),
+                ('site_longitude', models.FloatField(blank=True, null=True)),
+                ('radius_km', models.FloatField(blank=True, null=True)),
+                ('min_depth', models.FloatField(blank=True, null=True)),
+                ('max_depth', models.FloatField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('earthquake_id', models.BigIntegerField()),
+                ('payload', models.JSONField()),
+                ('ingested_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='earthquake_app.alertrule')),
+            ],
+            options={
+                'unique_together': {('rule', 'earthquake_id')},
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['id'], name='alert_notification_pending_idx')],
+            },
+        ),
+    ]
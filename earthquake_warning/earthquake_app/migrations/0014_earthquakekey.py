@@ -0,0 +1,54 @@
+# Generated by Django 4.2.17 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+TABLE = 'earthquake_app_earthquake'
+KEYS = 'earthquake_app_earthquakekey'
+
+
+class AlterUnpartitionedField(migrations.AlterField):
+    """
+    AlterField for the schema only where Earthquake is not partitioned:
+    on PostgreSQL migration 0010 already replaced the usgs_id unique
+    constraint with UNIQUE (usgs_id, time), which stays.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def fill_keys(apps, schema_editor):
+    """One key per real usgs_id already stored, at its earliest time."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {KEYS} (usgs_id, time) "
+            f"SELECT usgs_id, min(time) FROM {TABLE} WHERE prediction_run_id IS NULL AND status <> 'predicted' GROUP BY usgs_id"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0013_alertdelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarthquakeKey',
+            fields=[
+                ('usgs_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('time', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        AlterUnpartitionedField(
+            model_name='earthquake',
+            name='usgs_id',
+            field=models.CharField(max_length=100),
+        ),
+    ]
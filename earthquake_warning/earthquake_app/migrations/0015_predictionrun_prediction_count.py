@@ -0,0 +1,19 @@
+# Generated by Django 4.2.17 on 2026-10-18 22:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0014_earthquakekey'),
+    ]
+
+    operations = [
+        # The count clashed with the Earthquake.prediction_run reverse accessor
+        migrations.RenameField(
+            model_name='predictionrun',
+            old_name='predictions',
+            new_name='prediction_count',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.17 on 2026-10-18 23:10
+
+from django.db import migrations
+
+TABLE = 'earthquake_app_earthquake'
+
+
+def drop_generated_like_index(apps, schema_editor):
+    """
+    Drop the varchar_pattern_ops index Django created for the old unique
+    usgs_id on PostgreSQL. 0014 kept the column's schema there (the unique
+    constraint is (usgs_id, time) since 0010), so the generated index
+    outlived it and duplicates earthquake_usgs_id_like_idx, which every
+    insert would otherwise maintain twice.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname LIKE %s",
+            [TABLE, f'{TABLE}\\_usgs\\_id\\_%\\_like'],
+        )
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('earthquake_app', '0015_predictionrun_prediction_count'),
+    ]
+
+    operations = [
+        # Not in the migration state since 0014, so there is nothing to restore
+        migrations.RunPython(drop_generated_like_index, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connection, models
 from django.utils import timezone
 
+from .geo import geohash_encode
+
 class Earthquake(models.Model):
     STATUS_CHOICES = [
         ('alert', 'Alert'),
@@ -9,7 +12,8 @@ class Earthquake(models.Model):
         ('predicted', 'Predicted'),  # Added predicted status
     ]
 
-    usgs_id = models.CharField(max_length=100, unique=True)
+    # Unique through EarthquakeKey; the partitioned table can only enforce (usgs_id, time)
+    usgs_id = models.CharField(max_length=100)
     magnitude = models.FloatField()
     place = models.CharField(max_length=255)
     time = models.DateTimeField()
@@ -23,21 +27,331 @@ class Earthquake(models.Model):
     
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='safe')
 
+    # Base-32 geohash of the epicenter; prefix ranges serve bbox/radius queries
+    geohash = models.CharField(max_length=12, blank=True, default='')
+
+    # Forecast region of a prediction ("global" or a grid cell); blank for real events
+    region = models.CharField(max_length=32, blank=True, default='')
+    # The forecast run a prediction belongs to; null for real events
+    prediction_run = models.ForeignKey(
+        'PredictionRun', null=True, blank=True, on_delete=models.CASCADE, related_name='predictions'
+    )
+
+    class Meta:
+        indexes = [
+            # Latest-first listings, 24h windows, the LSTM history window and
+            # the (time, id) keyset pagination of /api/earthquakes/
+            models.Index(fields=['-time', '-id'], name='earthquake_time_id_desc_idx'),
+            # Predictions listing and status-filtered windows
+            models.Index(fields=['status', 'time'], name='earthquake_status_time_idx'),
+            models.Index(fields=['status', 'region', 'time'], name='earthquake_region_time_idx'),
+            # Alert queries only ever look at M4.5+, a small slice of the table
+            models.Index(
+                fields=['time', 'magnitude'],
+                name='earthquake_alert_time_idx',
+                condition=models.Q(magnitude__gte=4.5),
+            ),
+            # Spatial lookups are geohash__startswith prefix scans
+            models.Index(
+                fields=['geohash'],
+                name='earthquake_geohash_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+            # usgs_id__startswith='predicted_' needs a pattern-ops index for LIKE
+            models.Index(
+                fields=['usgs_id'],
+                name='earthquake_usgs_id_like_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
+
+    @classmethod
+    def observed(cls):
+        """Real events only: no rows of a prediction run or with the predicted status."""
+        return cls.objects.filter(prediction_run__isnull=True).exclude(status='predicted')
+
     @classmethod
     def get_recent_earthquakes(cls, years=2):
         two_years_ago = timezone.now() - timezone.timedelta(days=years*365)
         return cls.objects.filter(time__gte=two_years_ago).order_by('-magnitude')
 
+    @staticmethod
+    def status_for_magnitude(magnitude):
+        """Map a magnitude to its status. Shared by save() and the bulk ingest path."""
+        if magnitude >= 5.0:
+            return 'alert'
+        elif magnitude >= 3.0:
+            return 'warning'
+        return 'safe'
+
     def save(self, *args, **kwargs):
         """Automatically assign status based on magnitude unless it's a prediction."""
         if self.status != 'predicted':  # Only auto-assign status for real earthquakes
-            if self.magnitude >= 5.0:
-                self.status = 'alert'
-            elif self.magnitude >= 3.0:
-                self.status = 'warning'
-            else:
-                self.status = 'safe'
+            self.status = self.status_for_magnitude(self.magnitude)
+        self.geohash = geohash_encode(self.latitude, self.longitude)
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.place} - Mag {self.magnitude} on {self.time}"
\ No newline at end of file
+        return f"{self.place} - Mag {self.magnitude} on {self.time}"
+
+
+class EarthquakeKey(models.Model):
+    """
+    One row per ingested usgs_id, enforcing the table-wide uniqueness the
+    partitioned Earthquake table cannot (its unique keys must include
+    `time`, so a revised origin time would otherwise slip through).
+    Ingest claims the keys before inserting events. Keys outlive retention,
+    so retired events are not ingested again by a later backfill.
+    """
+    CLAIM_BATCH_SIZE = 1000
+
+    usgs_id = models.CharField(max_length=100, primary_key=True)
+    time = models.DateTimeField()
+
+    @classmethod
+    def claim(cls, times):
+        """
+        Insert the keys of {usgs_id: time} that do not exist yet and return
+        the set of usgs_ids this call inserted. A concurrent transaction
+        claiming the same usgs_id blocks until this one ends, then gets nothing.
+        """
+        items = list(times.items())
+        claimed = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), cls.CLAIM_BATCH_SIZE):
+                batch = items[start:start + cls.CLAIM_BATCH_SIZE]
+                cursor.execute(
+                    f"INSERT INTO {cls._meta.db_table} (usgs_id, time) "
+                    f"VALUES {', '.join(['(%s, %s)'] * len(batch))} "
+                    "ON CONFLICT (usgs_id) DO NOTHING RETURNING usgs_id",
+                    [
+                        value
+                        for usgs_id, time in batch
+                        for value in (usgs_id, connection.ops.adapt_datetimefield_value(time))
+                    ],
+                )
+                claimed.update(row[0] for row in cursor.fetchall())
+        return claimed
+
+    def __str__(self):
+        return self.usgs_id
+
+
+class BackfillCheckpoint(models.Model):
+    """A completed time slice of a historical backfill, so interrupted runs resume."""
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    min_magnitude = models.FloatField()
+    events = models.IntegerField(default=0)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('start', 'end', 'min_magnitude')
+
+    def __str__(self):
+        return f"Backfill {self.start:%Y-%m-%d} - {self.end:%Y-%m-%d} (M{self.min_magnitude}+): {self.events} events"
+
+
+class PredictionRun(models.Model):
+    """
+    One complete set of forecasts. Rows are written while the run is
+    pending; setting `completed_at` publishes the whole set at once, and
+    readers always see the most recently completed run.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    backend = models.CharField(max_length=20, blank=True, default='')
+    regions = models.IntegerField(default=0)
+    # Not `predictions`: that is the reverse accessor of Earthquake.prediction_run
+    prediction_count = models.IntegerField(default=0)
+
+    @classmethod
+    def completed(cls):
+        """Published runs, latest first."""
+        return cls.objects.filter(completed_at__isnull=False).order_by('-completed_at', '-id')
+
+    @classmethod
+    def active(cls):
+        """The run readers should see, or None before the first forecast."""
+        return cls.completed().first()
+
+    def __str__(self):
+        state = f"completed {self.completed_at:%Y-%m-%d %H:%M}" if self.completed_at else "pending"
+        return f"Prediction run {self.pk} ({state}, {self.prediction_count} predictions)"
+
+
+class DailyRollup(models.Model):
+    """
+    Compact per-day aggregates of real earthquakes by grid cell and
+    magnitude bucket (stats.MAGNITUDE_BUCKETS). The bucket rows of a
+    day and cell form its magnitude histogram. Maintained by ingest;
+    detail rows older than the retention period only survive here.
+    """
+    day = models.DateField()
+    cell_row = models.SmallIntegerField()
+    cell_col = models.SmallIntegerField()
+    bucket = models.SmallIntegerField()
+    count = models.IntegerField(default=0)
+    max_magnitude = models.FloatField()
+    sum_magnitude = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'cell_row', 'cell_col', 'bucket')
+        indexes = [models.Index(fields=['day'], name='daily_rollup_day_idx')]
+
+    def __str__(self):
+        return f"{self.day} cell {self.cell_row},{self.cell_col} bucket {self.bucket}: {self.count} events"
+
+
+class HourlyRollup(models.Model):
+    """Like DailyRollup, per UTC hour. Kept for a shorter period (EARTHQUAKE_HOURLY_ROLLUP_DAYS)."""
+    hour = models.DateTimeField()
+    cell_row = models.SmallIntegerField()
+    cell_col = models.SmallIntegerField()
+    bucket = models.SmallIntegerField()
+    count = models.IntegerField(default=0)
+    max_magnitude = models.FloatField()
+    sum_magnitude = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('hour', 'cell_row', 'cell_col', 'bucket')
+        indexes = [models.Index(fields=['hour'], name='hourly_rollup_hour_idx')]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} cell {self.cell_row},{self.cell_col} bucket {self.bucket}: {self.count} events"
+
+
+class AlertRuleQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # auto_now only applies to save(); bulk edits must move updated_at too,
+        # or AlertRuleEngine keeps serving the rules it compiled before them
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+
+class AlertRule(models.Model):
+    """
+    A condition new earthquakes are checked against on ingest. Every set
+    condition must hold: a minimum magnitude, optionally an area (a region
+    bbox or a registered site with a radius) and a depth band. A match
+    queues an AlertNotification for the alert sinks.
+    """
+    name = models.CharField(max_length=100)
+    min_magnitude = models.FloatField(default=0.0)
+
+    # Region: west, south, east, north in degrees; west > east crosses the antimeridian
+    west = models.FloatField(null=True, blank=True)
+    south = models.FloatField(null=True, blank=True)
+    east = models.FloatField(null=True, blank=True)
+    north = models.FloatField(null=True, blank=True)
+
+    # Registered site: events within radius_km of it
+    site_latitude = models.FloatField(null=True, blank=True)
+    site_longitude = models.FloatField(null=True, blank=True)
+    radius_km = models.FloatField(null=True, blank=True)
+
+    # Depth band in km
+    min_depth = models.FloatField(null=True, blank=True)
+    max_depth = models.FloatField(null=True, blank=True)
+
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AlertRuleQuerySet.as_manager()
+
+    def bbox(self):
+        if None in (self.west, self.south, self.east, self.north):
+            return None
+        return (self.west, self.south, self.east, self.north)
+
+    def site(self):
+        if None in (self.site_latitude, self.site_longitude, self.radius_km):
+            return None
+        return (self.site_latitude, self.site_longitude, self.radius_km)
+
+    def clean(self):
+        region = (self.west, self.south, self.east, self.north)
+        if any(value is not None for value in region) and self.bbox() is None:
+            raise ValidationError("A region needs all of west, south, east and north.")
+        site = (self.site_latitude, self.site_longitude, self.radius_km)
+        if any(value is not None for value in site) and self.site() is None:
+            raise ValidationError("A site needs its latitude, longitude and radius_km.")
+        if self.bbox() and self.site():
+            raise ValidationError("A rule has either a region or a site, not both.")
+        if self.min_depth is not None and self.max_depth is not None and self.min_depth > self.max_depth:
+            raise ValidationError("min_depth must not exceed max_depth.")
+
+    def __str__(self):
+        return f"{self.name} (M{self.min_magnitude}+)"
+
+
+class AlertNotification(models.Model):
+    """
+    A rule match waiting to be handed to the sinks (sent_at is null) or
+    already queued as one AlertDelivery per sink. The earthquake is referenced by id without a foreign key: the
+    partitioned earthquake table has no single-column unique key.
+    """
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='notifications')
+    earthquake_id = models.BigIntegerField()
+    # The alert as delivered to the sinks: the serialized event plus the rule
+    payload = models.JSONField()
+    # When ingest stored the event; latencies are measured from here
+    ingested_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('rule', 'earthquake_id')
+        indexes = [
+            # The dispatcher only scans undelivered notifications
+            models.Index(
+                fields=['id'],
+                name='alert_notification_pending_idx',
+                condition=models.Q(sent_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        state = f"sent {self.sent_at:%Y-%m-%d %H:%M:%S}" if self.sent_at else "pending"
+        return f"{self.rule.name}: earthquake {self.earthquake_id} ({state})"
+
+
+class AlertDelivery(models.Model):
+    """
+    One alert for one sink, the outbox AlertDispatcher delivers from.
+    Pending rows are due at next_attempt_at; failed rows are rescheduled
+    with backoff until they are delivered or dead-lettered.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead-lettered'),
+    ]
+
+    sink = models.CharField(max_length=50)
+    payload = models.JSONField()
+    # When ingest stored the event, for rule notifications; latencies are measured from here
+    ingested_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'alert deliveries'
+        indexes = [
+            # The dispatcher only scans due rows per sink
+            models.Index(
+                fields=['sink', 'next_attempt_at'],
+                name='alert_delivery_due_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sink}: alert {self.payload.get('id')} ({self.status})"
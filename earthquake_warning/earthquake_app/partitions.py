@@ -0,0 +1,202 @@
+import logging
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .dashboard_cache import DashboardCache
+from .models import DailyRollup, Earthquake
+from .rollups import RollupService
+
+logger = logging.getLogger(__name__)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+class EarthquakePartitions:
+    """
+    Maintenance of the monthly partitions of the Earthquake table
+    (see migration 0010), and retention of detail rows.
+
+    Future partitions are created MONTHS_AHEAD ahead so inserts never land
+    in the default partition; backfills create the past months they cover,
+    and rows that still reach the default partition are moved into a
+    partition of their own by maintenance. Months older than
+    RETENTION_MONTHS keep their DailyRollup rows (rolled up from the detail
+    rows if ingest never did), then their partition is detached and dropped, which is instant compared to
+    deleting rows. On databases without partitioning the same retention
+    runs as batched deletes.
+    """
+    TABLE = Earthquake._meta.db_table
+    DEFAULT_PARTITION = f'{TABLE}_pdefault'
+    PARTITION_PATTERN = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+    MONTHS_AHEAD = getattr(settings, 'EARTHQUAKE_PARTITIONS_AHEAD', 3)
+    RETENTION_MONTHS = getattr(settings, 'EARTHQUAKE_RETENTION_MONTHS', 24)
+    DELETE_BATCH_SIZE = 5000
+
+    @classmethod
+    def is_partitioned(cls):
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [cls.TABLE])
+            row = cursor.fetchone()
+        return row is not None and row[0] == 'p'
+
+    @classmethod
+    def partitions(cls):
+        """{first day of month: partition name} for the monthly partitions."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = %s
+                """,
+                [cls.TABLE],
+            )
+            names = [row[0] for row in cursor.fetchall()]
+
+        months = {}
+        for name in names:
+            match = cls.PARTITION_PATTERN.match(name)
+            if match:
+                months[date(int(match[1]), int(match[2]), 1)] = name
+        return months
+
+    @classmethod
+    def ensure_partitions(cls, start, end):
+        """
+        Create any missing monthly partitions for the months from `start`
+        to `end` (dates or datetimes, both months included). Returns the
+        names created.
+        """
+        existing = cls.partitions()
+        created = []
+        month, last = date(start.year, start.month, 1), date(end.year, end.month, 1)
+        while month <= last:
+            if month not in existing:
+                name = f"{cls.TABLE}_p{month:%Y_%m}"
+                try:
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        cls.create_partition(cursor, month, name)
+                    created.append(name)
+                except DatabaseError as e:
+                    logger.error(f"❌ Could not create partition {name}: {e}")
+            month = add_months(month, 1)
+        return created
+
+    @classmethod
+    def create_partition(cls, cursor, month, name):
+        """
+        PostgreSQL refuses to create a partition for rows that sit in the
+        default partition, so the month is built as a plain table, filled
+        with those rows, and then attached.
+        """
+        start, end = month_start(month), month_start(add_months(month, 1))
+        cursor.execute(f"CREATE TABLE {name} (LIKE {cls.TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {cls.DEFAULT_PARTITION} WHERE time >= %s AND time < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        if cursor.rowcount:
+            logger.info(f"🗄️ Moved {cursor.rowcount} rows from the default partition into {name}")
+        cursor.execute(
+            f"ALTER TABLE {cls.TABLE} ATTACH PARTITION {name} FOR VALUES "
+            f"FROM ('{start:%Y-%m-%d} 00:00+00') TO ('{end:%Y-%m-%d} 00:00+00')"
+        )
+
+    @classmethod
+    def ensure_future_partitions(cls, today=None):
+        """Create any missing partitions from this month to MONTHS_AHEAD ahead. Returns the names created."""
+        month = (today or date.today()).replace(day=1)
+        return cls.ensure_partitions(month, add_months(month, cls.MONTHS_AHEAD))
+
+    @classmethod
+    def adopt_default_rows(cls):
+        """Move the rows of every month found in the default partition into that month's partition."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', time AT TIME ZONE 'UTC')::date FROM {cls.DEFAULT_PARTITION}"
+            )
+            months = sorted(row[0] for row in cursor.fetchall())
+
+        created = []
+        for month in months:
+            created += cls.ensure_partitions(month, month)
+        return created
+
+    @classmethod
+    def retention_cutoff(cls, today=None):
+        today = today or date.today()
+        return month_start(add_months(today.replace(day=1), -cls.RETENTION_MONTHS))
+
+    @classmethod
+    def retire_old_data(cls, today=None):
+        """Roll up and remove detail rows older than the retention period. Returns the months retired."""
+        cutoff = cls.retention_cutoff(today)
+        retired = cls.retire_partitions(cutoff) if cls.is_partitioned() else cls.retire_rows(cutoff)
+        if retired:
+            # Catalog pages that listed the retired rows are versioned like the dashboard
+            DashboardCache.bump()
+        return retired
+
+    @staticmethod
+    def roll_up_month(start, end):
+        """
+        Make sure the month's daily rollups exist before its rows go. Ingest
+        keeps them up to date, and once a month has been retired they hold
+        history no detail row is left for (a backfill can recreate the month
+        and add events to them), so only a month without any is recomputed.
+        """
+        if not DailyRollup.objects.filter(day__gte=start.date(), day__lt=end.date()).exists():
+            RollupService.recompute_daily(start, end)
+
+    @classmethod
+    def retire_partitions(cls, cutoff):
+        # Old months stuck in the default partition get their own partition first, so they retire too
+        cls.adopt_default_rows()
+        retired = []
+        for month, name in sorted(cls.partitions().items()):
+            start, end = month_start(month), month_start(add_months(month, 1))
+            if end > cutoff:
+                break
+            with transaction.atomic():
+                cls.roll_up_month(start, end)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE {cls.TABLE} DETACH PARTITION {name}")
+                    cursor.execute(f"DROP TABLE {name}")
+            retired.append(name)
+            logger.info(f"🗄️ Rolled up and dropped partition {name}")
+        return retired
+
+    @classmethod
+    def retire_rows(cls, cutoff):
+        oldest = Earthquake.objects.filter(time__lt=cutoff).order_by('time').values_list('time', flat=True).first()
+        if oldest is None:
+            return []
+
+        retired = []
+        month = date(oldest.year, oldest.month, 1)
+        while month_start(add_months(month, 1)) <= cutoff:
+            start, end = month_start(month), month_start(add_months(month, 1))
+            cls.roll_up_month(start, end)
+            events = RollupService.real_events(start, end)
+            while True:
+                ids = list(events.values_list('id', flat=True)[:cls.DELETE_BATCH_SIZE])
+                if not ids:
+                    break
+                Earthquake.objects.filter(id__in=ids).delete()
+            retired.append(f"{month:%Y-%m}")
+            month = add_months(month, 1)
+        return retired
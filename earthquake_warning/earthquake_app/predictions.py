@@ -1,62 +1,393 @@
+import json
+import logging
+import threading
 import numpy as np
 import pandas as pd
 import joblib
-import tensorflow as tf
 from django.utils import timezone
 from django.db import transaction
 from django.db import models
-from .models import Earthquake
-import reverse_geocoder as rg
+from django.db.models import F, Q, Window
+from django.db.models.functions import Floor, RowNumber
+from django.conf import settings
+from .models import Earthquake, PredictionRun
+from .dashboard_cache import DashboardCache
+from .geocoding import ReverseGeocoder
+from celery import current_app
+from datetime import timedelta
 import os
 
+logger = logging.getLogger(__name__)
+
 # Disable GPU since we're using CPU only
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
-# Load the trained LSTM model and scalers
+# Paths to the trained LSTM model and scalers
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 LSTM_MODEL_PATH = os.path.join(CURRENT_DIR, "earthquake_lstm_model.h5")
 SCALER_PATH = os.path.join(CURRENT_DIR, "scalers.pkl")
+# Artifacts written by `manage.py export_lstm_model`
+ONNX_MODEL_PATH = os.path.join(CURRENT_DIR, "earthquake_lstm_model.onnx")
+TFLITE_MODEL_PATH = os.path.join(CURRENT_DIR, "earthquake_lstm_model.tflite")
+NUMPY_WEIGHTS_PATH = os.path.join(CURRENT_DIR, "earthquake_lstm_weights.npz")
+SCALER_AFFINE_PATH = os.path.join(CURRENT_DIR, "scaler_affine.npz")
+FEATURES = ["magnitude", "latitude", "longitude", "depth"]
+FORECAST_DAYS = 30
+WINDOW_SIZE = 30
+GLOBAL_REGION = "global"
 
-# Load model and scalers
-lstm_model = tf.keras.models.load_model(LSTM_MODEL_PATH, compile=False)
-lstm_model.compile(optimizer="adam", loss="mse")
-scalers = joblib.load(SCALER_PATH)
 
-class EarthquakePredictionService:
+def scaler_affine(scalers, columns=FEATURES):
+    """
+    Collapse the per-column scalers (MinMaxScaler, or any affine scaler) into
+    one (scale, offset) pair, so x_scaled = x * scale + offset for all columns.
+    """
+    zeros = np.zeros((1, 1))
+    ones = np.ones((1, 1))
+    offset = np.array([scalers[col].transform(zeros)[0, 0] for col in columns])
+    scale = np.array([scalers[col].transform(ones)[0, 0] for col in columns]) - offset
+    return scale, offset
+
+
+def build_rollout(model, steps):
+    """
+    Compile the autoregressive forecast into one tf.function.
+
+    Takes a batch of windows (regions, window, features) so every region is
+    forecast by the same forward passes. The windows live in a preallocated
+    time-major ring buffer: each step feeds them oldest-first to
+    model(x, training=False), then overwrites the oldest row with the
+    prediction instead of reallocating the window.
+    Returns predictions shaped (regions, steps, outputs).
+    """
+    import tensorflow as tf
+
+    n_outputs = model.output_shape[-1]
+
+    @tf.function(reduce_retracing=True)
+    def rollout(windows):
+        ring = tf.transpose(windows, [1, 0, 2])  # (window, regions, features)
+        window_length = tf.shape(ring)[0]
+        head = tf.constant(0)
+        outputs = tf.TensorArray(tf.float32, size=steps)
+
+        for step in tf.range(steps):
+            ordered = tf.gather(ring, (head + tf.range(window_length)) % window_length)
+            predicted = model(tf.transpose(ordered, [1, 0, 2]), training=False)
+            outputs = outputs.write(step, predicted)
+
+            if n_outputs == 4:
+                next_rows = predicted
+            else:
+                # Model predicts magnitude/lat/lon only; carry the last depth forward
+                next_rows = tf.concat([predicted[:, :3], ordered[-1, :, 3:4]], axis=1)
+
+            ring = tf.tensor_scatter_nd_update(ring, [[head]], next_rows[tf.newaxis])
+            head = (head + 1) % window_length
+
+        return tf.transpose(outputs.stack(), [1, 0, 2])
+
+    return rollout
+
+
+def numpy_rollout(predict, windows, steps):
+    """
+    The autoregressive forecast loop for backends without a graph compiler.
+
+    Same ring-buffer scheme as build_rollout: `predict` maps a batch of
+    oldest-first windows (regions, window, features) to (regions, outputs).
+    Returns predictions shaped (regions, steps, outputs).
+    """
+    ring = np.ascontiguousarray(np.transpose(windows, (1, 0, 2)), dtype=np.float32)
+    window_length = ring.shape[0]
+    outputs = []
+
+    for step in range(steps):
+        head = step % window_length
+        ordered = np.roll(ring, -head, axis=0)
+        predicted = np.asarray(predict(np.ascontiguousarray(np.transpose(ordered, (1, 0, 2)))), dtype=np.float32)
+        outputs.append(predicted)
+
+        if predicted.shape[1] == ring.shape[2]:
+            ring[head] = predicted
+        else:
+            # Model predicts magnitude/lat/lon only; carry the last depth forward
+            ring[head, :, :3] = predicted[:, :3]
+            ring[head, :, 3:] = ordered[-1, :, 3:]
+
+    return np.stack(outputs, axis=1)
+
+
+class InferenceBackend:
+    """
+    A way of running the exported LSTM forecast.
+
+    Subclasses load their model artifact in `load()` and implement
+    `predict(windows)`; `rollout(steps)` returns a callable mapping scaled
+    windows (regions, window, features) to scaled predictions
+    (regions, steps, outputs). Scaler parameters come from the
+    `scale`/`offset` arrays written by `manage.py export_lstm_model`,
+    so only the TensorFlow backend needs scikit-learn.
+    """
+    name = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def predict(self, windows):
+        raise NotImplementedError
+
+    def scaler_affine(self):
+        with np.load(SCALER_AFFINE_PATH) as affine:
+            return affine["scale"], affine["offset"]
+
+    def rollout(self, steps):
+        return lambda windows: numpy_rollout(self.predict, windows, steps)
+
+
+class TensorFlowBackend(InferenceBackend):
+    """The original Keras model, with the forecast compiled into one tf.function."""
+    name = "tensorflow"
+
+    def load(self):
+        import tensorflow as tf
+
+        self.model = tf.keras.models.load_model(LSTM_MODEL_PATH, compile=False)
+        self.model.compile(optimizer="adam", loss="mse")
+        self.scalers = joblib.load(SCALER_PATH)
+
+    def predict(self, windows):
+        return self.model(windows, training=False).numpy()
+
+    def scaler_affine(self):
+        return scaler_affine(self.scalers)
+
+    def rollout(self, steps):
+        compiled = build_rollout(self.model, steps)
+        return lambda windows: compiled(windows).numpy()
+
+
+class OnnxBackend(InferenceBackend):
+    """The exported ONNX graph run with onnxruntime on the CPU."""
+    name = "onnx"
+
+    def load(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(ONNX_MODEL_PATH, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, windows):
+        return self.session.run(None, {self.input_name: windows})[0]
+
+
+class TFLiteBackend(InferenceBackend):
+    """The exported TFLite flatbuffer, via tflite-runtime if installed."""
+    name = "tflite"
+
+    def load(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=TFLITE_MODEL_PATH)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+
+    def predict(self, windows):
+        if windows.shape[0] != self.batch_size:
+            # The region count only changes between runs, so this resize is rare
+            self.interpreter.resize_tensor_input(self.input_index, windows.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = windows.shape[0]
+        self.interpreter.set_tensor(self.input_index, windows)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index)
+
+
+class NumpyBackend(InferenceBackend):
+    """
+    A dependency-free forward pass over the exported Keras weights.
+
+    Supports the layer types the forecast model is built from: stacked LSTM
+    (Keras gate order i, f, c, o), Dense and Dropout (a no-op at inference).
+    """
+    name = "numpy"
+
+    ACTIVATIONS = {
+        "linear": lambda x: x,
+        "relu": lambda x: np.maximum(x, 0),
+        "tanh": np.tanh,
+        "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+        "hard_sigmoid": lambda x: np.clip(0.2 * x + 0.5, 0, 1),
+    }
+
+    def load(self):
+        with np.load(NUMPY_WEIGHTS_PATH) as weights:
+            layers = json.loads(str(weights["layers"]))
+            self.layers = [
+                dict(layer, weights=[weights[f"{index}_{n}"] for n in range(layer["weights"])])
+                for index, layer in enumerate(layers)
+            ]
+
+    def predict(self, windows):
+        x = windows
+        for layer in self.layers:
+            if layer["type"] == "LSTM":
+                x = self.lstm(x, layer)
+            elif layer["type"] == "Dense":
+                kernel, bias = layer["weights"]
+                x = self.ACTIVATIONS[layer["activation"]](x @ kernel + bias)
+        return x
+
+    def lstm(self, x, layer):
+        kernel, recurrent_kernel, bias = layer["weights"]
+        activation = self.ACTIVATIONS[layer["activation"]]
+        recurrent_activation = self.ACTIVATIONS[layer["recurrent_activation"]]
+        batch, timesteps, _ = x.shape
+        units = recurrent_kernel.shape[0]
+
+        # Input projections for every timestep in one matmul
+        projected = x @ kernel + bias
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        sequence = []
+        for t in range(timesteps):
+            z = projected[:, t] + h @ recurrent_kernel
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = f * c + i * activation(z[:, 2 * units:3 * units])
+            h = o * activation(c)
+            sequence.append(h)
+        return np.stack(sequence, axis=1) if layer["return_sequences"] else h
+
+
+BACKENDS = {backend.name: backend for backend in (TensorFlowBackend, OnnxBackend, TFLiteBackend, NumpyBackend)}
+
+
+class LSTMModelRegistry:
+    """
+    Loads the configured inference backend on first use and caches it per process.
+
+    Heavy runtimes (TensorFlow, onnxruntime) are only imported here, so
+    importing this module (e.g. when Celery autodiscovers tasks, or for
+    `manage.py check`) stays cheap. The prediction queue worker preloads it
+    at boot instead. EARTHQUAKE_INFERENCE_BACKEND picks the backend.
+    """
+    _backend = None
+    _affine = None
+    _rollouts = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """Return the loaded inference backend, loading it on the first call."""
+        if cls._backend is None:
+            with cls._lock:
+                if cls._backend is None:
+                    name = getattr(settings, "EARTHQUAKE_INFERENCE_BACKEND", TensorFlowBackend.name)
+                    if name not in BACKENDS:
+                        raise ValueError(f"Unknown inference backend: {name}")
+
+                    print(f"🔄 Loading LSTM model ({name} backend)...")
+                    backend = BACKENDS[name]()
+                    backend.load()
+                    cls._backend = backend
+                    print("✅ LSTM model loaded")
+        return cls._backend
+
+    @classmethod
+    def get_scaler_affine(cls):
+        """(scale, offset) arrays for all features, computed once per process."""
+        if cls._affine is None:
+            cls._affine = cls.get().scaler_affine()
+        return cls._affine
+
+    @classmethod
+    def get_rollout(cls, steps):
+        """The forecast for `steps` days, built (and for TF traced) once per process."""
+        if steps not in cls._rollouts:
+            backend = cls.get()
+            with cls._lock:
+                if steps not in cls._rollouts:
+                    cls._rollouts[steps] = backend.rollout(steps)
+        return cls._rollouts[steps]
+
+    @classmethod
+    def preload(cls):
+        cls.get()
+        cls.get_scaler_affine()
+        # Trace the graph now so the first scheduled forecast doesn't pay for it
+        cls.get_rollout(FORECAST_DAYS)(
+            np.zeros((1, WINDOW_SIZE, len(FEATURES)), dtype=np.float32)
+        )
+
     @classmethod
-    def delete_existing_predictions(cls):
-        """Delete all existing predictions with thorough cleanup."""
+    def is_loaded(cls):
+        return cls._backend is not None
+
+class EarthquakePredictionService:
+    REGION_CELL_DEGREES = getattr(settings, 'EARTHQUAKE_FORECAST_CELL_DEGREES', 10)
+    MAX_REGIONS = getattr(settings, 'EARTHQUAKE_FORECAST_MAX_REGIONS', 50)
+    # Regional windows only look this far back; quieter cells are not forecast
+    REGION_LOOKBACK = timedelta(days=getattr(settings, 'EARTHQUAKE_FORECAST_LOOKBACK_DAYS', 90))
+    RUNS_KEPT = getattr(settings, 'EARTHQUAKE_PREDICTION_RUNS_KEPT', 2)
+    PENDING_RUN_TIMEOUT = 3600
+
+    @staticmethod
+    def request_purge():
+        """Garbage-collect old runs on a regular worker, off the prediction queue."""
         try:
-            with transaction.atomic():
-                # Delete by status
-                status_deleted = Earthquake.objects.filter(status="predicted").delete()[0]
-                print(f"✅ Deleted {status_deleted} predictions by status")
-                
-                # Delete by usgs_id pattern
-                id_deleted = Earthquake.objects.filter(usgs_id__startswith='predicted_').delete()[0]
-                print(f"✅ Deleted {id_deleted} predictions by ID pattern")
-                
-                # Double check no predictions exist
-                remaining_status = Earthquake.objects.filter(status="predicted").count()
-                remaining_ids = Earthquake.objects.filter(usgs_id__startswith='predicted_').count()
-                
-                if remaining_status > 0 or remaining_ids > 0:
-                    print(f"⚠️ Warning: Still found predictions: status={remaining_status}, ids={remaining_ids}")
-                    return False
-                    
-                return True
+            current_app.send_task("earthquake_app.tasks.purge_prediction_runs")
         except Exception as e:
-            print(f"❌ Error deleting predictions: {e}")
-            return False
+            print(f"⚠️ Could not queue prediction run purge: {e}")
+
 
     @classmethod
-    def fetch_past_earthquakes(cls):
-        # Get past earthquakes, excluding predictions
-        past_earthquakes = (Earthquake.objects
+    def purge_old_runs(cls):
+        """
+        Delete superseded and abandoned prediction runs, keeping the newest
+        RUNS_KEPT completed ones so readers mid-request still find their rows.
+        Also removes predictions written before runs existed.
+        """
+        kept = list(PredictionRun.objects
+            .filter(completed_at__isnull=False)
+            .order_by('-completed_at', '-id')
+            .values_list('id', flat=True)[:cls.RUNS_KEPT]
+        )
+        # A pending run younger than the task time limit may still be writing
+        abandoned_before = timezone.now() - timedelta(seconds=cls.PENDING_RUN_TIMEOUT)
+        stale = (PredictionRun.objects
+            .exclude(id__in=kept)
+            .filter(Q(completed_at__isnull=False) | Q(created_at__lt=abandoned_before))
+        )
+
+        with transaction.atomic():
+            deleted = Earthquake.objects.filter(prediction_run__in=stale).delete()[0]
+            deleted += Earthquake.objects.filter(status="predicted", prediction_run__isnull=True).delete()[0]
+            runs = stale.delete()[0]
+
+        print(f"✅ Purged {runs} old prediction runs ({deleted} predictions)")
+        return deleted
+
+    @staticmethod
+    def past_earthquakes():
+        """The latest real events, newest first, as the global window reads them."""
+        return (Earthquake.objects
             .exclude(status="predicted")
             .exclude(usgs_id__startswith='predicted_')
             .order_by("-time")[:30]
         )
+
+    @classmethod
+    def fetch_past_earthquakes(cls):
+        # Get past earthquakes, excluding predictions
+        past_earthquakes = cls.past_earthquakes()
         
         if len(past_earthquakes) < 30:
             print("⚠️ Not enough past earthquake data for prediction. Need at least 30 records.")
@@ -74,124 +405,147 @@ class EarthquakePredictionService:
             for quake in reversed(past_earthquakes)
         ]
 
+    @classmethod
+    def regional_window_rows(cls):
+        """
+        The latest WINDOW_SIZE real events of every grid cell active within
+        REGION_LOOKBACK, ordered by cell then time, in one windowed query.
+        """
+        degrees = cls.REGION_CELL_DEGREES
+        return (Earthquake.objects
+            .filter(time__gte=timezone.now() - cls.REGION_LOOKBACK, prediction_run__isnull=True)
+            .exclude(status="predicted")
+            .exclude(usgs_id__startswith='predicted_')
+            .annotate(
+                cell_row=Floor((F("latitude") + 90) / degrees),
+                cell_col=Floor((F("longitude") + 180) / degrees),
+            )
+            .annotate(rank=Window(
+                expression=RowNumber(),
+                partition_by=[F("cell_row"), F("cell_col")],
+                order_by=F("time").desc(),
+            ))
+            .filter(rank__lte=WINDOW_SIZE)
+            .order_by("cell_row", "cell_col", "time")
+            .values("cell_row", "cell_col", "magnitude", "latitude", "longitude", "depth", "time")
+        )
+
+    @classmethod
+    def fetch_regional_windows(cls):
+        """
+        Return {region: past earthquakes oldest-first}: the global window plus
+        the most recently active grid-cell regions with enough history.
+        All cell windows come from one windowed query, bounded to
+        REGION_LOOKBACK so it ranks recent rows instead of the whole table.
+        """
+        windows = {}
+        past_earthquakes = cls.fetch_past_earthquakes()
+        if past_earthquakes:
+            windows[GLOBAL_REGION] = past_earthquakes
+
+        cells = {}
+        for row in cls.regional_window_rows():
+            region = f"cell_{int(row['cell_row'])}_{int(row['cell_col'])}"
+            cells.setdefault(region, []).append(row)
+
+        # Only regions with a full window, most recently active first
+        complete = [(region, quakes) for region, quakes in cells.items() if len(quakes) == WINDOW_SIZE]
+        complete.sort(key=lambda item: item[1][-1]["time"], reverse=True)
+        windows.update(complete[:cls.MAX_REGIONS])
+
+        print(f"✅ Built {len(windows)} regional windows")
+        return windows
+
     @classmethod 
     def predict_future_earthquakes(cls):
         try:
-            # First ensure all existing predictions are deleted
-            if not cls.delete_existing_predictions():
-                print("⚠️ Could not delete existing predictions. Aborting.")
+            windows = cls.fetch_regional_windows()
+            if not windows:
                 return
 
-            past_earthquakes = cls.fetch_past_earthquakes()
-            if not past_earthquakes:
-                return
+            regions = list(windows)
 
-            # Convert to NumPy array with all 4 features
+            # Convert to a (regions, 30, 4) NumPy array with all 4 features
             input_data = np.array([
-                [quake["magnitude"], quake["latitude"], quake["longitude"], quake["depth"]]
-                for quake in reversed(past_earthquakes[:30])
+                [
+                    [quake["magnitude"], quake["latitude"], quake["longitude"], quake["depth"]]
+                    for quake in reversed(windows[region][:WINDOW_SIZE])
+                ]
+                for region in regions
             ])
 
             print(f"✅ Input Data Shape: {input_data.shape}")
 
-            # Normalize input data - all 4 features
-            input_data_scaled = np.array([
-                scalers[col].transform(input_data[:, i].reshape(-1, 1)).flatten()
-                for i, col in enumerate(["magnitude", "latitude", "longitude", "depth"])
-            ]).T
-
-            # Reshape for LSTM model
-            X_input = np.array([input_data_scaled])
-            print(f"✅ LSTM Model Input Shape: {X_input.shape}")
+            # Normalize all 4 features in one affine op
+            scale, offset = LSTMModelRegistry.get_scaler_affine()
+            input_data_scaled = input_data * scale + offset
 
-            # Predict next 30 days
-            print("Starting 30-day predictions...")
-            future_predictions = []
-            
-            for day in range(30):
-                predicted_values = lstm_model.predict(X_input, verbose=0)[0]
-                future_predictions.append(predicted_values)
-                
-                # Update input window based on prediction shape
-                if len(predicted_values) == 4:
-                    next_input = predicted_values
-                else:
-                    next_input = np.array([
-                        predicted_values[0],
-                        predicted_values[1],
-                        predicted_values[2],
-                        X_input[0, -1, 3]
-                    ])
-                
-                X_input = np.append(X_input[:, 1:, :], [[next_input]], axis=1)
+            # Predict next 30 days for every region in a single compiled graph call
+            print(f"Starting 30-day predictions for {len(regions)} regions...")
+            rollout = LSTMModelRegistry.get_rollout(FORECAST_DAYS)
+            future_predictions = rollout(input_data_scaled.astype(np.float32))
 
             # Convert predictions back to original scale
-            future_predictions = np.array(future_predictions)
-            
-            predicted_magnitudes = scalers["magnitude"].inverse_transform(future_predictions[:, 0].reshape(-1, 1)).flatten()
-            predicted_latitudes = scalers["latitude"].inverse_transform(future_predictions[:, 1].reshape(-1, 1)).flatten()
-            predicted_longitudes = scalers["longitude"].inverse_transform(future_predictions[:, 2].reshape(-1, 1)).flatten()
+            n_outputs = future_predictions.shape[-1]
+            unscaled = (future_predictions - offset[:n_outputs]) / scale[:n_outputs]
+
+            predicted_magnitudes = unscaled[:, :, 0]
+            predicted_latitudes = unscaled[:, :, 1]
+            predicted_longitudes = unscaled[:, :, 2]
             
-            if future_predictions.shape[1] == 4:
-                predicted_depths = scalers["depth"].inverse_transform(future_predictions[:, 3].reshape(-1, 1)).flatten()
+            if n_outputs == 4:
+                predicted_depths = unscaled[:, :, 3]
             else:
-                predicted_depths = np.full(30, input_data[-1, 3])
-                print(f"Using default depth: {predicted_depths[0]}")
+                predicted_depths = np.repeat(input_data[:, -1:, 3], FORECAST_DAYS, axis=1)
+                print("Using each region's last depth as default depth")
                 
             # Store predictions
-            future_dates = pd.date_range(start=timezone.now(), periods=30, freq="D")
+            future_dates = pd.date_range(start=timezone.now(), periods=FORECAST_DAYS, freq="D")
             print("\nPreparing predictions for storage...")
 
-            # Prepare all predictions first
-            predictions_to_create = []
-            for i, date in enumerate(future_dates):
-                try:
-                    location = rg.search((predicted_latitudes[i], predicted_longitudes[i]))[0]
-                    place_name = f"{location['name']}, {location['cc']}"
-                except Exception as e:
-                    print(f"❌ Reverse geocoding failed for {predicted_latitudes[i]}, {predicted_longitudes[i]}: {e}")
-                    place_name = "Unknown Location"
-
-                predictions_to_create.append(
-                    Earthquake(
-                        usgs_id=f"predicted_{date.date()}",
-                        magnitude=float(predicted_magnitudes[i]),
-                        latitude=float(predicted_latitudes[i]),
-                        longitude=float(predicted_longitudes[i]),
-                        depth=float(predicted_depths[i]),
-                        time=date,
-                        place=place_name,
-                        status="predicted"
-                    )
+            # Reverse geocode every predicted point in one batched, memoized call
+            coordinates = list(zip(predicted_latitudes.ravel(), predicted_longitudes.ravel()))
+            place_names = np.array(ReverseGeocoder.places(coordinates), dtype=object).reshape(predicted_latitudes.shape)
+
+            # Prepare all predictions first, in a new run readers can't see yet
+            run = PredictionRun.objects.create(backend=LSTMModelRegistry.get().name, regions=len(regions))
+            predictions_to_create = [
+                Earthquake(
+                    usgs_id=f"predicted_{run.id}_{region}_{date.date()}",
+                    region=region,
+                    prediction_run=run,
+                    magnitude=float(predicted_magnitudes[r, i]),
+                    latitude=float(predicted_latitudes[r, i]),
+                    longitude=float(predicted_longitudes[r, i]),
+                    depth=float(predicted_depths[r, i]),
+                    time=date,
+                    place=place_names[r, i],
+                    status="predicted"
                 )
+                for r, region in enumerate(regions)
+                for i, date in enumerate(future_dates)
+            ]
 
-            # Store all predictions in a single transaction
+            # Write the run and publish it in one transaction: readers switch from the
+            # previous run to the complete new one, never seeing an empty set
             print(f"Creating {len(predictions_to_create)} predictions...")
             try:
                 with transaction.atomic():
-                    # Final check for existing predictions
-                    remaining_predictions = (
-                        Earthquake.objects.filter(status="predicted").count() +
-                        Earthquake.objects.filter(usgs_id__startswith='predicted_').count()
+                    Earthquake.objects.bulk_create(predictions_to_create, batch_size=1000)
+                    PredictionRun.objects.filter(pk=run.pk).update(
+                        completed_at=timezone.now(), prediction_count=len(predictions_to_create)
                     )
-                    
-                    if remaining_predictions > 0:
-                        raise Exception(f"Found {remaining_predictions} existing predictions before creation")
-                        
-                    Earthquake.objects.bulk_create(predictions_to_create)
-                    print(f"✅ Successfully stored {len(predictions_to_create)} predictions")
-                    
-                    # Verify creation
-                    final_count = Earthquake.objects.filter(status="predicted").count()
-                    print(f"✅ Final prediction count: {final_count}")
-                    
-                    return final_count
-            except Exception as e:
-                print(f"❌ Failed to store predictions: {e}")
+                    # Predictions are served from versioned response caches
+                    transaction.on_commit(DashboardCache.bump)
+                    transaction.on_commit(cls.request_purge)
+            except Exception:
+                logger.exception(f"❌ Failed to store prediction run {run.id}")
                 return 0
+
+            print(f"✅ Published prediction run {run.id} with {len(predictions_to_create)} predictions")
+            return len(predictions_to_create)
             
-        except Exception as e:
-            print(f"❌ Error during prediction process: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            # Never fail the task, but a run that publishes nothing must be visible
+            logger.exception("❌ Error during prediction process")
             return 0
\ No newline at end of file
@@ -0,0 +1,258 @@
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from .geo import grid_cell
+from .models import Earthquake
+from .rollups import CELL_DEGREES as ROLLUP_CELL_DEGREES, GRANULARITIES, LABELS
+from .spatial import bbox_filter, within_radius
+from .stats import MAGNITUDE_BUCKETS, bucket_index
+
+
+class EarthquakeQuery:
+    """
+    Filters, projection and keyset pagination for /api/earthquakes/.
+
+    Results are ordered latest-first by (time, id). The cursor is the
+    (time, id) of the last row of the previous page, so the next page is a
+    range scan of the (-time, -id) index starting right after it: deep pages
+    cost the same as the first, unlike OFFSET pagination.
+
+    Query parameters (all optional):
+        start, end              ISO datetimes, start inclusive, end exclusive
+        min_magnitude, max_magnitude
+        min_depth, max_depth    km
+        status                  comma-separated, e.g. alert,warning
+        bbox                    west,south,east,north; west > east crosses the antimeridian
+        near, radius_km         lon,lat and a radius in km
+        fields                  comma-separated subset of FIELDS
+        limit                   page size, up to MAX_PAGE_SIZE
+        cursor                  the `next` value of the previous page
+    """
+    FIELDS = ('id', 'usgs_id', 'time', 'magnitude', 'latitude', 'longitude', 'depth', 'place', 'status')
+    STATUSES = ('alert', 'warning', 'safe')
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = getattr(settings, 'EARTHQUAKE_API_MAX_PAGE_SIZE', 5000)
+    MAX_RADIUS_KM = 5000
+
+    def __init__(self, params):
+        """Parse request parameters; raises ValueError with a client-facing reason."""
+        self.filters = Q()
+
+        start = self.parse_time(params, 'start')
+        if start:
+            self.filters &= Q(time__gte=start)
+        end = self.parse_time(params, 'end')
+        if end:
+            self.filters &= Q(time__lt=end)
+
+        for name, lookup in (
+            ('min_magnitude', 'magnitude__gte'), ('max_magnitude', 'magnitude__lte'),
+            ('min_depth', 'depth__gte'), ('max_depth', 'depth__lte'),
+        ):
+            value = self.parse_float(params, name)
+            if value is not None:
+                self.filters &= Q(**{lookup: value})
+
+        if params.get('status'):
+            statuses = params['status'].split(',')
+            unknown = set(statuses) - set(self.STATUSES)
+            if unknown:
+                raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+            self.filters &= Q(status__in=statuses)
+
+        bbox = self.parse_bbox(params)
+        if bbox:
+            self.filters &= bbox_filter(*bbox)
+
+        self.near = None
+        if params.get('near'):
+            try:
+                longitude, latitude = (float(value) for value in params['near'].split(','))
+            except ValueError:
+                raise ValueError("near must be lon,lat")
+            radius_km = self.parse_float(params, 'radius_km')
+            if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+                raise ValueError("near must be lon,lat in degrees")
+            if radius_km is None or not 0 < radius_km <= self.MAX_RADIUS_KM:
+                raise ValueError(f"radius_km must be between 0 and {self.MAX_RADIUS_KM}")
+            self.near = (latitude, longitude, radius_km)
+
+        fields = params.get('fields')
+        self.fields = tuple(fields.split(',')) if fields else self.FIELDS
+        unknown = set(self.fields) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown field: {', '.join(sorted(unknown))}")
+
+        try:
+            self.limit = int(params.get('limit', self.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 0 < self.limit <= self.MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {self.MAX_PAGE_SIZE}")
+
+        self.cursor = self.decode_cursor(params['cursor']) if params.get('cursor') else None
+
+    @staticmethod
+    def parse_time(params, name):
+        if not params.get(name):
+            return None
+        try:
+            value = datetime.fromisoformat(params[name])
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO datetime")
+        return timezone.make_aware(value, timezone.utc) if timezone.is_naive(value) else value
+
+    @staticmethod
+    def parse_bbox(params):
+        """(west, south, east, north) from ?bbox, or None; west > east crosses the antimeridian."""
+        if not params.get('bbox'):
+            return None
+        try:
+            west, south, east, north = (float(value) for value in params['bbox'].split(','))
+        except ValueError:
+            raise ValueError("bbox must be west,south,east,north")
+        if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+            raise ValueError("bbox must be west,south,east,north in degrees")
+        return west, south, east, north
+
+    @staticmethod
+    def parse_float(params, name):
+        if params.get(name) in (None, ''):
+            return None
+        try:
+            return float(params[name])
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    @staticmethod
+    def encode_cursor(time, pk):
+        return base64.urlsafe_b64encode(f"{time.isoformat()}|{pk}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            time, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(time), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid cursor")
+
+    def queryset(self):
+        """One page plus one extra row, which tells whether there is a next page."""
+        queryset = Earthquake.objects.filter(prediction_run__isnull=True).exclude(status='predicted').filter(self.filters)
+        if self.near:
+            queryset = within_radius(queryset, *self.near)
+        if self.cursor:
+            time, pk = self.cursor
+            # (time, id) < cursor, spelled with a plain `time <= cursor time` term
+            # the planner can use as an index range bound; a bare OR cannot be
+            queryset = queryset.filter(Q(time__lte=time) & (Q(time__lt=time) | Q(id__lt=pk)))
+
+        # id and time are always fetched to build the next cursor
+        columns = tuple(dict.fromkeys(self.fields + ('id', 'time')))
+        return queryset.order_by('-time', '-id').values(*columns)[:self.limit + 1]
+
+    def rows(self):
+        """
+        Yield the page's rows projected to the requested fields, then a final
+        (None, next_cursor) marker; next_cursor is None on the last page.
+        """
+        last = None
+        for count, row in enumerate(self.queryset().iterator(chunk_size=1000)):
+            if count == self.limit:
+                yield None, self.encode_cursor(last['time'], last['id'])
+                return
+            last = row
+            yield {field: row[field] for field in self.fields}, None
+        yield None, None
+
+
+class RollupQuery:
+    """
+    Aggregates over the hourly/daily rollups for /api/rollups/.
+
+    Query parameters (all optional):
+        granularity     hour or day (default day)
+        start, end      ISO datetimes; default the last 48 hours / 30 days
+        bbox            west,south,east,north, matched to whole rollup cells
+        min_magnitude   keeps magnitude buckets at or above this value's bucket
+        group           time (trend series), cell (heatmap) or bucket (histogram)
+    """
+    GROUPS = ('time', 'cell', 'bucket')
+    DEFAULT_SPAN = {'hour': timedelta(hours=48), 'day': timedelta(days=30)}
+    MAX_SPAN = {'hour': timedelta(days=31), 'day': timedelta(days=5 * 366)}
+
+    def __init__(self, params):
+        """Parse request parameters; raises ValueError with a client-facing reason."""
+        self.granularity = params.get('granularity', 'day')
+        if self.granularity not in GRANULARITIES:
+            raise ValueError("granularity must be hour or day")
+        self.group = params.get('group', 'time')
+        if self.group not in self.GROUPS:
+            raise ValueError(f"group must be one of {', '.join(self.GROUPS)}")
+
+        self.end = EarthquakeQuery.parse_time(params, 'end') or timezone.now()
+        self.start = EarthquakeQuery.parse_time(params, 'start') or self.end - self.DEFAULT_SPAN[self.granularity]
+        if not self.start < self.end:
+            raise ValueError("start must be before end")
+        if self.end - self.start > self.MAX_SPAN[self.granularity]:
+            raise ValueError(f"At most {self.MAX_SPAN[self.granularity].days} days of {LABELS[self.granularity]} rollups per request")
+
+        self.model, self.field, _, bucket_of = GRANULARITIES[self.granularity]
+        self.filters = Q(**{f'{self.field}__gte': bucket_of(self.start), f'{self.field}__lte': bucket_of(self.end)})
+
+        min_magnitude = EarthquakeQuery.parse_float(params, 'min_magnitude')
+        if min_magnitude is not None:
+            self.filters &= Q(bucket__gte=bucket_index(min_magnitude))
+
+        bbox = EarthquakeQuery.parse_bbox(params)
+        if bbox:
+            west, south, east, north = bbox
+            first_row, first_column = grid_cell(south, west, ROLLUP_CELL_DEGREES)
+            last_row, last_column = grid_cell(north, east, ROLLUP_CELL_DEGREES)
+            columns = (
+                Q(cell_col__gte=first_column, cell_col__lte=last_column) if west <= east
+                else Q(cell_col__gte=first_column) | Q(cell_col__lte=last_column)
+            )
+            self.filters &= Q(cell_row__gte=first_row, cell_row__lte=last_row) & columns
+
+    def payload(self):
+        group_fields = {
+            'time': (self.field,),
+            'cell': ('cell_row', 'cell_col'),
+            'bucket': ('bucket',),
+        }[self.group]
+        rows = (self.model.objects
+            .filter(self.filters)
+            .values(*group_fields)
+            .annotate(events=Sum('count'), max_magnitude=Max('max_magnitude'), sum_magnitude=Sum('sum_magnitude'))
+            .order_by(*group_fields)
+        )
+
+        rollups = []
+        for row in rows:
+            entry = {
+                'count': row['events'],
+                'max_magnitude': row['max_magnitude'],
+                'avg_magnitude': round(row['sum_magnitude'] / row['events'], 3),
+            }
+            if self.group == 'time':
+                entry['time'] = row[self.field].isoformat()
+            elif self.group == 'cell':
+                entry['latitude'] = -90 + (row['cell_row'] + 0.5) * ROLLUP_CELL_DEGREES
+                entry['longitude'] = -180 + (row['cell_col'] + 0.5) * ROLLUP_CELL_DEGREES
+            else:
+                entry['bucket'] = MAGNITUDE_BUCKETS[row['bucket']][0]
+            rollups.append(entry)
+
+        return {
+            'granularity': self.granularity,
+            'group': self.group,
+            'cell_degrees': ROLLUP_CELL_DEGREES,
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'rollups': rollups,
+        }
@@ -0,0 +1,80 @@
+import json
+import logging
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastLog:
+    """
+    Sequence numbers and a bounded Redis stream of recently broadcast
+    earthquakes, so reconnecting WebSocket clients can replay what they missed.
+
+    Every broadcast event gets the next value of a global counter as `seq`,
+    and is appended to the stream with that number as its entry ID.
+    """
+    SEQUENCE_KEY = 'earthquake_broadcast_seq'
+    STREAM_KEY = 'earthquake_broadcast_stream'
+    MAX_LENGTH = getattr(settings, 'EARTHQUAKE_REPLAY_BUFFER_SIZE', 1000)
+
+    @classmethod
+    def append(cls, earthquakes):
+        """Assign sequence numbers to `earthquakes` in place and record them for replay."""
+        if not earthquakes:
+            return earthquakes
+
+        redis = get_redis_connection("default")
+        last = redis.incrby(cls.SEQUENCE_KEY, len(earthquakes))
+        first = last - len(earthquakes) + 1
+
+        for offset, earthquake in enumerate(earthquakes):
+            earthquake["seq"] = first + offset
+
+        if any(isinstance(result, ResponseError) for result in cls.add_entries(redis, earthquakes)):
+            # The counter was evicted or reset below the stream's last ID: the
+            # buffered entries belong to an older numbering, so start over
+            logger.warning("⚠️ Broadcast sequence went backwards; resetting the replay buffer")
+            redis.delete(cls.STREAM_KEY)
+            cls.add_entries(redis, earthquakes)
+        return earthquakes
+
+    @classmethod
+    def add_entries(cls, redis, earthquakes):
+        pipeline = redis.pipeline(transaction=False)
+        for earthquake in earthquakes:
+            pipeline.xadd(
+                cls.STREAM_KEY,
+                {"data": json.dumps(earthquake)},
+                id=f"{earthquake['seq']}-0",
+                maxlen=cls.MAX_LENGTH,
+                approximate=True,
+            )
+        return pipeline.execute(raise_on_error=False)
+
+    @classmethod
+    def current(cls):
+        """The sequence number of the most recent broadcast event."""
+        return int(get_redis_connection("default").get(cls.SEQUENCE_KEY) or 0)
+
+    @classmethod
+    def since(cls, sequence):
+        """
+        Return (earthquakes with seq > `sequence`, complete). `complete` is
+        False when some of the missed events already fell out of the buffer,
+        or when `sequence` is ahead of the counter (it was evicted or reset);
+        either way the client should do a full refresh and start over.
+        """
+        current = cls.current()
+        if sequence > current:
+            return [], False
+        if sequence == current:
+            return [], True
+
+        entries = get_redis_connection("default").xrange(cls.STREAM_KEY, min=f"{sequence + 1}-0", max="+")
+        earthquakes = [json.loads(fields[b"data"]) for _, fields in entries]
+
+        oldest = earthquakes[0]["seq"] if earthquakes else current + 1
+        return earthquakes, oldest <= sequence + 1
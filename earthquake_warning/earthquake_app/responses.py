@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+
+import orjson
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from .dashboard_cache import DashboardCache
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip and identity are always available
+    brotli = None
+
+# Streamed responses are flushed in chunks of about this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Preferred first when the client accepts several
+ENCODINGS = ('br', 'gzip')
+ETAG_SUFFIXES = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+
+def encode_payload(payload):
+    """Encode a payload once into identity, gzip and (if available) brotli variants."""
+    body = orjson.dumps(payload)
+    digest = hashlib.sha1(body).hexdigest()
+    variants = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=6),
+    }
+    if brotli is not None:
+        variants['br'] = brotli.compress(body)
+    return {
+        'variants': variants,
+        # Strong validators, one per representation
+        'etags': {encoding: f'"{digest}{ETAG_SUFFIXES[encoding]}"' for encoding in variants},
+    }
+
+
+def _accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _if_none_match(request):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+def cached_json_response(request, name, build_payload, timeout=None):
+    """
+    Serve a JSON payload from pre-encoded, precompressed bytes.
+
+    The encoded entry lives in the versioned dashboard cache, so it is only
+    rebuilt after ingest or a prediction run. Each encoding has its own
+    ETag: clients revalidating with the ETag of the variant their
+    Accept-Encoding selects get a 304; everyone else gets a byte copy of
+    that variant. `timeout` is passed on to DashboardCache.get_or_compute.
+    """
+    entry = DashboardCache.get_or_compute(name, lambda: encode_payload(build_payload()), timeout)
+
+    accepted = _accepted_encodings(request)
+    encoding = next(
+        (candidate for candidate in ENCODINGS if candidate in entry['variants'] and candidate in accepted),
+        'identity',
+    )
+    etag = entry['etags'][encoding]
+
+    # Only the representation this request would get validates; a client
+    # holding another encoding's ETag gets the bytes it now asked for
+    requested = _if_none_match(request)
+    if '*' in requested or etag in requested:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['variants'][encoding], content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'no-cache'  # Always revalidate; 304s are cheap
+    return response
+
+
+def streamed_page_response(request, key, rows, etag):
+    """
+    Stream a page as {"<key>": [...], "next": cursor} without building it in memory.
+
+    `rows` is called to get an iterator of (row, None) pairs ending with
+    (None, next_cursor), as EarthquakeQuery.rows() returns. Rows are encoded
+    as they arrive from the database cursor and flushed in STREAM_CHUNK_SIZE
+    pieces. A request whose If-None-Match holds `etag` gets a 304 before
+    `rows` is called, so no query is opened for it.
+    """
+    requested = _if_none_match(request)
+    if '*' in requested or etag in requested:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def stream(rows):
+        # Closing the response (e.g. on a client disconnect) closes `rows` and its server-side cursor
+        try:
+            buffer = bytearray(b'{"' + key.encode() + b'":[')
+            first = True
+            for row, next_cursor in rows:
+                if row is None:
+                    break
+                if not first:
+                    buffer += b','
+                buffer += orjson.dumps(row)
+                first = False
+                if len(buffer) >= STREAM_CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+            buffer += b'],"next":' + orjson.dumps(next_cursor) + b'}'
+            yield bytes(buffer)
+        finally:
+            rows.close()
+
+    response = StreamingHttpResponse(stream(rows()), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
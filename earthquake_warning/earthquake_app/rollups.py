@@ -0,0 +1,184 @@
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Max, Sum
+from django.db.models.functions import Floor, Least, TruncDate, TruncHour
+from django.utils import timezone
+
+from .geo import grid_cell
+from .models import DailyRollup, Earthquake, HourlyRollup
+from .stats import bucket_index, bucket_index_expression
+
+CELL_DEGREES = getattr(settings, 'EARTHQUAKE_ROLLUP_CELL_DEGREES', 1)
+HOURLY_RETENTION_DAYS = getattr(settings, 'EARTHQUAKE_HOURLY_ROLLUP_DAYS', 90)
+
+# granularity: (model, bucket field, truncation, bucket of a datetime)
+GRANULARITIES = {
+    'hour': (
+        HourlyRollup, 'hour', TruncHour,
+        lambda time: time.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0),
+    ),
+    'day': (
+        DailyRollup, 'day', TruncDate,
+        lambda time: time.astimezone(dt_timezone.utc).date(),
+    ),
+}
+KEY_FIELDS = ('cell_row', 'cell_col', 'bucket')
+LABELS = {'hour': 'hourly', 'day': 'daily'}
+
+
+def cell_expressions(degrees=CELL_DEGREES):
+    """(row, column) of the rollup grid cell, as database expressions clamped like geo.grid_cell."""
+    return (
+        Least(Floor((F('latitude') + 90) / degrees), int(180 // degrees) - 1, output_field=IntegerField()),
+        Least(Floor((F('longitude') + 180) / degrees), int(360 // degrees) - 1, output_field=IntegerField()),
+    )
+
+
+class RollupService:
+    """
+    Hourly and daily aggregates of real earthquakes per grid cell and
+    magnitude bucket: count, max and sum of magnitudes.
+
+    Ingest folds new rows in with apply() inside its write transaction, as
+    one INSERT ... ON CONFLICT DO UPDATE per table that adds to existing
+    buckets, so dashboards read O(buckets) instead of O(events).
+    recompute() rebuilds a range from the detail rows, and diff() compares
+    the two for the consistency checker.
+    """
+    UPSERT_BATCH_SIZE = 500
+
+    @staticmethod
+    def real_events(start, end):
+        return (Earthquake.objects
+            .filter(time__gte=start, time__lt=end, prediction_run__isnull=True)
+            .exclude(status="predicted")
+        )
+
+    @classmethod
+    def apply(cls, earthquakes):
+        """Add newly stored earthquakes to the hourly and daily rollups."""
+        for model, field, _, bucket_of in GRANULARITIES.values():
+            totals = defaultdict(lambda: [0, float('-inf'), 0.0])
+            for quake in earthquakes:
+                row, column = grid_cell(quake.latitude, quake.longitude, CELL_DEGREES)
+                total = totals[(bucket_of(quake.time), row, column, bucket_index(quake.magnitude))]
+                total[0] += 1
+                total[1] = max(total[1], quake.magnitude)
+                total[2] += quake.magnitude
+            cls.upsert(model, field, totals)
+
+    @classmethod
+    def upsert(cls, model, field, totals):
+        if not totals:
+            return
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = (field,) + KEY_FIELDS + ('count', 'max_magnitude', 'sum_magnitude')
+        greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+        adapt = (
+            connection.ops.adapt_datetimefield_value if field == 'hour'
+            else connection.ops.adapt_datefield_value
+        )
+
+        items = list(totals.items())
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), cls.UPSERT_BATCH_SIZE):
+                batch = items[start:start + cls.UPSERT_BATCH_SIZE]
+                placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+                params = []
+                for (bucket_start, row, column, bucket), (count, max_magnitude, sum_magnitude) in batch:
+                    params += [adapt(bucket_start), row, column, bucket, count, max_magnitude, sum_magnitude]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(quote(column) for column in columns)}) "
+                    f"VALUES {placeholders} "
+                    f"ON CONFLICT ({', '.join(quote(column) for column in columns[:4])}) DO UPDATE SET "
+                    f"{quote('count')} = {table}.{quote('count')} + EXCLUDED.{quote('count')}, "
+                    f"max_magnitude = {greatest}({table}.max_magnitude, EXCLUDED.max_magnitude), "
+                    f"sum_magnitude = {table}.sum_magnitude + EXCLUDED.sum_magnitude",
+                    params,
+                )
+
+    @classmethod
+    def compute(cls, granularity, start, end):
+        """{(bucket start, row, col, bucket): (count, max, sum)} computed from the detail rows in one GROUP BY."""
+        _, _, trunc, _ = GRANULARITIES[granularity]
+        cell_row, cell_col = cell_expressions()
+        groups = (cls.real_events(start, end)
+            .annotate(
+                bucket_start=trunc('time', tzinfo=dt_timezone.utc),
+                cell_row=cell_row,
+                cell_col=cell_col,
+                bucket=bucket_index_expression(),
+            )
+            .values('bucket_start', *KEY_FIELDS)
+            .annotate(events=Count('id'), max_magnitude=Max('magnitude'), sum_magnitude=Sum('magnitude'))
+            .order_by()
+        )
+        return {
+            (group['bucket_start'], int(group['cell_row']), int(group['cell_col']), group['bucket']):
+                (group['events'], group['max_magnitude'], group['sum_magnitude'])
+            for group in groups
+        }
+
+    @classmethod
+    def stored(cls, granularity, start, end):
+        """The same mapping as compute(), read from the rollup table."""
+        model, field, _, bucket_of = GRANULARITIES[granularity]
+        rows = model.objects.filter(**{
+            f'{field}__gte': bucket_of(start), f'{field}__lt': bucket_of(end),
+        }).values_list(field, *KEY_FIELDS, 'count', 'max_magnitude', 'sum_magnitude')
+        return {tuple(row[:4]): tuple(row[4:]) for row in rows}
+
+    @classmethod
+    def recompute(cls, granularity, start, end):
+        """
+        Rebuild the rollups for whole buckets in [start, end) from the detail
+        rows. Idempotent: existing rows for those buckets are replaced.
+        Only pass ranges whose detail rows still exist: before the retention
+        cutoff the stored rollups are the only copy of the history.
+        Returns the number of rollup rows written.
+        """
+        model, field, _, bucket_of = GRANULARITIES[granularity]
+        rollups = [
+            model(**{field: bucket_start}, cell_row=row, cell_col=column, bucket=bucket,
+                  count=count, max_magnitude=max_magnitude, sum_magnitude=sum_magnitude)
+            for (bucket_start, row, column, bucket), (count, max_magnitude, sum_magnitude)
+            in cls.compute(granularity, start, end).items()
+        ]
+
+        with transaction.atomic():
+            model.objects.filter(**{f'{field}__gte': bucket_of(start), f'{field}__lt': bucket_of(end)}).delete()
+            model.objects.bulk_create(rollups, batch_size=1000)
+        return len(rollups)
+
+    @classmethod
+    def recompute_daily(cls, start, end):
+        return cls.recompute('day', start, end)
+
+    @classmethod
+    def diff(cls, granularity, start, end, tolerance=1e-6):
+        """
+        Compare stored rollups with a recomputation from the detail rows.
+        Returns [(key, stored, expected)] for every bucket that differs;
+        missing buckets show up as None.
+        """
+        expected = cls.compute(granularity, start, end)
+        stored = cls.stored(granularity, start, end)
+
+        def same(a, b):
+            return a[0] == b[0] and all(abs(x - y) <= tolerance * max(1.0, abs(y)) for x, y in zip(a[1:], b[1:]))
+
+        return [
+            (key, stored.get(key), expected.get(key))
+            for key in sorted(set(expected) | set(stored), key=str)
+            if key not in stored or key not in expected or not same(stored[key], expected[key])
+        ]
+
+    @staticmethod
+    def purge_hourly():
+        """Drop hourly rollups older than HOURLY_RETENTION_DAYS; daily ones are kept."""
+        cutoff = timezone.now() - timedelta(days=HOURLY_RETENTION_DAYS)
+        return HourlyRollup.objects.filter(hour__lt=cutoff).delete()[0]
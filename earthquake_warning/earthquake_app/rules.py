@@ -0,0 +1,208 @@
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .alerts import AlertDispatcher, AlertLatency
+from .geo import grid_cell, haversine_km, radius_bounding_box
+from .models import AlertNotification, AlertRule, Earthquake
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledRule:
+    """The conditions of an AlertRule as plain attributes, cheap to test in a loop."""
+    __slots__ = ('id', 'name', 'min_magnitude', 'bbox', 'site', 'min_depth', 'max_depth')
+
+    def __init__(self, rule):
+        self.id = rule.id
+        self.name = rule.name
+        self.min_magnitude = rule.min_magnitude
+        self.bbox = rule.bbox()
+        self.site = rule.site()
+        self.min_depth = rule.min_depth
+        self.max_depth = rule.max_depth
+
+    def bounding_box(self):
+        """(west, south, east, north) covering the rule's area, or None for anywhere."""
+        if self.bbox is not None:
+            return self.bbox
+        if self.site is not None:
+            return radius_bounding_box(*self.site)
+        return None
+
+    def matches(self, latitude, longitude, depth):
+        """Exact check, after the index has already filtered on cell and magnitude."""
+        if self.min_depth is not None and depth < self.min_depth:
+            return False
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+
+        if self.bbox is not None:
+            west, south, east, north = self.bbox
+            if not south <= latitude <= north:
+                return False
+            return west <= longitude <= east if west <= east else (longitude >= west or longitude <= east)
+
+        if self.site is not None:
+            site_latitude, site_longitude, radius_km = self.site
+            return haversine_km(site_latitude, site_longitude, latitude, longitude) <= radius_km
+
+        return True
+
+
+class RuleIndex:
+    """
+    Active rules bucketed by grid cell, for evaluating many rules against
+    many events without testing every pair.
+
+    A rule is listed in every cell its area overlaps; rules without an area,
+    or covering more than MAX_CELLS cells, go into a shared list checked for
+    every event. Each list is sorted by min_magnitude, so an event only
+    looks at the prefix of rules whose threshold it reaches, found by bisection.
+    """
+    CELL_DEGREES = getattr(settings, 'EARTHQUAKE_RULE_CELL_DEGREES', 5)
+    MAX_CELLS = 64
+
+    def __init__(self, rules):
+        columns = int(360 // self.CELL_DEGREES)
+        by_cell = defaultdict(list)
+        anywhere = []
+
+        for rule in rules:
+            bounding_box = rule.bounding_box()
+            if bounding_box is None:
+                anywhere.append(rule)
+                continue
+
+            west, south, east, north = bounding_box
+            first_row, first_column = grid_cell(south, west, self.CELL_DEGREES)
+            last_row, last_column = grid_cell(north, east, self.CELL_DEGREES)
+            if west <= east:
+                cell_columns = list(range(first_column, last_column + 1))
+            else:
+                # Crosses the antimeridian: west..180 then -180..east
+                cell_columns = list(range(first_column, columns)) + list(range(0, last_column + 1))
+            cell_rows = range(first_row, last_row + 1)
+
+            if len(cell_rows) * len(cell_columns) > self.MAX_CELLS:
+                anywhere.append(rule)
+                continue
+            for row in cell_rows:
+                for column in cell_columns:
+                    by_cell[(row, column)].append(rule)
+
+        self.cells = {cell: self.sorted_by_magnitude(cell_rules) for cell, cell_rules in by_cell.items()}
+        self.anywhere = self.sorted_by_magnitude(anywhere)
+        self.size = len(rules)
+
+    @staticmethod
+    def sorted_by_magnitude(rules):
+        rules = sorted(rules, key=lambda rule: rule.min_magnitude)
+        return rules, [rule.min_magnitude for rule in rules]
+
+    def match(self, earthquake):
+        """The rules an earthquake satisfies."""
+        latitude, longitude, magnitude = earthquake.latitude, earthquake.longitude, earthquake.magnitude
+        candidates = [self.anywhere]
+        cell = self.cells.get(grid_cell(latitude, longitude, self.CELL_DEGREES))
+        if cell is not None:
+            candidates.append(cell)
+
+        matched = []
+        for rules, thresholds in candidates:
+            for rule in rules[:bisect_right(thresholds, magnitude)]:
+                if rule.matches(latitude, longitude, earthquake.depth):
+                    matched.append(rule)
+        return matched
+
+
+class AlertRuleEngine:
+    """
+    Evaluates AlertRules against newly ingested earthquakes inside the
+    ingest transaction and queues a notification per match for
+    AlertDispatcher. Matched events are marked is_alert_sent in the same
+    transaction, so they reach the sinks once, through their rules, and
+    never also through the default M4.5+ alerts.
+
+    The compiled RuleIndex is kept per process and rebuilt when the rules
+    change, detected by one aggregate query per batch (count and latest
+    updated_at of the active rules; AlertRuleQuerySet.update moves
+    updated_at too), and at least every REFRESH_INTERVAL to pick up edits
+    made outside the ORM.
+    """
+    REFRESH_INTERVAL = timezone.timedelta(seconds=getattr(settings, 'EARTHQUAKE_RULE_REFRESH_SECONDS', 300))
+
+    _index = None
+    _fingerprint = None
+    _compiled_at = None
+
+    @classmethod
+    def index(cls):
+        active = AlertRule.objects.filter(is_active=True)
+        fingerprint = tuple(active.aggregate(count=Count('id'), updated=Max('updated_at')).values())
+        now = timezone.now()
+        if cls._index is None or fingerprint != cls._fingerprint or now - cls._compiled_at >= cls.REFRESH_INTERVAL:
+            cls._index = RuleIndex([CompiledRule(rule) for rule in active])
+            cls._fingerprint = fingerprint
+            cls._compiled_at = now
+            logger.info(f"📐 Compiled {cls._index.size} alert rules")
+        return cls._index
+
+    @classmethod
+    def evaluate(cls, earthquakes):
+        """[(compiled rule, earthquake)] for every match in the batch."""
+        index = cls.index()
+        if not index.size:
+            return []
+        return [(rule, earthquake) for earthquake in earthquakes for rule in index.match(earthquake)]
+
+    @classmethod
+    def process(cls, earthquakes, ingested_at):
+        """
+        Evaluate an ingest batch from inside its transaction: queue the
+        notifications, mark the matched events as alerted, and trigger
+        delivery once the transaction commits. Also triggers delivery when
+        the batch holds events for the default M4.5+ alerts, so neither
+        waits for the beat. Errors are logged and never fail the ingest.
+        """
+        try:
+            # A savepoint, so a failure here does not abort the ingest transaction
+            with transaction.atomic():
+                matches = cls.evaluate(earthquakes)
+                if matches:
+                    AlertNotification.objects.bulk_create([
+                        AlertNotification(
+                            rule_id=rule.id,
+                            earthquake_id=earthquake.id,
+                            payload={**AlertDispatcher.serialize(earthquake), "rule": rule.name, "rule_id": rule.id},
+                            ingested_at=ingested_at,
+                        )
+                        for rule, earthquake in matches
+                    ], ignore_conflicts=True)
+                    matched = {earthquake.id: earthquake for _, earthquake in matches}
+                    Earthquake.objects.filter(
+                        id__in=list(matched),
+                        time__gte=min(earthquake.time for earthquake in matched.values()),
+                    ).update(is_alert_sent=True)
+                    for earthquake in matched.values():
+                        earthquake.is_alert_sent = True
+        except Exception as e:
+            logger.error(f"❌ Error evaluating alert rules: {e}")
+            return
+
+        if matches:
+            # Enqueued means visible to the dispatcher, i.e. committed
+            transaction.on_commit(lambda: AlertLatency.observe(
+                'enqueued', [(timezone.now() - ingested_at).total_seconds()] * len(matches)
+            ))
+            logger.info(f"🚨 Queued {len(matches)} rule notifications for {len(earthquakes)} new earthquakes")
+        if matches or any(
+            earthquake.magnitude >= AlertDispatcher.MIN_MAGNITUDE and not earthquake.is_alert_sent
+            for earthquake in earthquakes
+        ):
+            transaction.on_commit(AlertDispatcher.request_dispatch)
@@ -1,109 +1,120 @@
 import requests
 import logging
+import hashlib
+from collections import defaultdict
 from django.utils import timezone
 from django.db import transaction
-from .models import Earthquake
+from django.conf import settings
+from django.core.cache import cache
+from .models import Earthquake, EarthquakeKey
+from .alerts import AlertDispatcher
+from .streaming import iter_response_features
+from .dashboard_cache import DashboardCache
+from .responses import encode_payload
+from .stats import EarthquakeStatsService
+from .geocoding import ReverseGeocoder
+from .geo import geohash_encode
+from .rollups import RollupService
+from .rules import AlertRuleEngine
+from .subscriptions import GLOBAL_GROUP, groups_for_event
+from .replay import BroadcastLog
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from celery import current_app
 
 logger = logging.getLogger(__name__)
 
 class EarthquakeDataService:
-    USGS_API_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson"
+    USGS_FEED_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/{feed}.geojson"
+    USGS_API_URL = USGS_FEED_URL.format(feed="all_day")
+    SYNC_STATE_CACHE_KEY = 'usgs_feed_sync_state'
+    # (max seconds since the last successful sync, feed), smallest feed first.
+    # The margins leave room for a late or slow sync.
+    FEED_WINDOWS = [
+        (50 * 60, "all_hour"),
+        (23 * 60 * 60, "all_day"),
+    ]
+    FALLBACK_FEED = "all_week"
+    STREAMING_FEEDS = {"all_week", "all_month"}
+    REFRESH_INTERVAL = getattr(settings, 'EARTHQUAKE_REFRESH_INTERVAL', 60)
+    REFRESH_QUEUED_CACHE_KEY = 'earthquake_refresh_queued'
+    INGEST_BATCH_SIZE = getattr(settings, 'EARTHQUAKE_INGEST_BATCH_SIZE', 500)
+    BROADCAST_BATCH_SIZE = getattr(settings, 'EARTHQUAKE_BROADCAST_BATCH_SIZE', 200)
+    FDSN_QUERY_URL = getattr(settings, 'USGS_FDSN_QUERY_URL', "https://earthquake.usgs.gov/fdsnws/event/1/query")
+    FDSN_PAGE_SIZE = 20000  # Maximum `limit` accepted by the FDSN event service
 
     @classmethod
     def fetch_recent_earthquakes(cls):
         """
-        Fetch and store earthquakes from USGS API from the last 24 hours.
+        Incrementally sync earthquakes from the USGS summary feeds.
+
+        The feed (all_hour / all_day / all_week) is picked from the time since
+        the last successful sync, the request is conditional on the stored
+        ETag/Last-Modified so an unchanged feed costs a 304, and only features
+        updated after the stored high-water mark are parsed and stored.
+        Large feeds are streamed and stored in bounded chunks.
         Also pushes real-time updates via WebSockets.
+        Returns the ingest summary, or None when nothing new was found.
         """
         try:
-            logger.info("🔄 Fetching earthquake data from USGS API...")
-            response = requests.get(cls.USGS_API_URL, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            state = cls.get_sync_state()
+            feed = cls.select_feed(state)
+            validators = state["validators"].get(feed, {})
 
-            if "features" not in data:
-                logger.error("❌ Invalid API response: 'features' key missing")
-                return None
+            headers = {}
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
 
-            twenty_four_hours_ago = timezone.now() - timezone.timedelta(hours=24)
-            latest_earthquakes = []
-            stored_count = 0
-
-            for feature in data.get("features", []):
-                try:
-                    properties = feature.get("properties", {})
-                    geometry = feature.get("geometry", {})
-
-                    required_fields = {
-                        "mag": properties.get("mag"),
-                        "place": properties.get("place"),
-                        "time": properties.get("time"),
-                        "coordinates": geometry.get("coordinates"),
-                    }
-
-                    if None in required_fields.values():
-                        logger.warning(f"⚠️ Skipping earthquake due to missing data: {feature.get('id', 'Unknown')}")
-                        continue
-
-                    # Convert timestamp from milliseconds to datetime object
-                    timestamp = timezone.datetime.fromtimestamp(properties["time"] / 1000, timezone.utc)
-
-                    if timestamp < twenty_four_hours_ago:
-                        continue  # Skip older earthquakes
-
-                    latest_earthquakes.append({
-                        "usgs_id": feature["id"],
-                        "magnitude": properties["mag"],
-                        "place": properties["place"],
-                        "time": timestamp,
-                        "longitude": geometry["coordinates"][0],
-                        "latitude": geometry["coordinates"][1],
-                        "depth": geometry["coordinates"][2],
-                    })
-
-                except (KeyError, ValueError, IndexError) as e:
-                    logger.error(f"⚠️ Error processing earthquake data: {e}")
-                    continue
+            logger.info(f"🔄 Fetching {feed} earthquake feed from USGS API...")
+            response = requests.get(
+                cls.USGS_FEED_URL.format(feed=feed), headers=headers, timeout=10, stream=True
+            )
 
-            if not latest_earthquakes:
-                logger.info("✅ No new earthquakes found.")
+            if response.status_code == 304:
+                logger.info(f"✅ USGS {feed} feed not modified since last sync.")
+                cls.save_sync_state(state)
                 return None
 
-            # Start database transaction
-            with transaction.atomic():
-                channel_layer = get_channel_layer()
+            response.raise_for_status()
+            state["validators"][feed] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
 
-                for quake_data in latest_earthquakes:
-                    earthquake, created = Earthquake.objects.get_or_create(
-                        usgs_id=quake_data["usgs_id"], defaults=quake_data
-                    )
+            if feed in cls.STREAMING_FEEDS:
+                # Decode large feeds incrementally instead of loading them whole
+                features = iter_response_features(response)
+            else:
+                data = response.json()
+
+                if "features" not in data:
+                    logger.error("❌ Invalid API response: 'features' key missing")
+                    return None
+
+                features = data.get("features", [])
+                if cls.feed_digest(features) == state["seen_digest"]:
+                    logger.info(f"✅ USGS {feed} feed content unchanged since last sync.")
+                    cls.save_sync_state(state)
+                    return None
+
+            summary = cls.ingest_features(features, high_water_mark=state["high_water_mark"])
+
+            # Only advance the sync state once the new rows are stored
+            state["high_water_mark"] = summary["high_water_mark"]
+            state["seen_digest"] = summary["digest"]
+            cls.save_sync_state(state)
+
+            if not summary["processed"]:
+                logger.info("✅ No new earthquakes found.")
+                return None
 
-                    if created:
-                        stored_count += 1
-                        logger.info(f"📍 Stored new earthquake: {earthquake}")
-
-                        # Send real-time update via WebSockets
-                        async_to_sync(channel_layer.group_send)(
-                            "earthquake_updates",
-                            {
-                                "type": "send_earthquake_update",
-                                "earthquake": {
-                                    "latitude": earthquake.latitude,
-                                    "longitude": earthquake.longitude,
-                                    "magnitude": earthquake.magnitude,
-                                    "depth": earthquake.depth,
-                                    "place": earthquake.place,
-                                    "time": earthquake.time.isoformat(),
-                                    "status": earthquake.status,
-                                    "id": earthquake.id,
-                                },
-                            },
-                        )
-
-            logger.info(f"✅ Processed {len(latest_earthquakes)} earthquakes. Stored {stored_count} new records.")
-            return latest_earthquakes
+            logger.info(
+                f"✅ Processed {summary['processed']} of {summary['total']} earthquakes from {feed}. "
+                f"Stored {summary['stored']} new records."
+            )
+            return summary
 
         except requests.Timeout:
             logger.error("❌ Timeout while fetching earthquake data from USGS API")
@@ -118,17 +129,398 @@ class EarthquakeDataService:
             logger.error(f"❌ Unexpected error in earthquake data service: {e}")
             return None
 
+    @classmethod
+    def request_refresh(cls):
+        """
+        Queue a background ingest if the data is stale, without blocking the request.
+
+        Used by the read path instead of fetching inline. At most one refresh is
+        queued per REFRESH_INTERVAL across all web workers, and the task itself
+        holds a Redis lock so only one ingest runs cluster-wide.
+        """
+        last_success = cls.get_sync_state()["last_success"]
+        if last_success is not None and timezone.now().timestamp() - last_success < cls.REFRESH_INTERVAL:
+            return False
+
+        if not cache.add(cls.REFRESH_QUEUED_CACHE_KEY, True, cls.REFRESH_INTERVAL):
+            return False  # Another request already queued a refresh
+
+        try:
+            # send_task never runs inline, even with CELERY_TASK_ALWAYS_EAGER
+            current_app.send_task("earthquake_app.tasks.fetch_earthquake_data")
+            logger.info("🔄 Queued background earthquake refresh")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Could not queue earthquake refresh: {e}")
+            return False
+
+    @classmethod
+    def get_sync_state(cls):
+        """Load the feed sync state (validators, high-water mark, seen-id digest)."""
+        state = cache.get(cls.SYNC_STATE_CACHE_KEY) or {}
+        state.setdefault("validators", {})
+        state.setdefault("high_water_mark", 0)
+        state.setdefault("seen_digest", None)
+        state.setdefault("last_success", None)
+        return state
+
+    @classmethod
+    def save_sync_state(cls, state):
+        """Record a successful sync. The state never expires."""
+        state["last_success"] = timezone.now().timestamp()
+        cache.set(cls.SYNC_STATE_CACHE_KEY, state, None)
+
+    @classmethod
+    def select_feed(cls, state):
+        """
+        Pick the smallest USGS feed that still covers the gap since the last
+        successful sync, so a worker that was down catches up automatically.
+        """
+        if state["last_success"] is None:
+            return cls.FALLBACK_FEED
+
+        elapsed = timezone.now().timestamp() - state["last_success"]
+        for max_elapsed, feed in cls.FEED_WINDOWS:
+            if elapsed <= max_elapsed:
+                return feed
+        return cls.FALLBACK_FEED
+
+    @staticmethod
+    def feature_updated(feature):
+        """Return the feature's `updated` timestamp in ms, falling back to its event time."""
+        properties = feature.get("properties") or {}
+        return properties.get("updated") or properties.get("time") or 0
+
+    @classmethod
+    def feed_digest(cls, features):
+        """Digest of the (id, updated) pairs in a feed, to detect unchanged content without validators."""
+        digest = hashlib.sha1()
+        for feature in features:
+            digest.update(f"{feature.get('id')}:{cls.feature_updated(feature)};".encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def ingest_features(cls, features, high_water_mark=0, since=None, broadcast=True):
+        """
+        Validate and store features in chunks of INGEST_BATCH_SIZE.
+
+        `features` may be a list or a generator from the streaming parser; at
+        most one chunk is held in memory. Features not updated after
+        `high_water_mark` (ms) or older than `since` are skipped. Returns a
+        summary with counts, the new high-water mark and the feed digest.
+        """
+        digest = hashlib.sha1()
+        summary = {"total": 0, "processed": 0, "stored": 0, "high_water_mark": high_water_mark}
+        pending = []
+
+        def flush():
+            latest_earthquakes = cls.parse_features(pending, since=since)
+            summary["processed"] += len(latest_earthquakes)
+            if latest_earthquakes:
+                summary["stored"] += len(cls.store_earthquakes(latest_earthquakes, broadcast=broadcast))
+            pending.clear()
+
+        for feature in features:
+            updated = cls.feature_updated(feature)
+            digest.update(f"{feature.get('id')}:{updated};".encode())
+            summary["total"] += 1
+            summary["high_water_mark"] = max(summary["high_water_mark"], updated)
+
+            if updated > high_water_mark:
+                pending.append(feature)
+                if len(pending) >= cls.INGEST_BATCH_SIZE:
+                    flush()
+
+        if pending:
+            flush()
+
+        summary["digest"] = digest.hexdigest()
+        return summary
+
+    @classmethod
+    def parse_features(cls, features, since=None):
+        """
+        Validate USGS GeoJSON features and convert them to Earthquake field dicts.
+        Features older than `since` are skipped. Events without a place name
+        (common in older backfilled data) are reverse geocoded in one batch.
+        """
+        latest_earthquakes = []
+        unnamed = []
+
+        for feature in features:
+            try:
+                properties = feature.get("properties", {})
+                geometry = feature.get("geometry", {})
+
+                required_fields = {
+                    "mag": properties.get("mag"),
+                    "time": properties.get("time"),
+                    "coordinates": geometry.get("coordinates"),
+                }
+
+                if None in required_fields.values():
+                    logger.warning(f"⚠️ Skipping earthquake due to missing data: {feature.get('id', 'Unknown')}")
+                    continue
+
+                # Convert timestamp from milliseconds to datetime object
+                timestamp = timezone.datetime.fromtimestamp(properties["time"] / 1000, timezone.utc)
+
+                if since is not None and timestamp < since:
+                    continue  # Skip older earthquakes
+
+                if not properties.get("place"):
+                    unnamed.append(len(latest_earthquakes))
+
+                latest_earthquakes.append({
+                    "usgs_id": feature["id"],
+                    "magnitude": properties["mag"],
+                    "place": properties.get("place"),
+                    "time": timestamp,
+                    "longitude": geometry["coordinates"][0],
+                    "latitude": geometry["coordinates"][1],
+                    "depth": geometry["coordinates"][2],
+                })
+
+            except (KeyError, ValueError, IndexError, TypeError) as e:
+                logger.error(f"⚠️ Error processing earthquake data: {e}")
+                continue
+
+        if unnamed:
+            places = ReverseGeocoder.places([
+                (latest_earthquakes[i]["latitude"], latest_earthquakes[i]["longitude"]) for i in unnamed
+            ])
+            for i, place in zip(unnamed, places):
+                latest_earthquakes[i]["place"] = place
+
+        return latest_earthquakes
+
+    @classmethod
+    def store_earthquakes(cls, latest_earthquakes, broadcast=True):
+        """
+        Bulk-store earthquakes that are not in the database yet.
+
+        Replaces the per-feature get_or_create loop: one query skips the
+        usgs_ids already known, one INSERT ... ON CONFLICT DO NOTHING claims
+        the remaining keys in EarthquakeKey, and one bulk INSERT writes the
+        events whose key this call claimed (statuses and geohashes are
+        assigned here because bulk_create bypasses save()). Claiming the
+        key first makes this safe against concurrent ingests and revised
+        origin times, and only rows inserted here are returned.
+        Returns the list of newly created Earthquake objects. Backfills pass
+        broadcast=False so historical events are not pushed to live clients
+        or evaluated against the alert rules.
+        """
+        # Later duplicates of the same usgs_id win, as the feed lists updates last
+        by_usgs_id = {quake_data["usgs_id"]: quake_data for quake_data in latest_earthquakes}
+
+        known_ids = set(
+            EarthquakeKey.objects.filter(usgs_id__in=list(by_usgs_id)).values_list("usgs_id", flat=True)
+        )
+        candidates = {usgs_id: quake_data for usgs_id, quake_data in by_usgs_id.items() if usgs_id not in known_ids}
+        if not candidates:
+            return []
+
+        ingested_at = timezone.now()
+        with transaction.atomic():
+            claimed = EarthquakeKey.claim({usgs_id: quake_data["time"] for usgs_id, quake_data in candidates.items()})
+            created = [
+                Earthquake(
+                    status=Earthquake.status_for_magnitude(quake_data["magnitude"]),
+                    geohash=geohash_encode(quake_data["latitude"], quake_data["longitude"]),
+                    **quake_data
+                )
+                for usgs_id, quake_data in candidates.items()
+                if usgs_id in claimed
+            ]
+            if created:
+                Earthquake.objects.bulk_create(created, batch_size=cls.INGEST_BATCH_SIZE)
+                if created[0].pk is None:
+                    # No INSERT ... RETURNING on this backend; the claimed keys are ours alone
+                    created = list(Earthquake.objects.filter(usgs_id__in=claimed))
+                created.sort(key=lambda earthquake: earthquake.time)
+
+                # Rollups are updated in the same transaction as the rows they count
+                RollupService.apply(created)
+                # New rows invalidate every versioned dashboard cache entry
+                transaction.on_commit(DashboardCache.bump)
+
+                if broadcast:
+                    payloads = [cls.serialize_earthquake(earthquake) for earthquake in created]
+                    # Publish only once readers can see the rows
+                    transaction.on_commit(lambda: cls.broadcast_earthquakes(payloads))
+                    # Rule matches commit with the events, before the dispatcher can see them as pending
+                    AlertRuleEngine.process(created, ingested_at)
+
+        if created:
+            logger.info(f"📍 Stored {len(created)} new earthquakes, latest: {created[-1]}")
+
+        return created
+
+    @staticmethod
+    def serialize_earthquake(earthquake):
+        return {
+            "latitude": earthquake.latitude,
+            "longitude": earthquake.longitude,
+            "magnitude": earthquake.magnitude,
+            "depth": earthquake.depth,
+            "place": earthquake.place,
+            "time": earthquake.time.isoformat(),
+            "status": earthquake.status,
+            "id": earthquake.id,
+        }
+
+    @classmethod
+    def broadcast_earthquakes(cls, earthquakes):
+        """
+        Push new earthquakes to WebSocket clients as a few batched
+        send_earthquake_batch messages, through a single sync-to-async bridge,
+        instead of one group_send per event.
+
+        Unsubscribed clients get everything through the global group;
+        subscribed clients only through the grid-cell groups an event falls in.
+        """
+        if not earthquakes:
+            return
+
+        try:
+            # Sequence numbers let reconnecting clients replay what they missed
+            BroadcastLog.append(earthquakes)
+        except Exception as e:
+            logger.error(f"❌ Error recording earthquakes for replay: {e}")
+
+        by_group = defaultdict(list)
+        for earthquake in earthquakes:
+            by_group[GLOBAL_GROUP].append(earthquake)
+            for group in groups_for_event(earthquake):
+                by_group[group].append(earthquake)
+
+        channel_layer = get_channel_layer()
+
+        async def send_batches():
+            for group, group_earthquakes in by_group.items():
+                for start in range(0, len(group_earthquakes), cls.BROADCAST_BATCH_SIZE):
+                    await channel_layer.group_send(
+                        group,
+                        {
+                            "type": "send_earthquake_batch",
+                            "earthquakes": group_earthquakes[start:start + cls.BROADCAST_BATCH_SIZE],
+                        },
+                    )
+
+        try:
+            async_to_sync(send_batches)()
+        except Exception as e:
+            logger.error(f"❌ Error broadcasting earthquake updates: {e}")
+
+    @classmethod
+    def backfill_slice(cls, start, end, min_magnitude):
+        """
+        Fetch and store every event between `start` and `end` from the FDSN
+        event API, following limit/offset pages. HTTP errors are raised so the
+        caller can leave the slice unchecked and retry it later.
+        """
+        totals = {"total": 0, "processed": 0, "stored": 0}
+        offset = 1  # FDSN offsets are 1-based
+
+        while True:
+            response = requests.get(
+                cls.FDSN_QUERY_URL,
+                params={
+                    "format": "geojson",
+                    "starttime": start.isoformat(),
+                    "endtime": end.isoformat(),
+                    "minmagnitude": min_magnitude,
+                    "orderby": "time-asc",
+                    "limit": cls.FDSN_PAGE_SIZE,
+                    "offset": offset,
+                },
+                timeout=60,
+                stream=True,
+            )
+            if response.status_code == 204:  # No events in this slice
+                break
+            response.raise_for_status()
+
+            summary = cls.ingest_features(iter_response_features(response), broadcast=False)
+            for key in totals:
+                totals[key] += summary[key]
+
+            if summary["total"] < cls.FDSN_PAGE_SIZE:
+                break
+            offset += summary["total"]
+
+        return totals
+
     @classmethod
     def get_alerts(cls):
         """
         Retrieve earthquakes that require alerts (magnitude >= 4.5) from the last 24 hours.
+        Delivery is done by AlertDispatcher via the dispatch_alerts task.
         """
-        twenty_four_hours_ago = timezone.now() - timezone.timedelta(hours=24)
-        alerts = Earthquake.objects.filter(
-            time__gte=twenty_four_hours_ago,
-            magnitude__gte=4.5,
-            is_alert_sent=False
-        ).order_by('-magnitude')
+        return AlertDispatcher.pending().order_by('-magnitude')
+
+
+class DashboardDataService:
+    """
+    Builds the dashboard entries cached in DashboardCache. Lives here rather
+    than in views so the ingest task can warm the cache without importing
+    the views layer.
+    """
+    STATS_WINDOWS = getattr(settings, 'EARTHQUAKE_STATS_WINDOWS', ('1h', '24h', '7d', '30d'))
+
+    @staticmethod
+    def latest_earthquakes():
+        return Earthquake.observed().order_by('-time')[:50]
+
+    @classmethod
+    def build_earthquake_data(cls):
+        earthquakes = cls.latest_earthquakes()
+
+        return [{
+            'latitude': eq.latitude,
+            'longitude': eq.longitude,
+            'magnitude': eq.magnitude,
+            'depth': eq.depth,
+            'place': eq.place,
+            'time': eq.time.isoformat(),
+            'status': eq.status,
+            'id': eq.id
+        } for eq in earthquakes]
 
-        logger.info(f"🚨 Found {alerts.count()} earthquakes requiring alerts.")
-        return alerts
\ No newline at end of file
+    @classmethod
+    def build_statistics(cls):
+        # One aggregate query for every window; the 24h keys stay flat for the template
+        windows = EarthquakeStatsService.compute(cls.STATS_WINDOWS)
+        return {
+            'total_24h': windows['24h']['total'],
+            'avg_magnitude': windows['24h']['avg_magnitude'],
+            'active_alerts': windows['24h']['active_alerts'],
+            'highest_magnitude': windows['24h']['highest_magnitude'],
+            'magnitude_histogram': windows['24h']['magnitude_histogram'],
+            'status_counts': windows['24h']['status_counts'],
+            'windows': windows,
+        }
+
+    @staticmethod
+    def build_dashboard_payload(earthquakes, stats):
+        return {
+            'earthquakes': earthquakes,
+            'stats': stats,
+            # Time the payload was built, so the bytes (and ETag) stay stable
+            'last_update': timezone.now().isoformat()
+        }
+
+    @classmethod
+    def warm_cache(cls):
+        """
+        Recompute the cached entries for the current data version right after
+        ingest, including the encoded /api/dashboard-data/ response, so the
+        first dashboard request after new quakes is a hit.
+        """
+        earthquakes = DashboardCache.store('earthquake_data', cls.build_earthquake_data())
+        # The statistics cover windows relative to now, so they expire sooner
+        stats = DashboardCache.store('earthquake_stats', cls.build_statistics(), timeout=DashboardCache.WINDOW_TIMEOUT)
+        DashboardCache.store(
+            'dashboard_response', encode_payload(cls.build_dashboard_payload(earthquakes, stats)),
+            timeout=DashboardCache.WINDOW_TIMEOUT,
+        )
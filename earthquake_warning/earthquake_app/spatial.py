@@ -0,0 +1,69 @@
+import math
+
+from django.conf import settings
+from django.db.models import BooleanField, F, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+from .geo import EARTH_RADIUS_KM, GEOHASH_ALPHABET, geohash_cover, radius_bounding_box
+
+# "geohash" works everywhere; "postgis" needs the GiST index created by migration 0008
+SPATIAL_BACKEND = getattr(settings, 'EARTHQUAKE_SPATIAL_BACKEND', 'geohash')
+
+# Must match the indexed expression exactly for the planner to use the GiST index
+POSTGIS_POINT = "(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography)"
+
+
+def bbox_filter(west, south, east, north):
+    """
+    Q for events inside a bounding box (west > east crosses the antimeridian).
+
+    The geohash prefixes narrow the scan to a few index ranges; the exact
+    latitude/longitude bounds then trim the cells' overhang.
+    """
+    cover = Q()
+    cells = geohash_cover(west, south, east, north)
+    if not (len(cells[0]) == 1 and len(cells) == len(GEOHASH_ALPHABET)):  # Whole world: no range helps
+        for prefix in cells:
+            cover |= Q(geohash__startswith=prefix)
+
+    longitudes = (
+        Q(longitude__gte=west, longitude__lte=east) if west <= east
+        else Q(longitude__gte=west) | Q(longitude__lte=east)
+    )
+    return cover & Q(latitude__gte=south, latitude__lte=north) & longitudes
+
+
+def distance_km(latitude, longitude):
+    """Haversine distance from a point to each row, as a database expression."""
+    half_dlat = Radians(F('latitude') - latitude) / 2
+    half_dlon = Radians(F('longitude') - longitude) / 2
+    a = Power(Sin(half_dlat), 2) + math.cos(math.radians(latitude)) * Cos(Radians(F('latitude'))) * Power(Sin(half_dlon), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(a), 1.0))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Events within `radius_km` of a point, annotated with `distance_km`.
+
+    With PostGIS, ST_DWithin on the indexed geography expression does the
+    search; otherwise the circle's bounding box goes through bbox_filter and
+    the exact distance is checked in SQL.
+    """
+    queryset = queryset.annotate(distance_km=distance_km(latitude, longitude))
+    if SPATIAL_BACKEND == 'postgis':
+        return queryset.filter(RawSQL(
+            f"ST_DWithin({POSTGIS_POINT}, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography, %s)",
+            (longitude, latitude, radius_km * 1000),
+            output_field=BooleanField(),
+        ))
+
+    return queryset.filter(
+        bbox_filter(*radius_bounding_box(latitude, longitude, radius_km)),
+        distance_km__lte=radius_km,
+    )
+
+
+def within_bbox(queryset, west, south, east, north):
+    """Events inside a bounding box; the geohash index serves this with or without PostGIS."""
+    return queryset.filter(bbox_filter(west, south, east, north))
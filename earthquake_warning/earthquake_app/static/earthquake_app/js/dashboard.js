@@ -4,6 +4,9 @@ console.log("✅ Dashboard.js Loaded");
 let map;
 let markers = [];
 let socket;
+let subscription = null;
+let lastSequence = null;
+let statsRefreshTimer = null;
 
 document.addEventListener("DOMContentLoaded", function () {
     console.log("✅ DOM Loaded");
@@ -14,19 +17,58 @@ document.addEventListener("DOMContentLoaded", function () {
 });
 
 function initializeWebSocket() {
-    socket = new WebSocket(`${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws/earthquakes/`);
+    // Resume from the last event we saw; subscribed clients resume via the subscribe message
+    const resume = lastSequence !== null && !subscription ? `?resume_from=${lastSequence}` : "";
+    socket = new WebSocket(`${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws/earthquakes/${resume}`);
 
     socket.onmessage = function(event) {
-        const earthquake = JSON.parse(event.data);
-        console.log("🔴 Real-time earthquake update received:", earthquake);
+        const message = JSON.parse(event.data);
+        if (message.type === "subscribed" || message.type === "unsubscribed" || message.type === "error") {
+            console.log("📡 Subscription update:", message);
+            return;
+        }
+        if (message.type === "sequence") {
+            lastSequence = lastSequence ?? message.seq;
+            return;
+        }
+        if (message.type === "resync") {
+            // Missed more than the server's replay buffer holds, or the server's
+            // sequence was reset: reload, then continue from the server's number
+            lastSequence = message.seq ?? null;
+            fetchDashboardData();
+            return;
+        }
+        // Ingest sends one frame per batch; older single-event frames are bare earthquakes
+        const batch = message.type === "earthquake_batch" ? message.earthquakes : [message];
+        // Replayed and live frames can overlap; skip sequence numbers already shown
+        const earthquakes = batch.filter(earthquake =>
+            earthquake.seq === undefined || lastSequence === null || earthquake.seq > lastSequence
+        );
+        earthquakes.forEach(earthquake => {
+            if (earthquake.seq !== undefined) {
+                lastSequence = Math.max(lastSequence ?? 0, earthquake.seq);
+            }
+        });
+        if (!earthquakes.length) {
+            return;
+        }
+        console.log("🔴 Real-time earthquake update received:", earthquakes.length, "event(s)");
         
         // Update all components
-        addEarthquakeMarker(earthquake);
-        updateEarthquakeTable(earthquake);
+        earthquakes.forEach(earthquake => {
+            addEarthquakeMarker(earthquake);
+            updateEarthquakeTable(earthquake);
+        });
         updateStatistics();
     };
 
-    socket.onopen = () => console.log("✅ WebSocket connected");
+    socket.onopen = () => {
+        console.log("✅ WebSocket connected");
+        // Restore the region filter after a reconnect
+        if (subscription) {
+            socket.send(JSON.stringify({ action: "subscribe", ...subscription, resume_from: lastSequence }));
+        }
+    };
     socket.onerror = (error) => console.error("❌ WebSocket error:", error);
     socket.onclose = () => {
         console.warn("⚠️ WebSocket closed, attempting to reconnect...");
@@ -34,6 +76,28 @@ function initializeWebSocket() {
     };
 }
 
+// Only receive events inside an area, e.g.
+// subscribeToRegion({ bbox: [west, south, east, north], min_magnitude: 4.5 }) or
+// subscribeToRegion({ center: [lon, lat], radius_km: 500, min_magnitude: 3 }).
+// Pass null to receive every event again.
+function subscribeToRegion(region) {
+    subscription = region;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify(region ? { action: "subscribe", ...region } : { action: "unsubscribe" }));
+    }
+}
+
+// Statistics are aggregated server-side; refresh them once per burst of updates
+function updateStatistics() {
+    clearTimeout(statsRefreshTimer);
+    statsRefreshTimer = setTimeout(() => {
+        fetch('/api/dashboard-data/')
+            .then(response => response.json())
+            .then(updateDashboard)
+            .catch(error => console.error("❌ Error refreshing statistics:", error));
+    }, 2000);
+}
+
 function initializeMap() {
     if (!document.getElementById("map")) {
         console.error("❌ Map container not found!");
@@ -88,5 +152,9 @@ function initializeSearch() {
     }
 }
 
-// Auto refresh
-setInterval(fetchDashboardData, 60000); // Every minute
\ No newline at end of file
+// Fallback refresh while the WebSocket is down; replay covers gaps once it reconnects
+setInterval(() => {
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+        fetchDashboardData();
+    }
+}, 60000); // Every minute
\ No newline at end of file
@@ -1,30 +1,63 @@
 console.log("✅ map.js Loaded");
 
 // Open WebSocket connection for real-time earthquake updates
-const socket = new WebSocket("wss://" + window.location.host + "/ws/earthquakes/");
+let socket;
+let lastSequence = null;
+
+function connectSocket() {
+    // Resume from the last event we saw so nothing broadcast during the gap is lost
+    const resume = lastSequence !== null ? `?resume_from=${lastSequence}` : "";
+    socket = new WebSocket("wss://" + window.location.host + "/ws/earthquakes/" + resume);
+
+    socket.onmessage = function (event) {
+        const message = JSON.parse(event.data);
+        if (message.type === "sequence") {
+            lastSequence = lastSequence ?? message.seq;
+            return;
+        }
+        if (message.type === "resync") {
+            // Missed more than the server's replay buffer holds, or the server's
+            // sequence was reset: reload, then continue from the server's number
+            lastSequence = message.seq ?? null;
+            updateDashboard();
+            return;
+        }
+        // Ingest sends one frame per batch; older single-event frames are bare earthquakes
+        const batch = message.type === "earthquake_batch" ? message.earthquakes : [message];
+        // Replayed and live frames can overlap; skip sequence numbers already shown
+        const earthquakes = batch.filter(earthquake =>
+            earthquake.seq === undefined || lastSequence === null || earthquake.seq > lastSequence
+        );
+        console.log("🔴 Real-time earthquake update received:", earthquakes.length, "event(s)");
+
+        earthquakes.forEach(earthquake => {
+            if (earthquake.seq !== undefined) {
+                lastSequence = Math.max(lastSequence ?? 0, earthquake.seq);
+            }
 
-socket.onmessage = function (event) {
-    const earthquake = JSON.parse(event.data);
-    console.log("🔴 Real-time earthquake update received:", earthquake);
+            // Add the new earthquake to the map
+            addEarthquakeMarker(earthquake);
 
-    // Add the new earthquake to the map
-    addEarthquakeMarker(earthquake);
+            // Update the table dynamically
+            updateEarthquakeTable(earthquake);
+        });
+    };
 
-    // Update the table dynamically
-    updateEarthquakeTable(earthquake);
-};
+    socket.onopen = function () {
+        console.log("✅ WebSocket connection established!");
+    };
 
-socket.onopen = function () {
-    console.log("✅ WebSocket connection established!");
-};
+    socket.onerror = function (error) {
+        console.error("❌ WebSocket error:", error);
+    };
 
-socket.onerror = function (error) {
-    console.error("❌ WebSocket error:", error);
-};
+    socket.onclose = function () {
+        console.warn("⚠️ WebSocket connection closed, reconnecting...");
+        setTimeout(connectSocket, 1000);
+    };
+}
 
-socket.onclose = function () {
-    console.warn("⚠️ WebSocket connection closed.");
-};
+connectSocket();
 
 let map;
 let markers = [];
@@ -225,5 +258,9 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 });
 
-// Refresh dashboard data every minute
-setInterval(updateDashboard, 60000);
+// Fallback refresh while the WebSocket is down; replay covers gaps once it reconnects
+setInterval(() => {
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+        updateDashboard();
+    }
+}, 60000);
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.db.models import Avg, Case, Count, IntegerField, Max, Q, Value, When
+from django.utils import timezone
+
+from .models import Earthquake
+
+WINDOWS = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+# (label, lower bound inclusive, upper bound exclusive)
+MAGNITUDE_BUCKETS = [
+    ('<2', None, 2.0),
+    ('2-3', 2.0, 3.0),
+    ('3-4', 3.0, 4.0),
+    ('4-5', 4.0, 5.0),
+    ('5-6', 5.0, 6.0),
+    ('6-7', 6.0, 7.0),
+    ('7+', 7.0, None),
+]
+
+
+def bucket_index(magnitude):
+    """Index into MAGNITUDE_BUCKETS of the bucket a magnitude falls in."""
+    for i, (_, lower, upper) in enumerate(MAGNITUDE_BUCKETS):
+        if (lower is None or magnitude >= lower) and (upper is None or magnitude < upper):
+            return i
+    return len(MAGNITUDE_BUCKETS) - 1
+
+
+def bucket_index_expression():
+    """The same mapping as bucket_index, as a database expression."""
+    return Case(
+        *[
+            When(EarthquakeStatsService._bucket_filter(lower, upper), then=Value(i))
+            for i, (_, lower, upper) in enumerate(MAGNITUDE_BUCKETS)
+        ],
+        default=Value(len(MAGNITUDE_BUCKETS) - 1),
+        output_field=IntegerField(),
+    )
+
+
+class EarthquakeStatsService:
+    @staticmethod
+    def _bucket_filter(lower, upper):
+        bucket = Q()
+        if lower is not None:
+            bucket &= Q(magnitude__gte=lower)
+        if upper is not None:
+            bucket &= Q(magnitude__lt=upper)
+        return bucket
+
+    @staticmethod
+    def window_starts(windows):
+        now = timezone.now()
+        return {window: now - WINDOWS[window] for window in windows}
+
+    @classmethod
+    def queryset(cls, windows, starts=None):
+        """The events compute() aggregates: real events within the widest window."""
+        starts = starts or cls.window_starts(windows)
+        return Earthquake.observed().filter(time__gte=min(starts.values()))
+
+    @classmethod
+    def compute(cls, windows=('24h',)):
+        """
+        Compute statistics for every requested window in a single aggregate query.
+
+        Each window gets its own filtered aggregates (count, avg, max, active
+        alerts, magnitude histogram and per-status counts) over a scan bounded
+        by the widest window, so adding windows adds no round-trips.
+        Predictions are excluded. Returns {window: stats}.
+        """
+        starts = cls.window_starts(windows)
+
+        aggregates = {}
+        for window, start in starts.items():
+            in_window = Q(time__gte=start)
+            aggregates[f'total_{window}'] = Count('id', filter=in_window)
+            aggregates[f'avg_{window}'] = Avg('magnitude', filter=in_window)
+            aggregates[f'max_{window}'] = Max('magnitude', filter=in_window)
+            aggregates[f'alerts_{window}'] = Count(
+                'id', filter=in_window & (Q(status='alert') | Q(magnitude__gte=4.5))
+            )
+            for i, (label, lower, upper) in enumerate(MAGNITUDE_BUCKETS):
+                aggregates[f'bucket{i}_{window}'] = Count(
+                    'id', filter=in_window & cls._bucket_filter(lower, upper)
+                )
+            for status, _ in Earthquake.STATUS_CHOICES:
+                aggregates[f'status_{status}_{window}'] = Count(
+                    'id', filter=in_window & Q(status=status)
+                )
+
+        row = cls.queryset(windows, starts).aggregate(**aggregates)
+
+        return {
+            window: {
+                'total': row[f'total_{window}'],
+                'avg_magnitude': round(row[f'avg_{window}'] or 0, 2),
+                'active_alerts': row[f'alerts_{window}'],
+                'highest_magnitude': row[f'max_{window}'] or 0,
+                'magnitude_histogram': {
+                    label: row[f'bucket{i}_{window}']
+                    for i, (label, _, _) in enumerate(MAGNITUDE_BUCKETS)
+                },
+                'status_counts': {
+                    status: row[f'status_{status}_{window}']
+                    for status, _ in Earthquake.STATUS_CHOICES
+                },
+            }
+            for window in windows
+        }
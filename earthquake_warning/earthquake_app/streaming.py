@@ -0,0 +1,60 @@
+import codecs
+import json
+import re
+
+FEATURES_ARRAY = re.compile(r'"features"\s*:\s*\[')
+SEPARATORS = ' \t\n\r,'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def iter_geojson_features(chunks):
+    """
+    Yield the features of a GeoJSON FeatureCollection one at a time from an
+    iterable of byte chunks (e.g. response.iter_content()).
+
+    Only the current feature and the unread part of the last chunk are held
+    in memory, so peak memory stays flat no matter how large the feed is.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+
+    # Skip ahead to the opening bracket of the features array
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        match = FEATURES_ARRAY.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        buffer = buffer[-64:]  # Keep a tail in case the key spans two chunks
+    else:
+        raise ValueError("GeoJSON response has no 'features' array")
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in SEPARATORS:
+            pos += 1
+
+        if pos < len(buffer):
+            if buffer[pos] == "]":
+                return
+            try:
+                feature, pos = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                pass  # The feature continues in the next chunk
+            else:
+                yield feature
+                continue
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("GeoJSON response ended inside the 'features' array")
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+
+def iter_response_features(response):
+    """Stream the features of a `requests` response opened with stream=True."""
+    return iter_geojson_features(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
@@ -0,0 +1,144 @@
+from .geo import grid_cell, haversine_km, radius_bounding_box
+
+GLOBAL_GROUP = "earthquake_updates"
+
+# Events are routed to (grid cell, magnitude band) groups. A subscriber joins
+# the cells its area overlaps, in the highest band not above its minimum
+# magnitude, so each event only reaches sockets that can match it.
+# Subscribers without an area, or whose area spans more than MAX_CELL_GROUPS
+# cells, join a single worldwide group for their band instead.
+CELL_DEGREES = 10
+ROWS = 180 // CELL_DEGREES
+COLUMNS = 360 // CELL_DEGREES
+MAGNITUDE_BANDS = (0.0, 2.5, 4.5)
+MAX_RADIUS_KM = 5000
+MAX_CELL_GROUPS = 64
+
+
+def cell_for(latitude, longitude):
+    return grid_cell(latitude, longitude, CELL_DEGREES)
+
+
+def group_name(row, column, band):
+    return f"earthquakes_{row}_{column}_m{band}"
+
+
+def global_group_name(band):
+    """The worldwide group of a band; band 0 is the group every event goes to."""
+    return GLOBAL_GROUP if band == 0 else f"earthquakes_all_m{band}"
+
+
+def band_for(magnitude):
+    """Index of the highest band whose threshold is at or below `magnitude`."""
+    band = 0
+    for index, threshold in enumerate(MAGNITUDE_BANDS):
+        if magnitude >= threshold:
+            band = index
+    return band
+
+
+def groups_for_event(earthquake):
+    """
+    Every group an event must be published to besides GLOBAL_GROUP: its cell
+    in each band it qualifies for, and the worldwide groups of bands above 0.
+    """
+    row, column = cell_for(earthquake["latitude"], earthquake["longitude"])
+    bands = range(band_for(earthquake["magnitude"]) + 1)
+    return (
+        [group_name(row, column, band) for band in bands]
+        + [global_group_name(band) for band in bands if band > 0]
+    )
+
+
+class Subscription:
+    """
+    A client's area of interest: a bounding box or a center + radius, plus
+    a minimum magnitude. Built from the client's subscribe message:
+
+        {"action": "subscribe", "bbox": [west, south, east, north], "min_magnitude": 4.5}
+        {"action": "subscribe", "center": [lon, lat], "radius_km": 500, "min_magnitude": 3}
+
+    Coordinates follow GeoJSON order. A bbox with west > east crosses the antimeridian.
+    """
+
+    def __init__(self, min_magnitude=0.0, bbox=None, center=None, radius_km=None):
+        self.min_magnitude = min_magnitude
+        self.bbox = bbox
+        self.center = center
+        self.radius_km = radius_km
+
+    @classmethod
+    def from_message(cls, message):
+        """Validate a subscribe message; raises ValueError with a client-facing reason."""
+        try:
+            min_magnitude = float(message.get("min_magnitude", 0.0))
+
+            if message.get("bbox") is not None:
+                west, south, east, north = (float(value) for value in message["bbox"])
+                if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+                    raise ValueError("bbox must be [west, south, east, north] in degrees")
+                return cls(min_magnitude, bbox=(west, south, east, north))
+
+            if message.get("center") is not None:
+                longitude, latitude = (float(value) for value in message["center"])
+                radius_km = float(message.get("radius_km", 0))
+                if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+                    raise ValueError("center must be [lon, lat] in degrees")
+                if not 0 < radius_km <= MAX_RADIUS_KM:
+                    raise ValueError(f"radius_km must be between 0 and {MAX_RADIUS_KM}")
+                return cls(min_magnitude, center=(longitude, latitude), radius_km=radius_km)
+
+            return cls(min_magnitude)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid subscription: {e}")
+
+    def bounding_box(self):
+        """(west, south, east, north) covering the subscribed area."""
+        if self.bbox is not None:
+            return self.bbox
+        if self.center is None:
+            return (-180.0, -90.0, 180.0, 90.0)
+
+        longitude, latitude = self.center
+        return radius_bounding_box(latitude, longitude, self.radius_km)
+
+    def groups(self):
+        band = band_for(self.min_magnitude)
+        if self.bbox is None and self.center is None:
+            return [global_group_name(band)]
+
+        west, south, east, north = self.bounding_box()
+        first_row, _ = cell_for(south, 0)
+        last_row, _ = cell_for(north, 0)
+        _, first_column = cell_for(0, west)
+        _, last_column = cell_for(0, east)
+
+        if west <= east:
+            columns = list(range(first_column, last_column + 1))
+        else:
+            # Crosses the antimeridian: west..180 then -180..east
+            columns = list(range(first_column, COLUMNS)) + list(range(0, last_column + 1))
+
+        rows = range(first_row, last_row + 1)
+        if len(rows) * len(columns) > MAX_CELL_GROUPS:
+            # matches() still applies the exact area on delivery
+            return [global_group_name(band)]
+        return [group_name(row, column, band) for row in rows for column in columns]
+
+    def matches(self, earthquake):
+        """Exact check, applied after coarse routing by group."""
+        if earthquake["magnitude"] < self.min_magnitude:
+            return False
+
+        if self.bbox is not None:
+            west, south, east, north = self.bbox
+            if not south <= earthquake["latitude"] <= north:
+                return False
+            longitude = earthquake["longitude"]
+            return west <= longitude <= east if west <= east else (longitude >= west or longitude <= east)
+
+        if self.center is not None:
+            longitude, latitude = self.center
+            return haversine_km(latitude, longitude, earthquake["latitude"], earthquake["longitude"]) <= self.radius_km
+
+        return True
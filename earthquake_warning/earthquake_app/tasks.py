@@ -1,115 +1,57 @@
-import requests
 import logging
 from celery import shared_task
-from django.utils import timezone
-from django.db import transaction
-from .models import Earthquake
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .predictions import EarthquakePredictionService
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import LockError
+from .services import DashboardDataService, EarthquakeDataService
+from .predictions import EarthquakePredictionService, LSTMModelRegistry
+from .geocoding import ReverseGeocoder
+from .partitions import EarthquakePartitions
+from .rollups import RollupService
+from .alerts import AlertDispatcher
 
 
 logger = logging.getLogger(__name__)
 
-USGS_API_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson"
+INGEST_LOCK_KEY = 'earthquake_ingest_lock'
+# Streaming all_week, geocoding, rollups and rule evaluation outgrow the global 30s limit
+INGEST_TIME_LIMIT = 240
+INGEST_LOCK_TIMEOUT = INGEST_TIME_LIMIT + 60  # Outlives the hard limit, so it never expires mid-ingest
 
-@shared_task
+@shared_task(time_limit=INGEST_TIME_LIMIT, soft_time_limit=INGEST_TIME_LIMIT - 30)
 def fetch_earthquake_data():
     """
     Celery task to fetch recent earthquake data from the USGS API.
+    - Skips unchanged feeds via conditional requests.
     - Stores new earthquakes in the database.
     - Sends real-time updates via WebSockets.
-    - Runs automatically at scheduled intervals.
+    - Runs automatically at scheduled intervals, and on demand when the
+      dashboard finds the data stale.
     """
+    # Singleflight: beat and dashboard-triggered refreshes never ingest concurrently
+    lock = cache.lock(INGEST_LOCK_KEY, timeout=INGEST_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        logger.info("⏭️ Earthquake ingest already running, skipping.")
+        return
+
     try:
         logger.info("⏳ Fetching earthquake data from USGS API...")
 
-        response = requests.get(USGS_API_URL, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        if "features" not in data:
-            logger.warning("❌ USGS API response is missing 'features' key.")
-            return
-
-        twenty_four_hours_ago = timezone.now() - timezone.timedelta(hours=24)
-        latest_earthquakes = []
-        stored_count = 0
+        # The service handles conditional requests, feed selection and errors
+        summary = EarthquakeDataService.fetch_recent_earthquakes()
 
-        for feature in data.get("features", []):
+        if summary and summary["stored"]:
+            # Write-through: recompute dashboard entries for the new data version
             try:
-                properties = feature.get("properties", {})
-                geometry = feature.get("geometry", {})
-
-                # Validate required fields
-                if not all([properties.get("mag"), properties.get("place"), properties.get("time"), geometry.get("coordinates")]):
-                    logger.warning(f"⚠️ Skipping incomplete earthquake data: {feature.get('id', 'Unknown')}")
-                    continue
-
-                timestamp = timezone.datetime.fromtimestamp(properties["time"] / 1000, timezone.utc)
-
-                if timestamp < twenty_four_hours_ago:
-                    continue  # Ignore older earthquakes
-
-                latest_earthquakes.append({
-                    "usgs_id": feature["id"],
-                    "magnitude": properties["mag"],
-                    "place": properties["place"],
-                    "time": timestamp,
-                    "longitude": geometry["coordinates"][0],
-                    "latitude": geometry["coordinates"][1],
-                    "depth": geometry["coordinates"][2],
-                })
-
-            except (KeyError, ValueError, IndexError) as e:
-                logger.error(f"⚠️ Error processing earthquake data: {e}")
-                continue
-
-        if not latest_earthquakes:
-            logger.info("✅ No new earthquakes found.")
-            return
-
-        # Store new earthquakes in the database
-        with transaction.atomic():
-            channel_layer = get_channel_layer()
-
-            for quake_data in latest_earthquakes:
-                earthquake, created = Earthquake.objects.get_or_create(
-                    usgs_id=quake_data["usgs_id"], defaults=quake_data
-                )
-
-                if created:
-                    stored_count += 1
-                    logger.info(f"📍 Stored new earthquake: {earthquake}")
-
-                    # Send WebSocket update
-                    async_to_sync(channel_layer.group_send)(
-                        "earthquake_updates",
-                        {
-                            "type": "send_earthquake_update",
-                            "earthquake": {
-                                "latitude": earthquake.latitude,
-                                "longitude": earthquake.longitude,
-                                "magnitude": earthquake.magnitude,
-                                "depth": earthquake.depth,
-                                "place": earthquake.place,
-                                "time": earthquake.time.isoformat(),
-                                "status": earthquake.status,
-                                "id": earthquake.id,
-                            },
-                        },
-                    )
-
-        logger.info(f"✅ Processed {len(latest_earthquakes)} earthquakes. Stored {stored_count} new records.")
-
-    except requests.Timeout:
-        logger.error("❌ Timeout while fetching earthquake data from USGS API")
-    except requests.ConnectionError:
-        logger.error("❌ Connection error while accessing USGS API")
-    except requests.RequestException as e:
-        logger.error(f"❌ Error fetching earthquake data: {e}")
-    except Exception as e:
-        logger.error(f"❌ Unexpected error in Celery task: {e}")
+                DashboardDataService.warm_cache()
+            except Exception as e:
+                logger.error(f"❌ Error warming dashboard cache: {e}")
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("⚠️ Ingest lock expired before the task finished.")
 
 
 @shared_task(time_limit=300, soft_time_limit=270)
@@ -126,4 +68,67 @@ def run_earthquake_predictions():
 
         logger.info("✅ Future earthquakes predicted and stored in the database.")
     except Exception as e:
-        logger.error(f"❌ Error in prediction task: {e}")
\ No newline at end of file
+        logger.error(f"❌ Error in prediction task: {e}")
+
+
+@shared_task
+def purge_prediction_runs():
+    """
+    Deletes superseded prediction runs. Queued after each run is published,
+    so the prediction worker never blocks on the cleanup.
+    """
+    try:
+        EarthquakePredictionService.purge_old_runs()
+    except Exception as e:
+        logger.error(f"❌ Error purging prediction runs: {e}")
+
+
+@shared_task(time_limit=1800, soft_time_limit=1700)
+def maintain_earthquake_partitions():
+    """
+    Daily storage maintenance: creates upcoming monthly partitions, moves
+    rows that reached the default partition into their own month, rolls
+    up then drops detail data past the retention period, and trims old
+    hourly rollups.
+    """
+    try:
+        if EarthquakePartitions.is_partitioned():
+            created = EarthquakePartitions.ensure_future_partitions()
+            if created:
+                logger.info(f"✅ Created partitions: {', '.join(created)}")
+        retired = EarthquakePartitions.retire_old_data()
+        if retired:
+            logger.info(f"✅ Retired {len(retired)} months of detail data into daily rollups")
+        RollupService.purge_hourly()
+    except Exception as e:
+        logger.error(f"❌ Error in partition maintenance: {e}")
+
+
+@shared_task(time_limit=300, soft_time_limit=270)
+def dispatch_alerts():
+    """
+    Delivers pending alerts and rule notifications to the configured sinks
+    and marks them sent. Batches are claimed with SKIP LOCKED, so several
+    workers can run this concurrently without sending an alert twice.
+    Queued by ingest as soon as new events match; the beat is a fallback.
+    """
+    try:
+        sent = AlertDispatcher.dispatch()
+        if sent:
+            logger.info(f"✅ Dispatched {sent} alerts")
+    except Exception as e:
+        logger.error(f"❌ Error dispatching alerts: {e}")
+
+
+@worker_process_init.connect
+def preload_prediction_model(**kwargs):
+    """
+    Warm-start the LSTM and place index in the dedicated prediction worker only
+    (EARTHQUAKE_PRELOAD_MODEL=True); other workers load it lazily, if ever.
+    """
+    if getattr(settings, 'EARTHQUAKE_PRELOAD_MODEL', False):
+        try:
+            LSTMModelRegistry.preload()
+            ReverseGeocoder.preload()
+        except Exception as e:
+            logger.error(f"❌ Error preloading LSTM model: {e}")
@@ -1,3 +1,1413 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib.util import find_spec
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from . import predictions, responses
+from .alerts import AlertDispatcher, AlertSink, DeliveryError
+from .consumers import EarthquakeConsumer
+from .benchmarks import seed_earthquakes
+from .dashboard_cache import DashboardCache
+from .geo import GEOHASH_ALPHABET, geohash_cover, geohash_encode, haversine_km
+from .geocoding import ReverseGeocoder
+from .management.commands import explain_queries, export_lstm_model
+from .models import (
+    AlertDelivery, AlertNotification, AlertRule, BackfillCheckpoint, DailyRollup, Earthquake, HourlyRollup, PredictionRun,
+)
+from .partitions import EarthquakePartitions
+from .predictions import (
+    BACKENDS, FEATURES, FORECAST_DAYS, GLOBAL_REGION, WINDOW_SIZE, EarthquakePredictionService, LSTMModelRegistry,
+    TensorFlowBackend, build_rollout, numpy_rollout,
+)
+from .queries import EarthquakeQuery
+from .replay import BroadcastLog
+from .rollups import RollupService
+from .responses import cached_json_response
+from .rules import AlertRuleEngine, CompiledRule, RuleIndex
+from .spatial import within_bbox, within_radius
+from .services import DashboardDataService, EarthquakeDataService
+from .stats import EarthquakeStatsService, bucket_index
+from .views import DashboardView
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, headers, body = self.server.respond(self)
+        self.server.requests.append((self.path, dict(self.headers), status))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """
+    A local HTTP server standing in for the USGS APIs. `respond(handler)`
+    returns (status, headers, body); requests are recorded as
+    (path, headers, status).
+    """
+
+    def __init__(self, respond):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.httpd.respond = respond
+        self.httpd.requests = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+
+def feature(usgs_id, time, magnitude=3.0, updated=None):
+    """A USGS GeoJSON feature; `time` and `updated` are datetimes."""
+    time_ms = int(time.timestamp() * 1000)
+    return {
+        "type": "Feature",
+        "id": usgs_id,
+        "properties": {
+            "mag": magnitude,
+            "place": "10 km N of Testville, CA",
+            "time": time_ms,
+            "updated": int(updated.timestamp() * 1000) if updated else time_ms,
+        },
+        "geometry": {"type": "Point", "coordinates": [-117.5, 35.7, 8.0]},
+    }
+
+
+def make_earthquake(usgs_id, time, magnitude=3.0, **fields):
+    defaults = {"place": "Testville", "latitude": 35.7, "longitude": -117.5, "depth": 8.0}
+    return Earthquake.objects.create(usgs_id=usgs_id, time=time, magnitude=magnitude, **{**defaults, **fields})
+
+
+def feature_collection(features):
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FeedSyncTests(TestCase):
+    """Incremental sync of the summary feeds against a stub serving fixture feeds with ETags."""
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.feeds = {}  # feed name: (etag, features)
+
+        self.server = StubServer(self.serve_feed).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        patcher = mock.patch.object(EarthquakeDataService, 'USGS_FEED_URL', self.server.url + '/{feed}.geojson')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve_feed(self, handler):
+        name = handler.path.strip('/').removesuffix('.geojson')
+        if name not in self.feeds:
+            return 404, {}, b''
+        etag, features = self.feeds[name]
+        if handler.headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'ETag': etag, 'Content-Type': 'application/geo+json'}, feature_collection(features)
+
+    def test_first_sync_reads_the_week_feed(self):
+        self.feeds['all_week'] = ('"week-1"', [
+            feature('us001', self.now - timedelta(days=3)),
+            feature('us002', self.now - timedelta(minutes=30)),
+        ])
+
+        summary = EarthquakeDataService.fetch_recent_earthquakes()
+
+        self.assertEqual(summary['stored'], 2)
+        self.assertEqual([path for path, _, _ in self.server.requests], ['/all_week.geojson'])
+        self.assertEqual(
+            sorted(Earthquake.objects.values_list('usgs_id', flat=True)), ['us001', 'us002']
+        )
+
+    def test_unchanged_feed_is_not_modified(self):
+        recent = feature('us002', self.now - timedelta(minutes=30))
+        self.feeds['all_week'] = ('"week-1"', [recent])
+        self.feeds['all_hour'] = ('"hour-1"', [recent])
+        EarthquakeDataService.fetch_recent_earthquakes()
+
+        # A recent sync switches to the hour feed; nothing in it is newer than the high-water mark
+        self.assertIsNone(EarthquakeDataService.fetch_recent_earthquakes())
+        self.assertIsNone(EarthquakeDataService.fetch_recent_earthquakes())
+
+        path, headers, status = self.server.requests[-1]
+        self.assertEqual(path, '/all_hour.geojson')
+        self.assertEqual(headers.get('If-None-Match'), '"hour-1"')
+        self.assertEqual(status, 304)
+        self.assertEqual(Earthquake.objects.count(), 1)
+
+    def test_changed_feed_only_processes_newer_features(self):
+        old = feature('us001', self.now - timedelta(minutes=50))
+        self.feeds['all_week'] = ('"week-1"', [old])
+        EarthquakeDataService.fetch_recent_earthquakes()
+
+        self.feeds['all_hour'] = ('"hour-2"', [old, feature('us003', self.now - timedelta(minutes=5))])
+        summary = EarthquakeDataService.fetch_recent_earthquakes()
+
+        self.assertEqual(summary['total'], 2)
+        self.assertEqual(summary['processed'], 1)
+        self.assertEqual(summary['stored'], 1)
+        self.assertTrue(Earthquake.objects.filter(usgs_id='us003').exists())
+
+    def test_revised_feature_is_processed_but_not_duplicated(self):
+        original = feature('us001', self.now - timedelta(minutes=50))
+        self.feeds['all_week'] = ('"week-1"', [original])
+        EarthquakeDataService.fetch_recent_earthquakes()
+
+        # USGS revised the event (new `updated`, shifted origin time)
+        revised = feature('us001', self.now - timedelta(minutes=49), updated=self.now)
+        self.feeds['all_hour'] = ('"hour-2"', [revised])
+        summary = EarthquakeDataService.fetch_recent_earthquakes()
+
+        self.assertEqual(summary['processed'], 1)
+        self.assertEqual(summary['stored'], 0)
+        self.assertEqual(Earthquake.objects.filter(usgs_id='us001').count(), 1)
+
+    def test_feed_follows_the_time_since_last_sync(self):
+        state = EarthquakeDataService.get_sync_state()
+        self.assertEqual(EarthquakeDataService.select_feed(state), 'all_week')
+
+        for elapsed, feed in (
+            (timedelta(minutes=10), 'all_hour'),
+            (timedelta(hours=2), 'all_day'),
+            (timedelta(days=2), 'all_week'),
+        ):
+            state['last_success'] = (self.now - elapsed).timestamp()
+            self.assertEqual(EarthquakeDataService.select_feed(state), feed)
+
+
+class BackfillCommandTests(TransactionTestCase):
+    """backfill_earthquakes against a stub FDSN event service serving paginated fixtures."""
+    START = datetime(2021, 3, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        # Three events on the first day and two on the second; pages of two
+        self.events = [
+            feature(f"ci{n:03d}", self.START + timedelta(hours=hours), magnitude=3.0 + n / 10)
+            for n, hours in enumerate((2, 9, 20, 30, 40))
+        ]
+        self.failing = set()  # starttimes the stub answers with a 500
+
+        self.server = StubServer(self.serve_query).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        for name, value in (('FDSN_QUERY_URL', self.server.url + '/query'), ('FDSN_PAGE_SIZE', 2)):
+            patcher = mock.patch.object(EarthquakeDataService, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def serve_query(self, handler):
+        params = {key: values[0] for key, values in parse_qs(urlparse(handler.path).query).items()}
+        start = datetime.fromisoformat(params['starttime'])
+        end = datetime.fromisoformat(params['endtime'])
+        if start in self.failing:
+            return 500, {}, b''
+
+        matching = [
+            event for event in self.events
+            if start.timestamp() * 1000 <= event['properties']['time'] < end.timestamp() * 1000
+            and event['properties']['mag'] >= float(params['minmagnitude'])
+        ]
+        if not matching:
+            return 204, {}, b''
+        offset, limit = int(params['offset']), int(params['limit'])
+        return 200, {'Content-Type': 'application/geo+json'}, feature_collection(matching[offset - 1:offset - 1 + limit])
+
+    def backfill(self, *extra):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'backfill_earthquakes', '--start', '2021-03-01', '--end', '2021-03-03',
+            '--slice-days', '1', '--workers', '2', *extra, stdout=stdout, stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def offsets(self):
+        """Sorted (slice start date, offset) of the pages served."""
+        queries = [parse_qs(urlparse(path).query) for path, _, status in self.server.requests if status == 200]
+        return sorted((query['starttime'][0][:10], int(query['offset'][0])) for query in queries)
+
+    def test_backfill_follows_pages_and_checkpoints_slices(self):
+        stdout, _ = self.backfill()
+
+        self.assertEqual(Earthquake.objects.count(), 5)
+        self.assertEqual(BackfillCheckpoint.objects.count(), 2)
+        self.assertEqual(self.offsets(), [('2021-03-01', 1), ('2021-03-01', 3), ('2021-03-02', 1), ('2021-03-02', 3)])
+        self.assertIn('5 events fetched, 5 stored', stdout)
+        self.assertIn('events/sec', stdout)
+
+    def test_rerun_skips_checkpointed_slices(self):
+        self.backfill()
+        requests_before = len(self.server.requests)
+
+        stdout, _ = self.backfill()
+
+        self.assertEqual(len(self.server.requests), requests_before)
+        self.assertIn('Backfilling 0 of 2 slices (2 already checkpointed)', stdout)
+        self.assertEqual(Earthquake.objects.count(), 5)
+
+    def test_failed_slice_is_resumed(self):
+        self.failing.add(self.START + timedelta(days=1))
+        _, stderr = self.backfill()
+
+        self.assertIn('1 slices failed', stderr)
+        self.assertEqual(BackfillCheckpoint.objects.count(), 1)
+        self.assertEqual(Earthquake.objects.count(), 3)
+
+        self.failing.clear()
+        self.server.requests.clear()
+        self.backfill()
+
+        self.assertEqual({start for start, _ in self.offsets()}, {'2021-03-02'})
+        self.assertEqual(Earthquake.objects.count(), 5)
+        self.assertEqual(BackfillCheckpoint.objects.count(), 2)
+
+    def test_overlapping_backfill_does_not_duplicate(self):
+        self.backfill()
+        # A different magnitude threshold is a different checkpoint, so every slice is fetched again
+        stdout, _ = self.backfill('--min-mag', '3.0')
+
+        self.assertIn('5 events fetched, 0 stored', stdout)
+        self.assertEqual(Earthquake.objects.count(), 5)
+
+    def test_backfill_into_a_retired_month_keeps_its_rollups(self):
+        def rolled_up():
+            return sum(DailyRollup.objects.values_list('count', flat=True))
+
+        # March 2021 is long past retention: its rows go, its rollups stay
+        self.backfill('--min-mag', '3.2')
+        EarthquakePartitions.retire_old_data()
+        self.assertEqual((Earthquake.objects.count(), rolled_up()), (0, 3))
+
+        # A lower threshold recreates the month with the two events not seen before
+        stdout, _ = self.backfill()
+        self.assertIn('5 events fetched, 2 stored', stdout)
+        self.assertEqual(rolled_up(), 5)
+
+        EarthquakePartitions.retire_old_data()
+        self.assertEqual((Earthquake.objects.count(), rolled_up()), (0, 5))
+
+
+class RollupRecomputeTests(TestCase):
+    """Rollups rebuilt from detail rows that ingest never rolled up, as retention does for old months."""
+    MONTH = datetime(2021, 3, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        # make_earthquake bypasses ingest, so nothing is rolled up yet
+        make_earthquake('us001', self.MONTH + timedelta(hours=2), 3.2)
+        make_earthquake('us002', self.MONTH + timedelta(hours=2, minutes=30), 3.6)
+        make_earthquake('us003', self.MONTH + timedelta(days=1), 5.1)
+        # On the last row and column of the grid, which grid_cell clamps
+        make_earthquake('us004', self.MONTH + timedelta(days=2), 4.0, latitude=90.0, longitude=180.0)
+        self.end = self.MONTH + timedelta(days=31)
+
+    def test_recompute_fills_missing_rollups(self):
+        self.assertEqual(len(RollupService.diff('day', self.MONTH, self.end)), 3)
+
+        self.assertEqual(RollupService.recompute('day', self.MONTH, self.end), 3)
+        self.assertEqual(RollupService.recompute('hour', self.MONTH, self.end), 3)
+
+        self.assertEqual(RollupService.diff('day', self.MONTH, self.end), [])
+        self.assertEqual(RollupService.diff('hour', self.MONTH, self.end), [])
+        first_day = DailyRollup.objects.get(day=self.MONTH.date())
+        self.assertEqual((first_day.count, first_day.max_magnitude), (2, 3.6))
+        self.assertAlmostEqual(first_day.sum_magnitude, 6.8)
+        self.assertTrue(DailyRollup.objects.filter(cell_row=179, cell_col=359).exists())
+
+        # Idempotent: a second run replaces the rows instead of adding to them
+        RollupService.recompute('day', self.MONTH, self.end)
+        self.assertEqual(sum(DailyRollup.objects.values_list('count', flat=True)), 4)
+
+    def test_retention_rolls_up_a_month_before_dropping_it(self):
+        EarthquakePartitions.roll_up_month(self.MONTH, self.end)
+        self.assertEqual(RollupService.diff('day', self.MONTH, self.end), [])
+
+        EarthquakePartitions.retire_old_data()
+
+        self.assertFalse(Earthquake.objects.exists())
+        self.assertEqual(sum(DailyRollup.objects.values_list('count', flat=True)), 4)
+
+
+class CheckRollupsCommandTests(TestCase):
+    """check_rollups reports rollups that drifted from the detail rows, and --fix rebuilds them."""
+
+    def setUp(self):
+        now = timezone.now()
+        # Stored through ingest, which keeps the rollups up to date
+        EarthquakeDataService.store_earthquakes([
+            {
+                "usgs_id": usgs_id, "magnitude": magnitude, "place": "Testville", "time": now - age,
+                "latitude": 35.7, "longitude": -117.5, "depth": 8.0,
+            }
+            for usgs_id, magnitude, age in (
+                ('us001', 2.1, timedelta(hours=3)), ('us002', 4.4, timedelta(hours=3)), ('us003', 5.3, timedelta(days=2)),
+            )
+        ], broadcast=False)
+
+    def check(self, *extra):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('check_rollups', *extra, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_consistent_rollups(self):
+        stdout, stderr = self.check()
+        self.assertIn('✅ hourly rollups match', stdout)
+        self.assertIn('✅ daily rollups match', stdout)
+        self.assertEqual(stderr, '')
+
+    def test_corrupted_rollups_are_reported_and_fixed(self):
+        corrupted = DailyRollup.objects.get(bucket=bucket_index(5.3))
+        DailyRollup.objects.filter(pk=corrupted.pk).update(count=7)
+        HourlyRollup.objects.filter(bucket=bucket_index(2.1)).delete()
+
+        stderr = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_rollups', stdout=StringIO(), stderr=stderr)
+        self.assertIn('1 hourly buckets differ', stderr.getvalue())
+        self.assertIn('1 daily buckets differ', stderr.getvalue())
+        self.assertIn(f'bucket {bucket_index(5.3)}: (7, ', stderr.getvalue())
+
+        stdout, _ = self.check('--fix')
+        self.assertIn('🔧 Rewrote hourly rollups', stdout)
+        self.assertIn('🔧 Rewrote daily rollups', stdout)
+
+        self.check()
+        self.assertEqual(DailyRollup.objects.get(day=corrupted.day, bucket=corrupted.bucket).count, 1)
+
+
+class RollupQueryTests(TestCase):
+    """/api/rollups/ validates its parameters like /api/earthquakes/."""
+
+    def test_invalid_bbox(self):
+        for bbox in ('1,2,3', '0,10,10,0', '-200,0,10,10', '0,-95,10,10'):
+            response = self.client.get('/api/rollups/', {'bbox': bbox})
+            self.assertEqual(response.status_code, 400, bbox)
+            self.assertIn('bbox must be west,south,east,north', response.json()['error'])
+
+    def test_bbox_across_the_antimeridian(self):
+        EarthquakeDataService.store_earthquakes([{
+            "usgs_id": 'us_fiji', "magnitude": 5.5, "place": "Fiji", "time": timezone.now() - timedelta(hours=1),
+            "latitude": -17.0, "longitude": 179.9, "depth": 10.0,
+        }], broadcast=False)
+
+        response = self.client.get('/api/rollups/', {'bbox': '179,-20,-179,-10', 'group': 'cell'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([cell['count'] for cell in json.loads(response.content)['rollups']], [1])
+
+
+class StatisticsQueryTests(TestCase):
+    """Dashboard statistics for every window come from a single aggregate query."""
+
+    def setUp(self):
+        now = timezone.now()
+        make_earthquake('us001', now - timedelta(minutes=10), 1.5)
+        make_earthquake('us002', now - timedelta(hours=5), 4.7)
+        make_earthquake('us003', now - timedelta(days=3), 3.2)
+        make_earthquake('us004', now - timedelta(days=20), 6.1)
+        make_earthquake('us005', now - timedelta(days=60), 7.0)  # Outside every window
+
+        # Predictions never count
+        run = PredictionRun.objects.create(completed_at=now)
+        make_earthquake('predicted_1', now - timedelta(minutes=5), 8.0, status='predicted', prediction_run=run)
+
+    def test_all_windows_in_one_query(self):
+        with self.assertNumQueries(1):
+            windows = EarthquakeStatsService.compute(('1h', '24h', '7d', '30d'))
+
+        self.assertEqual({window: stats['total'] for window, stats in windows.items()}, {
+            '1h': 1, '24h': 2, '7d': 3, '30d': 4,
+        })
+        self.assertEqual(windows['24h']['highest_magnitude'], 4.7)
+        self.assertEqual(windows['24h']['avg_magnitude'], 3.1)
+        self.assertEqual(windows['24h']['active_alerts'], 1)
+        self.assertEqual(windows['30d']['magnitude_histogram'], {
+            '<2': 1, '2-3': 0, '3-4': 1, '4-5': 1, '5-6': 0, '6-7': 1, '7+': 0,
+        })
+        self.assertEqual(windows['7d']['status_counts']['predicted'], 0)
+
+    def test_empty_window(self):
+        Earthquake.objects.all().delete()
+        with self.assertNumQueries(1):
+            stats = EarthquakeStatsService.compute(('1h',))['1h']
+
+        self.assertEqual((stats['total'], stats['avg_magnitude'], stats['highest_magnitude']), (0, 0, 0))
+
+    def test_dashboard_statistics_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = DashboardDataService.build_statistics()
+
+        self.assertEqual(stats['total_24h'], 2)
+        self.assertEqual(set(stats['windows']), set(DashboardDataService.STATS_WINDOWS))
+
+
+class ExplainQueriesTests(TestCase):
+    """explain_queries checks the app's own querysets, and each of them runs."""
+
+    def test_canonical_queries_run(self):
+        make_earthquake('us001', timezone.now() - timedelta(hours=1), 4.8)
+        for name, queryset in explain_queries.canonical_queries():
+            with self.subTest(name):
+                list(queryset)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ReplayTests(SimpleTestCase):
+    """
+    Catch-up replay over the in-memory channel layer, with disconnects
+    simulated by closing one socket and opening another. The replay buffer
+    lives in Redis, under test-only keys.
+    """
+    SEQUENCE_KEY = 'test_earthquake_broadcast_seq'
+    STREAM_KEY = 'test_earthquake_broadcast_stream'
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.delete(self.SEQUENCE_KEY, self.STREAM_KEY)
+        self.addCleanup(self.redis.delete, self.SEQUENCE_KEY, self.STREAM_KEY)
+        for name in ('SEQUENCE_KEY', 'STREAM_KEY'):
+            patcher = mock.patch.object(BroadcastLog, name, getattr(self, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.next_id = 0
+
+    def earthquakes(self, count):
+        now = timezone.now()
+        batch = []
+        for _ in range(count):
+            self.next_id += 1
+            batch.append({
+                "latitude": 35.7, "longitude": -117.5, "magnitude": 3.0, "depth": 8.0,
+                "place": "Testville", "time": now.isoformat(), "status": "warning", "id": self.next_id,
+            })
+        return batch
+
+    async def broadcast(self, count):
+        # Runs the real ingest broadcast: sequence numbers, replay buffer, group sends
+        await sync_to_async(EarthquakeDataService.broadcast_earthquakes)(self.earthquakes(count))
+
+    async def connect(self, query=''):
+        communicator = WebsocketCommunicator(EarthquakeConsumer.as_asgi(), f"/ws/earthquakes/{query}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_reconnect_replays_missed_events(self):
+        first = await self.connect()
+        baseline = await first.receive_json_from()
+        self.assertEqual(baseline['type'], 'sequence')
+
+        await self.broadcast(2)
+        live = await first.receive_json_from()
+        self.assertEqual([quake['seq'] for quake in live['earthquakes']], [baseline['seq'] + 1, baseline['seq'] + 2])
+        await first.disconnect()
+
+        await self.broadcast(3)  # Missed while disconnected
+
+        second = await self.connect(f"?resume_from={live['earthquakes'][-1]['seq']}")
+        replay = await second.receive_json_from()
+        self.assertTrue(replay['replay'])
+        self.assertEqual([quake['id'] for quake in replay['earthquakes']], [3, 4, 5])
+
+        # Live updates continue after the replay
+        await self.broadcast(1)
+        live = await second.receive_json_from()
+        self.assertEqual([quake['id'] for quake in live['earthquakes']], [6])
+        self.assertTrue(await second.receive_nothing())
+        await second.disconnect()
+
+    async def test_up_to_date_client_gets_nothing(self):
+        await self.broadcast(2)
+        communicator = await self.connect(f"?resume_from={await sync_to_async(BroadcastLog.current)()}")
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_events_evicted_from_the_buffer_force_a_resync(self):
+        await self.broadcast(3)
+        current = await sync_to_async(BroadcastLog.current)()
+        await sync_to_async(self.redis.delete)(self.STREAM_KEY)
+
+        communicator = await self.connect(f"?resume_from={current - 3}")
+        message = await communicator.receive_json_from()
+        self.assertEqual(message, {'type': 'resync', 'seq': current})
+        await communicator.disconnect()
+
+    async def test_client_ahead_of_a_reset_counter_resyncs(self):
+        await self.broadcast(5)
+        await sync_to_async(self.redis.delete)(self.SEQUENCE_KEY)  # Counter evicted or reset
+        await self.broadcast(1)
+
+        communicator = await self.connect('?resume_from=5')
+        message = await communicator.receive_json_from()
+        self.assertEqual(message, {'type': 'resync', 'seq': 1})
+
+        # The stream was restarted under the new numbering, and live updates still arrive
+        await self.broadcast(1)
+        live = await communicator.receive_json_from()
+        self.assertEqual([quake['seq'] for quake in live['earthquakes']], [2])
+        await communicator.disconnect()
+
+    async def test_invalid_resume_from_is_rejected(self):
+        communicator = await self.connect('?resume_from=soon')
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'error')
+        await communicator.disconnect()
+
+
+@skipUnless(find_spec('tensorflow') and find_spec('sklearn'), "TensorFlow and scikit-learn build the reference")
+class InferenceBackendParityTests(SimpleTestCase):
+    """
+    Every lightweight backend matches the Keras model on the shipped
+    weights, one forward pass and a full forecast rollout. Artifacts are
+    exported into a temporary directory, never next to the model.
+    """
+    ARTIFACTS = ('ONNX_MODEL_PATH', 'TFLITE_MODEL_PATH', 'NUMPY_WEIGHTS_PATH', 'SCALER_AFFINE_PATH')
+    STEP_TOLERANCE = 1e-4
+    ROLLOUT_TOLERANCE = 1e-3
+    REGIONS = 8
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory)
+        paths = {name: os.path.join(directory, os.path.basename(getattr(predictions, name))) for name in cls.ARTIFACTS}
+        for module in (predictions, export_lstm_model):
+            patcher = mock.patch.multiple(module, **paths)
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
+
+        formats = ['numpy', 'tflite'] + (['onnx'] if find_spec('tf2onnx') else [])
+        call_command('export_lstm_model', *[f"--format={name}" for name in formats], stdout=StringIO())
+
+        cls.reference = TensorFlowBackend()
+        cls.reference.load()
+        cls.windows = np.random.default_rng(0).random((cls.REGIONS, WINDOW_SIZE, len(FEATURES)), dtype=np.float32)
+        cls.expected_step = cls.reference.predict(cls.windows)
+        cls.expected_rollout = cls.reference.rollout(FORECAST_DAYS)(cls.windows)
+
+    def assert_parity(self, name):
+        backend = BACKENDS[name]()
+        backend.load()
+
+        step = backend.predict(self.windows)
+        self.assertEqual(step.shape, self.expected_step.shape)
+        self.assertLess(np.abs(step - self.expected_step).max(), self.STEP_TOLERANCE)
+
+        rollout = backend.rollout(FORECAST_DAYS)(self.windows)
+        self.assertEqual(rollout.shape, self.expected_rollout.shape)
+        self.assertLess(np.abs(rollout - self.expected_rollout).max(), self.ROLLOUT_TOLERANCE)
+
+        for actual, expected in zip(backend.scaler_affine(), self.reference.scaler_affine()):
+            np.testing.assert_allclose(actual, expected, atol=self.STEP_TOLERANCE)
+
+    def test_numpy_backend(self):
+        self.assert_parity('numpy')
+
+    @skipUnless(find_spec('tf2onnx') and find_spec('onnxruntime'), "needs tf2onnx and onnxruntime")
+    def test_onnx_backend(self):
+        self.assert_parity('onnx')
+
+    def test_tflite_backend(self):
+        self.assert_parity('tflite')
+
+    def test_ring_buffer_rollouts_agree(self):
+        # Longer than the window, so both ring buffers wrap around
+        steps = WINDOW_SIZE + 5
+        compiled = build_rollout(self.reference.model, steps)(self.windows).numpy()
+        looped = numpy_rollout(self.reference.predict, self.windows, steps)
+        self.assertLess(np.abs(compiled - looped).max(), self.ROLLOUT_TOLERANCE)
+
+    def test_rollout_feeds_predictions_back(self):
+        rollout = numpy_rollout(self.reference.predict, self.windows, 2)
+        # The second step sees the first prediction as the newest row of its window
+        # (a model without a depth output carries the last depth forward)
+        newest = self.windows[:, -1:].copy()
+        newest[:, :, :rollout.shape[-1]] = rollout[:, :1]
+        shifted = np.concatenate([self.windows[:, 1:], newest], axis=1)
+        self.assertLess(np.abs(rollout[:, 1] - self.reference.predict(shifted)).max(), self.STEP_TOLERANCE)
+
+
+class PredictionRunSwapTests(TransactionTestCase):
+    """
+    Readers hammering /api/predictions/ while new runs are written and
+    published never see an empty or partial set. The model is replaced by
+    a persistence forecast, so only the storage path is exercised, and the
+    response cache is bypassed so every request reads the database.
+    """
+    READERS = 4
+    RUNS = 5
+
+    def setUp(self):
+        now = timezone.now()
+        Earthquake.objects.bulk_create([
+            Earthquake(
+                usgs_id=f"us{n:03d}", time=now - timedelta(hours=n), magnitude=2.5 + n % 3,
+                place="Testville", latitude=35.7, longitude=-117.5, depth=8.0, status='safe',
+            )
+            for n in range(WINDOW_SIZE + 10)
+        ])
+
+        patches = [
+            mock.patch.object(LSTMModelRegistry, 'get', return_value=SimpleNamespace(name='test')),
+            mock.patch.object(LSTMModelRegistry, 'get_scaler_affine', return_value=(np.ones(4), np.zeros(4))),
+            mock.patch.object(
+                LSTMModelRegistry, 'get_rollout',
+                side_effect=lambda steps: lambda windows: np.repeat(windows[:, -1:], steps, axis=1),
+            ),
+            mock.patch.object(ReverseGeocoder, 'places', side_effect=lambda coordinates: ["Testville"] * len(coordinates)),
+            mock.patch.object(DashboardCache, 'get_or_compute', side_effect=lambda name, compute, timeout=None: compute()),
+            mock.patch.object(DashboardCache, 'bump'),
+            mock.patch.object(EarthquakePredictionService, 'request_purge'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_publishes_a_run(self):
+        stored = EarthquakePredictionService.predict_future_earthquakes()
+
+        run = PredictionRun.active()
+        self.assertIsNotNone(run)
+        self.assertEqual((run.backend, run.regions), ('test', 2))
+        self.assertEqual(run.prediction_count, stored)
+        self.assertEqual(run.predictions.count(), stored)
+        self.assertEqual(stored, 2 * FORECAST_DAYS)
+        self.assertEqual(set(run.predictions.values_list('status', flat=True)), {'predicted'})
+
+    def test_failed_publish_is_logged(self):
+        with mock.patch.object(Earthquake.objects, 'bulk_create', side_effect=RuntimeError("disk full")):
+            with self.assertLogs('earthquake_app.predictions', 'ERROR') as logs:
+                self.assertEqual(EarthquakePredictionService.predict_future_earthquakes(), 0)
+
+        self.assertIn("disk full", logs.output[0])
+        self.assertIsNone(PredictionRun.active())
+
+    def test_readers_never_see_an_empty_run(self):
+        expected = EarthquakePredictionService.predict_future_earthquakes()
+        # The events fill one grid cell besides the global window; the API serves the global forecast by default
+        served = Earthquake.objects.filter(prediction_run=PredictionRun.active(), region=GLOBAL_REGION).count()
+        self.assertGreater(served, 0)
+        self.assertLess(served, expected)
+
+        stop = threading.Event()
+        sizes, errors = [], []
+
+        def read():
+            client = Client()
+            try:
+                while not stop.is_set():
+                    response = client.get('/api/predictions/')
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+                        continue
+                    sizes.append(len(json.loads(response.content)['predictions']))
+            finally:
+                connections.close_all()
+
+        readers = [threading.Thread(target=read) for _ in range(self.READERS)]
+        for reader in readers:
+            reader.start()
+        try:
+            for _ in range(self.RUNS):
+                self.assertEqual(EarthquakePredictionService.predict_future_earthquakes(), expected)
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(sizes)
+        self.assertEqual(set(sizes), {served})
+
+        # Superseded runs are garbage-collected down to the ones readers may still be on
+        EarthquakePredictionService.purge_old_runs()
+        self.assertEqual(PredictionRun.objects.count(), EarthquakePredictionService.RUNS_KEPT)
+        self.assertEqual(
+            Earthquake.objects.filter(prediction_run__isnull=False).count(),
+            expected * EarthquakePredictionService.RUNS_KEPT,
+        )
+
+
+
+class RecordingSink(AlertSink):
+    """Records the alert ids of each batch it accepts; raises `errors` in turn first."""
+    name = 'recorder'
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def send(self, alerts):
+        with self.lock:
+            self.calls += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            self.batches.append([alert['id'] for alert in alerts])
+
+    def received(self):
+        return sorted(alert_id for batch in self.batches for alert_id in batch)
+
+
+class AlertDispatchTests(TransactionTestCase):
+    """AlertDispatcher against in-process sinks: concurrent claiming, retries and dead-lettering."""
+    EVENTS = 45
+    WORKERS = 4
+
+    def setUp(self):
+        now = timezone.now()
+        self.ids = sorted(
+            make_earthquake(f"us{n:03d}", now - timedelta(minutes=n), 5.0).id for n in range(self.EVENTS)
+        )
+        make_earthquake('us_small', now, 3.0)  # Below the alert threshold
+        for name, value in (('BATCH_SIZE', 10), ('BACKOFF', 0)):
+            patcher = mock.patch.object(AlertDispatcher, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_sinks(self, **sinks):
+        patcher = mock.patch.object(AlertDispatcher, '_sinks', sinks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_dispatchers_send_every_alert_once(self):
+        sink = RecordingSink()
+        self.use_sinks(recorder=sink)
+
+        def dispatch():
+            try:
+                while AlertDispatcher.dispatch() or AlertDispatcher.pending().exists():
+                    pass
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=dispatch) for _ in range(self.WORKERS)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sink.received(), self.ids)
+        self.assertFalse(Earthquake.objects.filter(id__in=self.ids, is_alert_sent=False).exists())
+        self.assertFalse(Earthquake.objects.get(usgs_id='us_small').is_alert_sent)
+        self.assertEqual(
+            set(AlertDelivery.objects.values_list('status', flat=True)), {AlertDelivery.SENT}
+        )
+
+    def test_transient_error_is_retried_in_process(self):
+        sink = RecordingSink(DeliveryError("Webhook returned 503"))
+        self.use_sinks(recorder=sink)
+
+        self.assertEqual(AlertDispatcher.dispatch(), self.EVENTS)
+        self.assertEqual(sink.received(), self.ids)
+        self.assertEqual(AlertDelivery.objects.filter(status=AlertDelivery.SENT).count(), self.EVENTS)
+
+    def test_retryable_error_reschedules_the_batch(self):
+        errors = [DeliveryError("Webhook returned 503")] * AlertDispatcher.MAX_ATTEMPTS
+        sink = RecordingSink(*errors)
+        self.use_sinks(recorder=sink, other=RecordingSink())
+
+        started = timezone.now()
+        AlertDispatcher.dispatch(max_batches=1)
+
+        # The failing sink gave up on its first batch; the other sink was not held back
+        self.assertEqual(sink.calls, AlertDispatcher.MAX_ATTEMPTS)
+        self.assertEqual(AlertDelivery.objects.filter(sink='other', status=AlertDelivery.SENT).count(), 10)
+        failed = AlertDelivery.objects.filter(sink='recorder', attempts=1)
+        self.assertEqual(failed.count(), 10)
+        for delivery in failed:
+            self.assertEqual(delivery.status, AlertDelivery.PENDING)
+            self.assertEqual(delivery.last_error, "Webhook returned 503")
+            self.assertGreaterEqual(delivery.next_attempt_at, started + AlertDispatcher.RETRY_DELAY)
+
+        # Once due again, the batch goes through
+        failed.update(next_attempt_at=timezone.now())
+        AlertDispatcher.dispatch()
+        self.assertEqual(sink.received(), self.ids)
+
+    def test_non_retryable_error_dead_letters_the_batch(self):
+        sink = RecordingSink(DeliveryError("Webhook rejected the batch with 400", retryable=False))
+        self.use_sinks(recorder=sink)
+
+        AlertDispatcher.dispatch(max_batches=1)
+
+        self.assertEqual(sink.calls, 1)
+        self.assertEqual(AlertDelivery.objects.filter(status=AlertDelivery.DEAD).count(), 10)
+        self.assertFalse(AlertDelivery.objects.filter(status=AlertDelivery.SENT).exists())
+
+        # Dead letters are never retried; the next batches still go out
+        AlertDispatcher.dispatch()
+        self.assertEqual(len(sink.received()), self.EVENTS - 10)
+        self.assertEqual(AlertDelivery.objects.filter(status=AlertDelivery.DEAD).count(), 10)
+
+
+
+class EarthquakeIndexTests(TestCase):
+    """Every insert maintains each index, so none may be duplicated."""
+
+    def test_one_pattern_index_on_usgs_id(self):
+        if connections['default'].vendor != 'postgresql':
+            self.skipTest("PostgreSQL only")
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexdef LIKE %s",
+                [Earthquake._meta.db_table, '%(usgs_id varchar_pattern_ops)%'],
+            )
+            self.assertEqual([name for (name,) in cursor.fetchall()], ['earthquake_usgs_id_like_idx'])
+
+
+class SpatialQueryTests(TestCase):
+    """Geohash covers and the bbox/radius filters built on them, including the antimeridian and the poles."""
+
+    def place(self, usgs_id, latitude, longitude):
+        return Earthquake.objects.create(
+            usgs_id=usgs_id, time=timezone.now(), magnitude=3.0, place="Testville",
+            latitude=latitude, longitude=longitude, depth=8.0,
+        )
+
+    def assert_covers(self, box, steps=40):
+        """Every point of a grid over the box, edges included, falls in one of its cover's cells."""
+        cells = geohash_cover(*box)
+        west, south, east, north = box
+        width = east - west if west <= east else east - west + 360
+        for i in range(steps + 1):
+            for j in range(steps + 1):
+                latitude = south + (north - south) * i / steps
+                longitude = (west + width * j / steps + 180) % 360 - 180 if j < steps else east
+                geohash = geohash_encode(latitude, longitude)
+                self.assertTrue(
+                    any(geohash.startswith(cell) for cell in cells), f"{latitude}, {longitude} is not covered"
+                )
+        return cells
+
+    def test_cover_of_a_box(self):
+        cells = self.assert_covers((-118.5, 33.5, -117.5, 34.5))
+        self.assertLessEqual(len(cells), 32)
+        self.assertGreater(len(cells[0]), 2)
+
+    def test_cover_across_the_antimeridian(self):
+        cells = self.assert_covers((170.0, -20.0, -170.0, 0.0))
+        self.assertFalse(any(geohash_encode(-10.0, 0.0).startswith(cell) for cell in cells))
+
+    def test_cover_of_a_polar_cap(self):
+        self.assert_covers((-180.0, 80.0, 180.0, 90.0))
+        self.assert_covers((-180.0, -90.0, 180.0, -85.0))
+
+    def test_whole_world_cover_is_every_top_level_cell(self):
+        self.assertEqual(geohash_cover(-180.0, -90.0, 180.0, 90.0), sorted(GEOHASH_ALPHABET))
+
+    def test_bbox_across_the_antimeridian(self):
+        east = self.place('us_east', -10.0, 179.5)
+        west = self.place('us_west', -10.0, -179.5)
+        self.place('us_outside', -10.0, 160.0)
+        self.place('us_north', 5.0, 179.5)
+
+        found = within_bbox(Earthquake.objects.all(), 170.0, -20.0, -170.0, 0.0)
+        self.assertEqual(set(found.values_list('id', flat=True)), {east.id, west.id})
+
+    def test_whole_world_bbox(self):
+        self.place('us_a', 89.9, -179.9)
+        self.place('us_b', -89.9, 179.9)
+        self.assertEqual(within_bbox(Earthquake.objects.all(), -180.0, -90.0, 180.0, 90.0).count(), 2)
+
+    def test_radius_post_filters_the_bounding_box(self):
+        center = (34.0, -118.0)
+        near = self.place('us_near', 34.5, -118.0)
+        # Inside the circle's bounding box, but past its edge
+        self.place('us_corner', 34.8, -117.1)
+        self.place('us_far', 40.0, -100.0)
+        self.assertGreater(haversine_km(*center, 34.8, -117.1), 100)
+
+        found = within_radius(Earthquake.objects.all(), *center, 100)
+        self.assertEqual([quake.id for quake in found], [near.id])
+        self.assertAlmostEqual(found[0].distance_km, haversine_km(*center, 34.5, -118.0), places=3)
+
+    def test_radius_across_the_antimeridian(self):
+        across = self.place('us_across', 0.0, -179.5)
+        self.place('us_beyond', 0.0, 177.0)
+
+        found = within_radius(Earthquake.objects.all(), 0.0, 179.5, 200)
+        self.assertEqual([quake.id for quake in found], [across.id])
+
+    def test_radius_over_a_pole(self):
+        # One degree from the centre across the pole, 180 degrees of longitude away
+        over = self.place('us_over', 89.5, 180.0)
+        self.place('us_south', 87.0, 0.0)
+
+        found = within_radius(Earthquake.objects.all(), 89.5, 0.0, 200)
+        self.assertEqual([quake.id for quake in found], [over.id])
+
+    def test_seeded_geohashes_match_geohash_encode(self):
+        # The benchmarks seed in SQL; their rows must be reachable through the geohash index
+        seed_earthquakes(200, 1)
+        for quake in Earthquake.objects.all():
+            self.assertEqual(quake.geohash, geohash_encode(quake.latitude, quake.longitude))
+
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ResponseCacheTests(SimpleTestCase):
+    """Encoding negotiation, ETags and 304s of the pre-encoded response cache."""
+    PAYLOAD = {"earthquakes": [{"id": 1, "place": "Testville", "magnitude": 4.2}] * 50}
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.PAYLOAD
+
+    def get(self, **headers):
+        request = RequestFactory().get('/api/dashboard-data/', **headers)
+        return cached_json_response(request, 'test_response', self.build)
+
+    def test_identity_without_accept_encoding(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(json.loads(response.content), self.PAYLOAD)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def test_gzip_variant(self):
+        identity = self.get()
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), identity.content)
+        self.assertNotEqual(response['ETag'], identity['ETag'])
+        self.assertEqual(self.builds, 1)
+
+    @skipUnless(find_spec('brotli'), "needs brotli")
+    def test_brotli_is_preferred(self):
+        import brotli
+
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content)), self.PAYLOAD)
+
+    def test_refused_encoding_is_not_served(self):
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            response = self.get(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_etag_of_another_encoding_gets_the_bytes(self):
+        gzip_etag = self.get(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=gzip_etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(json.loads(response.content), self.PAYLOAD)
+
+    def test_new_data_version_changes_the_etag(self):
+        etag = self.get()['ETag']
+        self.PAYLOAD = {"earthquakes": []}
+        DashboardCache.bump()
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.builds, 2)
+
+    def test_closing_a_stream_closes_its_rows(self):
+        closed = []
+
+        def rows():
+            try:
+                for n in range(100):
+                    yield {"id": n}, None
+                yield None, None
+            finally:
+                closed.append(True)
+
+        request = RequestFactory().get('/api/earthquakes/')
+        with mock.patch.object(responses, 'STREAM_CHUNK_SIZE', 64):
+            response = responses.streamed_page_response(request, 'earthquakes', rows, '"tag"')
+            next(iter(response))
+            # As a WSGI server does when the client goes away mid-stream
+            response.close()
+
+        self.assertEqual(closed, [True])
+
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DashboardCacheTimeoutTests(TestCase):
+    """Entries over windows relative to now expire after WINDOW_TIMEOUT; the rest only move with the version."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(cache, 'set_many', wraps=cache.set_many)
+        self.set_many = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def timeouts(self):
+        """{entry name: timeout} of the entries written so far."""
+        return {
+            key[:-len(':latest')]: timeout
+            for mapping, timeout in (call.args for call in self.set_many.call_args_list)
+            for key in mapping if key.endswith(':latest')
+        }
+
+    def test_warm_cache(self):
+        DashboardDataService.warm_cache()
+        self.assertEqual(self.timeouts(), {
+            'earthquake_data': DashboardCache.TIMEOUT,
+            'earthquake_stats': DashboardCache.WINDOW_TIMEOUT,
+            'dashboard_response': DashboardCache.WINDOW_TIMEOUT,
+        })
+
+    def test_predictions_depend_on_the_version_alone(self):
+        self.client.get('/api/predictions/')
+        self.assertEqual(self.timeouts(), {f'predictions_response:{GLOBAL_REGION}': DashboardCache.TIMEOUT})
+
+    def test_rollups_ending_now_expire_sooner(self):
+        self.client.get('/api/rollups/', {'granularity': 'day'})
+        self.assertEqual(list(self.timeouts().values()), [DashboardCache.WINDOW_TIMEOUT])
+
+        self.set_many.reset_mock()
+        self.client.get('/api/rollups/', {'start': '2026-01-01T00:00:00', 'end': '2026-01-08T00:00:00'})
+        self.assertEqual(list(self.timeouts().values()), [DashboardCache.TIMEOUT])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class EarthquakeQueryTests(TestCase):
+    """/api/earthquakes/: filters, keyset pagination over (-time, -id) and the streamed body."""
+
+    def setUp(self):
+        self.now = timezone.now().replace(microsecond=0)
+        self.tied = self.now - timedelta(hours=1)
+        # Five events share one origin time: only the id orders them
+        for n in range(5):
+            make_earthquake(f'us_tie{n}', self.tied, 3.0 + n * 0.5)
+        make_earthquake('us_latest', self.now - timedelta(minutes=1), 2.0, depth=40.0)
+        make_earthquake('us_fiji', self.now - timedelta(hours=2), 5.5, latitude=-17.0, longitude=179.9)
+        make_earthquake('us_old', self.now - timedelta(days=3), 4.0)
+
+        run = PredictionRun.objects.create(completed_at=self.now)
+        make_earthquake('predicted_1', self.tied, 6.0, status='predicted', prediction_run=run)
+
+    def fetch(self, **params):
+        response = self.client.get('/api/earthquakes/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def usgs_ids(self, **params):
+        return [row['usgs_id'] for row in self.fetch(**params)['earthquakes']]
+
+    def test_pages_follow_time_then_id_across_equal_times(self):
+        expected = list(
+            Earthquake.objects.filter(prediction_run__isnull=True)
+            .order_by('-time', '-id').values_list('usgs_id', flat=True)
+        )
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = self.fetch(limit=2, fields='usgs_id', **({'cursor': cursor} if cursor else {}))
+            seen += [row['usgs_id'] for row in page['earthquakes']]
+            pages += 1
+            cursor = page['next']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 4)
+        # The page boundaries fall between events with the same time
+        tied = Earthquake.objects.filter(time=self.tied, prediction_run__isnull=True).order_by('-id')
+        self.assertEqual(EarthquakeQuery.decode_cursor(self.fetch(limit=3)['next']), (self.tied, tied[1].id))
+
+    def test_last_page_has_no_cursor(self):
+        self.assertIsNone(self.fetch(limit=8)['next'])
+        self.assertIsNotNone(self.fetch(limit=7)['next'])
+
+    def test_page_size(self):
+        self.assertEqual(len(self.fetch()['earthquakes']), 8)
+
+        with mock.patch.object(EarthquakeQuery, 'MAX_PAGE_SIZE', 3):
+            self.assertEqual(len(self.fetch(limit=3)['earthquakes']), 3)
+            response = self.client.get('/api/earthquakes/', {'limit': 4})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': "limit must be between 1 and 3"})
+
+    def test_filters_combine(self):
+        self.assertEqual(self.usgs_ids(min_magnitude=4.0, max_magnitude=5.0), ['us_tie4', 'us_tie3', 'us_tie2', 'us_old'])
+        self.assertEqual(self.usgs_ids(min_depth=20), ['us_latest'])
+        self.assertEqual(self.usgs_ids(status='alert,safe'), ['us_latest', 'us_tie4', 'us_fiji'])
+        self.assertEqual(
+            self.usgs_ids(start=(self.now - timedelta(days=1)).isoformat(), end=self.tied.isoformat(), status='alert'),
+            ['us_fiji'],
+        )
+        # Across the antimeridian, then by radius around a point near it
+        self.assertEqual(self.usgs_ids(bbox='179,-20,-179,-10'), ['us_fiji'])
+        self.assertEqual(self.usgs_ids(near='-179.9,-17', radius_km=100), ['us_fiji'])
+        self.assertEqual(self.usgs_ids(near='-117.5,35.7', radius_km=10, min_magnitude=4.5, max_depth=10), ['us_tie4', 'us_tie3'])
+
+    def test_fields_projection(self):
+        rows = self.fetch(fields='usgs_id,magnitude', limit=1)['earthquakes']
+        self.assertEqual(rows, [{'usgs_id': 'us_latest', 'magnitude': 2.0}])
+
+    def test_invalid_parameters(self):
+        for params in (
+            {'cursor': 'not-a-cursor'},
+            {'cursor': base64.urlsafe_b64encode(b'2024-01-01T00:00:00|x').decode()},
+            {'cursor': base64.urlsafe_b64encode(b'\xff\xfe').decode()},
+            {'limit': 'ten'},
+            {'limit': 0},
+            {'start': 'yesterday'},
+            {'min_magnitude': 'big'},
+            {'status': 'alert,unknown'},
+            {'bbox': '1,2,3'},
+            {'bbox': '0,10,10,0'},
+            {'near': '0,0'},
+            {'near': '0,0', 'radius_km': 6000},
+            {'near': '200,0', 'radius_km': 10},
+            {'fields': 'usgs_id,secret'},
+        ):
+            response = self.client.get('/api/earthquakes/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_streamed_body(self):
+        with mock.patch.object(responses, 'STREAM_CHUNK_SIZE', 64):
+            response = self.client.get('/api/earthquakes/', {'limit': 6})
+            chunks = list(response.streaming_content)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertGreater(len(chunks), 1)
+        body = json.loads(b''.join(chunks))
+        self.assertEqual(list(body), ['earthquakes', 'next'])
+        self.assertEqual(len(body['earthquakes']), 6)
+        self.assertEqual(set(body['earthquakes'][0]), set(EarthquakeQuery.FIELDS))
+
+    def test_unchanged_page_is_not_modified(self):
+        first = self.client.get('/api/earthquakes/', {'limit': 2})
+        etag = first['ETag']
+        b''.join(first.streaming_content)
+
+        # The 304 is decided before the rows are asked for, so no query runs
+        with mock.patch.object(EarthquakeQuery, 'rows') as rows, self.assertNumQueries(0):
+            response = self.client.get('/api/earthquakes/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        rows.assert_not_called()
+
+        # Other parameters, or new data, are another page
+        self.assertNotEqual(self.client.get('/api/earthquakes/', {'limit': 3})['ETag'], etag)
+        DashboardCache.bump()
+        response = self.client.get('/api/earthquakes/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_empty_result(self):
+        self.assertEqual(self.fetch(min_magnitude=9), {'earthquakes': [], 'next': None})
+
+
+def rule(rule_id, min_magnitude=0.0, **area):
+    """An unsaved AlertRule, as RuleIndex gets them compiled."""
+    return AlertRule(id=rule_id, name=f"rule {rule_id}", min_magnitude=min_magnitude, **area)
+
+
+def event(event_id, latitude, longitude, magnitude=5.0, depth=10.0):
+    return Earthquake(id=event_id, latitude=latitude, longitude=longitude, magnitude=magnitude, depth=depth)
+
+
+class RuleIndexTests(SimpleTestCase):
+    """RuleIndex finds exactly the rules the brute-force loop over every rule finds."""
+
+    def assert_same_as_brute_force(self, rules, events):
+        compiled = [CompiledRule(r) for r in rules]
+        index = RuleIndex(compiled)
+        for quake in events:
+            expected = sorted(
+                r.id for r in compiled
+                if quake.magnitude >= r.min_magnitude and r.matches(quake.latitude, quake.longitude, quake.depth)
+            )
+            self.assertEqual(
+                sorted(r.id for r in index.match(quake)), expected,
+                f"M{quake.magnitude} at {quake.latitude}, {quake.longitude}, {quake.depth} km",
+            )
+
+    def matched(self, rules, quake):
+        return sorted(r.id for r in RuleIndex([CompiledRule(r) for r in rules]).match(quake))
+
+    def test_bbox_edges_on_cell_boundaries(self):
+        # Every edge lies on a RuleIndex cell boundary, where grid_cell moves to the next cell
+        edges = rule(1, west=10.0, south=0.0, east=15.0, north=5.0)
+        for latitude, longitude in ((0.0, 10.0), (5.0, 15.0), (0.0, 15.0), (5.0, 10.0), (2.5, 12.5)):
+            self.assertEqual(self.matched([edges], event(1, latitude, longitude)), [1])
+        for latitude, longitude in ((5.0001, 12.0), (-0.0001, 12.0), (2.0, 9.9999), (2.0, 15.0001)):
+            self.assertEqual(self.matched([edges], event(1, latitude, longitude)), [])
+
+    def test_bbox_across_the_antimeridian(self):
+        pacific = rule(1, west=175.0, south=-20.0, east=-175.0, north=-10.0)
+        for longitude in (175.0, 179.99, 180.0, -180.0, -179.99, -175.0):
+            self.assertEqual(self.matched([pacific], event(1, -15.0, longitude)), [1], longitude)
+        for longitude in (174.9, -174.9, 0.0):
+            self.assertEqual(self.matched([pacific], event(1, -15.0, longitude)), [], longitude)
+
+    def test_site_across_the_antimeridian_and_over_a_pole(self):
+        fiji = rule(1, site_latitude=-17.0, site_longitude=179.9, radius_km=100)
+        north_pole = rule(2, site_latitude=89.5, site_longitude=0.0, radius_km=200)
+
+        self.assertEqual(self.matched([fiji, north_pole], event(1, -17.0, -179.5)), [1])
+        self.assertEqual(self.matched([fiji, north_pole], event(2, 89.5, 180.0)), [2])
+        self.assertEqual(self.matched([fiji, north_pole], event(3, -17.0, 178.0)), [])
+
+    def test_magnitude_thresholds_are_inclusive(self):
+        rules = [rule(n, min_magnitude) for n, min_magnitude in enumerate((2.5, 4.5, 4.5, 6.0), start=1)]
+        self.assertEqual(self.matched(rules, event(1, 0, 0, magnitude=4.5)), [1, 2, 3])
+        self.assertEqual(self.matched(rules, event(1, 0, 0, magnitude=4.49)), [1])
+        self.assertEqual(self.matched(rules, event(1, 0, 0, magnitude=2.4)), [])
+
+    def test_depth_band(self):
+        shallow = rule(1, min_depth=0.0, max_depth=70.0)
+        self.assertEqual(self.matched([shallow], event(1, 0, 0, depth=70.0)), [1])
+        self.assertEqual(self.matched([shallow], event(1, 0, 0, depth=70.1)), [])
+
+    def test_random_rules_on_cell_edges(self):
+        # Coordinates and thresholds snapped to cell edges and magnitude steps, where off-by-ones live
+        rng = random.Random(0)
+        edges = [-180.0, -175.0, -5.0, 0.0, 5.0, 175.0, 180.0]
+        rules = []
+        for n in range(1, 301):
+            min_magnitude = rng.choice((0.0, 2.5, 4.5, 5.0))
+            kind = n % 3
+            if kind == 0:
+                west, east = rng.choice(edges), rng.choice(edges)
+                south = rng.choice((-90.0, -10.0, 0.0, 5.0))
+                rules.append(rule(n, min_magnitude, west=west, south=south, east=east, north=min(south + 10, 90.0)))
+            elif kind == 1:
+                rules.append(rule(
+                    n, min_magnitude, site_latitude=rng.choice((-89.0, -5.0, 0.0, 5.0, 89.0)),
+                    site_longitude=rng.choice(edges), radius_km=rng.choice((50, 500, 2000)),
+                ))
+            else:
+                rules.append(rule(n, min_magnitude, min_depth=0.0, max_depth=rng.choice((10.0, 100.0))))
+
+        events = [
+            event(
+                n, rng.choice((-90.0, -10.0, -5.0, 0.0, 5.0, 10.0, 90.0, rng.uniform(-90, 90))),
+                rng.choice(edges + [rng.uniform(-180, 180)]),
+                magnitude=rng.choice((2.5, 4.49, 4.5, 5.0, 7.0)), depth=rng.choice((5.0, 10.0, 50.0, 300.0)),
+            )
+            for n in range(1, 501)
+        ]
+        self.assert_same_as_brute_force(rules, events)
+
+
+class AlertRuleEngineTests(TestCase):
+    """Rules evaluated on ingest queue notifications and take their events out of the default alerts."""
+
+    def setUp(self):
+        patcher = mock.patch.multiple(AlertRuleEngine, _index=None, _fingerprint=None, _compiled_at=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = timezone.now()
+        self.site = AlertRule.objects.create(
+            name="Testville", min_magnitude=3.0, site_latitude=35.7, site_longitude=-117.5, radius_km=50,
+        )
+
+    def ingest(self, *quakes):
+        """Store (usgs_id, latitude, longitude, magnitude) events as the live ingest does."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            created = EarthquakeDataService.store_earthquakes([
+                {
+                    "usgs_id": usgs_id, "magnitude": magnitude, "place": "Testville", "time": self.now,
+                    "latitude": latitude, "longitude": longitude, "depth": 8.0,
+                }
+                for usgs_id, latitude, longitude, magnitude in quakes
+            ])
+        return {quake.usgs_id: quake for quake in created}, callbacks
+
+    def test_matches_queue_notifications_and_mark_events(self):
+        created, callbacks = self.ingest(
+            ('us_near', 35.8, -117.5, 5.0),
+            ('us_small', 35.8, -117.5, 2.0),
+            ('us_far', 10.0, 100.0, 5.0),
+        )
+
+        notification = AlertNotification.objects.get()
+        self.assertEqual((notification.rule_id, notification.earthquake_id), (self.site.id, created['us_near'].id))
+        self.assertEqual(notification.payload['rule'], "Testville")
+        self.assertEqual(notification.payload['usgs_id'], 'us_near')
+        self.assertIsNone(notification.sent_at)
+
+        sent = dict(Earthquake.objects.values_list('usgs_id', 'is_alert_sent'))
+        self.assertEqual(sent, {'us_near': True, 'us_small': False, 'us_far': False})
+        # The matched event is not alerted a second time as a default M4.5+ alert
+        self.assertEqual(list(AlertDispatcher.pending().values_list('usgs_id', flat=True)), ['us_far'])
+        self.assertIn(AlertDispatcher.request_dispatch, callbacks)
+
+    def test_no_match_and_no_strong_event_does_not_dispatch(self):
+        _, callbacks = self.ingest(('us_small', 35.8, -117.5, 2.0))
+        self.assertFalse(AlertNotification.objects.exists())
+        self.assertNotIn(AlertDispatcher.request_dispatch, callbacks)
+
+    def test_reprocessing_does_not_duplicate_notifications(self):
+        created, _ = self.ingest(('us_near', 35.8, -117.5, 5.0))
+        AlertRuleEngine.process(list(created.values()), self.now)
+        self.assertEqual(AlertNotification.objects.count(), 1)
+
+    def test_bulk_rule_edits_are_picked_up(self):
+        self.ingest(('us_1', 35.8, -117.5, 5.0))
+        AlertRule.objects.filter(id=self.site.id).update(min_magnitude=6.0)
+
+        self.ingest(('us_2', 35.8, -117.5, 5.0))
+        self.assertEqual(AlertNotification.objects.count(), 1)
+
+        AlertRule.objects.update(is_active=False, min_magnitude=0.0)
+        self.ingest(('us_3', 35.8, -117.5, 7.0))
+        self.assertEqual(AlertNotification.objects.count(), 1)
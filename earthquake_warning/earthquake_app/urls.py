@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import DashboardView, health_check, dashboard_data, AlertsView,get_predicted_earthquakes
+from .views import DashboardView, health_check, dashboard_data, AlertsView,get_predicted_earthquakes, list_earthquakes, get_rollups
 
 urlpatterns = [
     path('', DashboardView.as_view(), name='dashboard'),
@@ -7,4 +7,6 @@ urlpatterns = [
     path('api/dashboard-data/', dashboard_data, name='dashboard-data'),  # Add new endpoint
     path('alerts/', AlertsView.as_view(), name='alerts'),
     path("api/predictions/", get_predicted_earthquakes, name="get_predicted_earthquakes"),
+    path("api/earthquakes/", list_earthquakes, name="list_earthquakes"),
+    path("api/rollups/", get_rollups, name="get_rollups"),
 ]
\ No newline at end of file
@@ -2,48 +2,36 @@ from django.views.generic import TemplateView
 from django.http import JsonResponse
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Avg, Q
-from django.core.cache import cache
 from django.conf import settings
-from .models import Earthquake
-from .services import EarthquakeDataService
+from .models import Earthquake, PredictionRun
+from .services import DashboardDataService, EarthquakeDataService
+from .dashboard_cache import DashboardCache
+from .alerts import AlertLatency
+from .responses import cached_json_response, streamed_page_response
+from .queries import EarthquakeQuery, RollupQuery
+from .predictions import GLOBAL_REGION
+import hashlib
 import logging
 import json
+import re
 from django.views.generic import ListView
 from django.db import models 
 
 logger = logging.getLogger(__name__)
 
+REGION_PATTERN = re.compile(r'^[\w-]{1,32}$')
+
 class DashboardView(TemplateView):
     template_name = 'earthquake_app/dashboard.html'
-    CACHE_TIMEOUT = getattr(settings, 'EARTHQUAKE_CACHE_TIMEOUT', 300)  # 5 minutes default
+
+    CACHED_ENTRIES = ('earthquake_data', 'earthquake_stats', 'dashboard_response', f'predictions_response:{GLOBAL_REGION}')
 
     def get_earthquake_data(self):
         """
-        Fetch and format earthquake data with caching
+        Fetch and format earthquake data with versioned caching
         """
-        cache_key = 'earthquake_data'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
-
         try:
-            earthquakes = Earthquake.objects.select_related().order_by('-time')[:50]
-            
-            earthquake_data = [{
-                'latitude': eq.latitude,
-                'longitude': eq.longitude,
-                'magnitude': eq.magnitude,
-                'depth': eq.depth,
-                'place': eq.place,
-                'time': eq.time.isoformat(),
-                'status': eq.status,
-                'id': eq.id
-            } for eq in earthquakes]
-
-            cache.set(cache_key, earthquake_data, self.CACHE_TIMEOUT)
-            return earthquake_data
+            return DashboardCache.get_or_compute('earthquake_data', DashboardDataService.build_earthquake_data)
 
         except Exception as e:
             logger.error(f"Error fetching earthquake data: {e}")
@@ -53,34 +41,10 @@ class DashboardView(TemplateView):
         """
         Calculate and cache earthquake statistics
         """
-        cache_key = 'earthquake_stats'
-        cached_stats = cache.get(cache_key)
-        
-        if cached_stats:
-            return cached_stats
-
         try:
-            now = timezone.now()
-            last_24h = now - timedelta(days=1)
-            
-            recent_quakes = Earthquake.objects.filter(
-                time__gte=last_24h
-            ).select_related()
-
-            stats = {
-                'total_24h': recent_quakes.count(),
-                'avg_magnitude': round(
-                    recent_quakes.aggregate(Avg('magnitude'))['magnitude__avg'] or 0, 
-                    2
-                ),
-                'active_alerts': recent_quakes.filter(
-                    Q(status='alert') | Q(magnitude__gte=4.5)
-                ).count(),
-                'highest_magnitude': recent_quakes.order_by('-magnitude').first().magnitude if recent_quakes else 0,
-            }
-
-            cache.set(cache_key, stats, self.CACHE_TIMEOUT)
-            return stats
+            return DashboardCache.get_or_compute(
+                'earthquake_stats', DashboardDataService.build_statistics, DashboardCache.WINDOW_TIMEOUT
+            )
 
         except Exception as e:
             logger.error(f"Error calculating earthquake statistics: {e}")
@@ -95,8 +59,8 @@ class DashboardView(TemplateView):
         context = super().get_context_data(**kwargs)
         
         try:
-            # Fetch fresh data if needed
-            EarthquakeDataService.fetch_recent_earthquakes()
+            # Never fetch inline; stale data triggers a background refresh
+            EarthquakeDataService.request_refresh()
             
             earthquake_data = self.get_earthquake_data()
             stats = self.get_statistics()
@@ -137,6 +101,8 @@ def health_check(request):
             'status': 'ok',
             'timestamp': timezone.now().isoformat(),
             'database': 'connected',
+            'cache': DashboardCache.counters(DashboardView.CACHED_ENTRIES),
+            'alert_latency': AlertLatency.histograms(),
         })
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -151,18 +117,16 @@ def dashboard_data(request):
     API endpoint for real-time dashboard updates
     """
     try:
-        # Attempt to fetch fresh data
-        EarthquakeDataService.fetch_recent_earthquakes()
-        
-        dashboard_view = DashboardView()
-        earthquake_data = dashboard_view.get_earthquake_data()
-        stats = dashboard_view.get_statistics()
+        # Serve from the DB and cache; stale data triggers a background refresh
+        EarthquakeDataService.request_refresh()
 
-        return JsonResponse({
-            'earthquakes': earthquake_data,
-            'stats': stats,
-            'last_update': timezone.now().isoformat()
-        })
+        def build_payload():
+            dashboard_view = DashboardView()
+            return DashboardDataService.build_dashboard_payload(
+                dashboard_view.get_earthquake_data(), dashboard_view.get_statistics()
+            )
+
+        return cached_json_response(request, 'dashboard_response', build_payload, DashboardCache.WINDOW_TIMEOUT)
 
     except Exception as e:
         logger.error(f"Error in dashboard data API: {e}")
@@ -171,32 +135,44 @@ def dashboard_data(request):
             'detail': str(e)
         }, status=500)
     
+def predicted_earthquakes(run, region):
+    return Earthquake.objects.filter(prediction_run=run, region=region).order_by("time")
+
+
 def get_predicted_earthquakes(request):
     """
-    API view to return the predicted earthquakes.
+    API view to return the predicted earthquakes of one forecast region:
+    ?region=cell_<row>_<col>, or the global forecast by default.
     """
-    try:
-        predictions = Earthquake.objects.filter(status="predicted").order_by("time")
-        
-        # Debugging: Check if any predictions exist
-        count = predictions.count()
-        logger.info(f"🔍 Found {count} predicted earthquakes.")
-
-        data = [
-            {
-                "id": quake.id,
-                "latitude": quake.latitude,
-                "longitude": quake.longitude,
-                "magnitude": quake.magnitude,
-                "depth": quake.depth,
-                "time": quake.time.isoformat(),
-                "place": quake.place,
-                "status": quake.status
-            }
-            for quake in predictions
-        ]
+    region = request.GET.get("region") or GLOBAL_REGION
+    if not REGION_PATTERN.match(region):
+        return JsonResponse({"error": "Invalid region"}, status=400)
 
-        return JsonResponse({"predictions": data})
+    try:
+        def build_payload():
+            # Only the published run; a run being written or purged is never visible
+            run = PredictionRun.active()
+            if run is None:
+                return {"predictions": []}
+            predictions = predicted_earthquakes(run, region)
+            data = [
+                {
+                    "id": quake.id,
+                    "latitude": quake.latitude,
+                    "longitude": quake.longitude,
+                    "magnitude": quake.magnitude,
+                    "depth": quake.depth,
+                    "time": quake.time.isoformat(),
+                    "place": quake.place,
+                    "status": quake.status,
+                    "region": quake.region
+                }
+                for quake in predictions
+            ]
+            logger.info(f"🔍 Encoded {len(data)} predicted earthquakes.")
+            return {"predictions": data}
+
+        return cached_json_response(request, f"predictions_response:{region}", build_payload)
 
     except Exception as e:
         logger.error(f"Error fetching earthquake predictions: {e}")
@@ -204,6 +180,48 @@ def get_predicted_earthquakes(request):
 
 
 
+def query_fingerprint(request, *extra):
+    """Digest of the query parameters in canonical order, plus `extra` values."""
+    params = "&".join(f"{key}={request.GET[key]}" for key in sorted(request.GET))
+    return hashlib.sha1("|".join([params, *map(str, extra)]).encode()).hexdigest()
+
+
+def list_earthquakes(request):
+    """
+    API view to query the catalog with filters and keyset pagination.
+    See EarthquakeQuery for the parameters; follow `next` for further pages.
+    """
+    try:
+        query = EarthquakeQuery(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # Pages only change when ingest or retention bumps the data version
+    etag = f'"{query_fingerprint(request, DashboardCache.version())}"'
+    return streamed_page_response(request, "earthquakes", query.rows, etag)
+
+
+def get_rollups(request):
+    """
+    API view to return aggregated earthquake activity (trend series,
+    heatmap or histogram) from the rollup tables. See RollupQuery.
+    """
+    try:
+        query = RollupQuery(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # One cached entry per distinct query; ingest bumps the version
+    name = f"rollups_response:{query_fingerprint(request)}"
+    # Without an explicit end the window ends now and slides
+    timeout = None if request.GET.get('end') else DashboardCache.WINDOW_TIMEOUT
+    try:
+        return cached_json_response(request, name, query.payload, timeout)
+    except Exception as e:
+        logger.error(f"Error fetching rollups: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
 class AlertsView(ListView):
     template_name = 'earthquake_app/alerts.html'
     context_object_name = 'alerts'
@@ -214,7 +232,7 @@ class AlertsView(ListView):
         or status='alert'
         """
         last_24h = timezone.now() - timedelta(days=1)
-        return Earthquake.objects.filter(
+        return Earthquake.observed().filter(
             time__gte=last_24h
         ).filter(
             models.Q(magnitude__gte=4.5) | models.Q(status='alert')
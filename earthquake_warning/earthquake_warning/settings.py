@@ -132,6 +132,14 @@ CELERY_TASK_ALWAYS_EAGER = DEBUG
 CELERY_TASK_TRACK_STARTED = True
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # Control task distribution
 
+# Predictions run on their own queue so only that worker pays for TensorFlow
+CELERY_TASK_ROUTES = {
+    'earthquake_app.tasks.run_earthquake_predictions': {'queue': 'predictions'},
+}
+EARTHQUAKE_PRELOAD_MODEL = os.getenv('EARTHQUAKE_PRELOAD_MODEL', 'False') == 'True'
+# tensorflow, onnx, tflite or numpy; the last three need `manage.py export_lstm_model`
+EARTHQUAKE_INFERENCE_BACKEND = os.getenv('EARTHQUAKE_INFERENCE_BACKEND', 'tensorflow')
+
 # Add health check URLs
 HEALTH_CHECK = {
     'DISK_USAGE_MAX': 90,  # Percentage
@@ -154,8 +162,41 @@ CELERY_BEAT_SCHEDULE = {
             'expires': 21500  # ~6 hours in seconds minus some buffer
         }
     },
+    'dispatch_alerts': {
+        'task': 'earthquake_app.tasks.dispatch_alerts',
+        'schedule': timedelta(minutes=1),
+        'options': {
+            'expires': 55
+        }
+    },
+    'maintain_earthquake_partitions': {
+        'task': 'earthquake_app.tasks.maintain_earthquake_partitions',
+        'schedule': timedelta(days=1),
+        'options': {
+            'expires': 3600
+        }
+    },
 }
 
+# Alert delivery: each configured sink receives every batch of pending alerts
+EARTHQUAKE_ALERT_SINKS = []
+if os.getenv('EARTHQUAKE_ALERT_WEBHOOK_URL'):
+    EARTHQUAKE_ALERT_SINKS.append({'type': 'webhook', 'url': os.getenv('EARTHQUAKE_ALERT_WEBHOOK_URL')})
+if os.getenv('EARTHQUAKE_ALERT_EMAILS'):
+    EARTHQUAKE_ALERT_SINKS.append({'type': 'email', 'recipients': os.getenv('EARTHQUAKE_ALERT_EMAILS').split(',')})
+if os.getenv('EARTHQUAKE_ALERT_FILE'):
+    EARTHQUAKE_ALERT_SINKS.append({'type': 'file', 'path': os.getenv('EARTHQUAKE_ALERT_FILE')})
+EARTHQUAKE_ALERT_BATCH_SIZE = 100
+# Failed deliveries are retried with backoff, then dead-lettered (see AlertDelivery in the admin)
+EARTHQUAKE_ALERT_MAX_DELIVERY_ATTEMPTS = 8
+
+# Detail rows older than this are rolled up into DailyRollup and dropped
+EARTHQUAKE_RETENTION_MONTHS = int(os.getenv('EARTHQUAKE_RETENTION_MONTHS', '24'))
+EARTHQUAKE_PARTITIONS_AHEAD = 3
+# Rollup grid cell size in degrees, and how long hourly rollups are kept
+EARTHQUAKE_ROLLUP_CELL_DEGREES = 1
+EARTHQUAKE_HOURLY_ROLLUP_DAYS = 90
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -1,16 +1,22 @@
 # services.py
 from django.core.serializers import serialize
 from django.utils import timezone
-from earthquake_app.models import Earthquake
+from earthquake_app.models import Earthquake, PredictionRun
+from earthquake_app.predictions import GLOBAL_REGION
 import json
 
 def prepare_earthquake_data():
-    """Prepare earthquake predictions data for visualization"""
-    predicted_quakes = Earthquake.objects.filter(
-        status='predicted',
-        time__gte=timezone.now(),
-        time__lte=timezone.now() + timezone.timedelta(days=30)
-    ).order_by('time')
+    """Prepare the global earthquake predictions for visualization"""
+    run = PredictionRun.active()
+    if run is None:
+        predicted_quakes = Earthquake.objects.none()
+    else:
+        predicted_quakes = Earthquake.objects.filter(
+            prediction_run=run,
+            region=GLOBAL_REGION,
+            time__gte=timezone.now(),
+            time__lte=timezone.now() + timezone.timedelta(days=30)
+        ).order_by('time')
     
     print(f"Found {predicted_quakes.count()} predicted earthquakes")
     